@@ -0,0 +1,66 @@
+"""Create users and todos
+
+Revision ID: 0a1f5c8e2d47
+Revises: 
+Create Date: 2025-07-30 10:05:12.407351
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a1f5c8e2d47'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The tables as they were before the first migration; later revisions take them to the current models.
+    # Databases created before migrations existed already have them.
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(), nullable=True),
+            sa.Column('email', sa.String(), nullable=True),
+            sa.Column('first_name', sa.String(), nullable=True),
+            sa.Column('last_name', sa.String(), nullable=True),
+            sa.Column('hashed_password', sa.String(), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('role', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('username'),
+        )
+        op.create_index('ix_users_id', 'users', ['id'], unique=False)
+    if 'todosapp' not in existing:
+        op.create_table(
+            'todosapp',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(), nullable=True),
+            sa.Column('description', sa.String(), nullable=True),
+            sa.Column('priority', sa.Integer(), nullable=True),
+            sa.Column('complete', sa.Boolean(), nullable=True),
+            sa.Column('owner_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['owner_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_todosapp_id', 'todosapp', ['id'], unique=False)
+        op.create_index('ix_todosapp_title', 'todosapp', ['title'], unique=False)
+        op.create_index('ix_todosapp_description', 'todosapp', ['description'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todosapp_description', table_name='todosapp')
+    op.drop_index('ix_todosapp_title', table_name='todosapp')
+    op.drop_index('ix_todosapp_id', table_name='todosapp')
+    op.drop_table('todosapp')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_table('users')
@@ -1,7 +1,7 @@
 """Create phone number for user column
 
 Revision ID: 33e5298a0e3c
-Revises: 
+Revises: 0a1f5c8e2d47
 Create Date: 2025-07-31 12:47:06.558867
 
 """
@@ -13,7 +13,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision: str = '33e5298a0e3c'
-down_revision: Union[str, Sequence[str], None] = None
+down_revision: Union[str, Sequence[str], None] = '0a1f5c8e2d47'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
@@ -0,0 +1,29 @@
+"""Add composite index for paginated todo listing
+
+Revision ID: 5b1d7e9a4c20
+Revises: 33e5298a0e3c
+Create Date: 2026-10-18 09:12:41.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1d7e9a4c20'
+down_revision: Union[str, Sequence[str], None] = '33e5298a0e3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_todosapp_owner_complete_priority_id', 'todosapp',
+                    ['owner_id', 'complete', 'priority', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todosapp_owner_complete_priority_id', table_name='todosapp')
@@ -0,0 +1,70 @@
+"""Replace todo title/description indexes with full-text search
+
+Revision ID: 8f3a2c61d9b4
+Revises: 5b1d7e9a4c20
+Create Date: 2026-10-18 11:04:52.418730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3a2c61d9b4'
+down_revision: Union[str, Sequence[str], None] = '5b1d7e9a4c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same statements as models.TODOS_SEARCH_DDL at the time of this revision
+SEARCH_DDL = {
+    'postgresql': [
+        "ALTER TABLE todosapp ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX ix_todosapp_search_vector ON todosapp USING gin (search_vector)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE todosapp_fts USING fts5("
+        "title, description, content='todosapp', content_rowid='id')",
+        "CREATE TRIGGER todosapp_fts_ai AFTER INSERT ON todosapp BEGIN "
+        "INSERT INTO todosapp_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER todosapp_fts_ad AFTER DELETE ON todosapp BEGIN "
+        "INSERT INTO todosapp_fts(todosapp_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER todosapp_fts_au AFTER UPDATE OF title, description ON todosapp BEGIN "
+        "INSERT INTO todosapp_fts(todosapp_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO todosapp_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    ],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Plain B-tree indexes cannot serve text search and only slow down writes
+    op.drop_index('ix_todosapp_title', table_name='todosapp')
+    op.drop_index('ix_todosapp_description', table_name='todosapp')
+
+    dialect = op.get_bind().dialect.name
+    for statement in SEARCH_DDL.get(dialect, []):
+        op.execute(statement)
+    if dialect == 'sqlite':
+        # Index the rows that existed before the triggers
+        op.execute("INSERT INTO todosapp_fts(todosapp_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_todosapp_search_vector', table_name='todosapp')
+        op.drop_column('todosapp', 'search_vector')
+    elif dialect == 'sqlite':
+        for trigger in ('todosapp_fts_ai', 'todosapp_fts_ad', 'todosapp_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS todosapp_fts")
+
+    op.create_index('ix_todosapp_description', 'todosapp', ['description'], unique=False)
+    op.create_index('ix_todosapp_title', 'todosapp', ['title'], unique=False)
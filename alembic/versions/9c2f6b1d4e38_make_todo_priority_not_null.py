@@ -0,0 +1,50 @@
+"""Make todo priority not null
+
+Revision ID: 9c2f6b1d4e38
+Revises: d5a7c3e91f26
+Create Date: 2026-10-19 16:40:52.318407
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from TodoApp.migrations import rebuild_sqlite_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2f6b1d4e38'
+down_revision: Union[str, Sequence[str], None] = 'd5a7c3e91f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Priority is a keyset column of the paginated list, where NULL would fall between pages
+TABLES = ('todosapp', 'todosapp_archive')
+# The column default of todosapp
+DEFAULT_PRIORITY = 1
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Todos without a priority get the default, which is also where the counters already count them
+    for table in TABLES:
+        op.execute(f"UPDATE {table} SET priority = {DEFAULT_PRIORITY} WHERE priority IS NULL")
+
+    for table in TABLES:
+        if op.get_bind().dialect.name == 'sqlite':
+            rebuild_sqlite_table(table, lambda create: re.sub(
+                r'\bpriority INTEGER,', 'priority INTEGER NOT NULL,', create))
+        else:
+            op.alter_column(table, 'priority', existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        if op.get_bind().dialect.name == 'sqlite':
+            rebuild_sqlite_table(table, lambda create: re.sub(
+                r'\bpriority INTEGER NOT NULL,', 'priority INTEGER,', create))
+        else:
+            op.alter_column(table, 'priority', existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,45 @@
+"""Add todo archive
+
+Revision ID: a3d6f0b84e17
+Revises: e7b2d95c1a04
+Create Date: 2026-10-18 18:05:12.418263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d6f0b84e17'
+down_revision: Union[str, Sequence[str], None] = 'e7b2d95c1a04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'todosapp_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('priority', sa.Integer(), nullable=True),
+        sa.Column('complete', sa.Boolean(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_todosapp_archive_owner_id_id', 'todosapp_archive', ['owner_id', 'id'], unique=False)
+    op.create_index('ix_todosapp_archivable', 'todosapp', ['updated_at'], unique=False,
+                    postgresql_where=sa.text('complete'), sqlite_where=sa.text('complete'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todosapp_archivable', table_name='todosapp')
+    op.drop_index('ix_todosapp_archive_owner_id_id', table_name='todosapp_archive')
+    op.drop_table('todosapp_archive')
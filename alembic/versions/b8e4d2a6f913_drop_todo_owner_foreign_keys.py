@@ -0,0 +1,49 @@
+"""Drop todo owner foreign keys
+
+Revision ID: b8e4d2a6f913
+Revises: f1c9a47e2b85
+Create Date: 2026-10-19 09:12:30.551904
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from TodoApp.migrations import rebuild_sqlite_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4d2a6f913'
+down_revision: Union[str, Sequence[str], None] = 'f1c9a47e2b85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Sharded todos (DB_SHARD_URLS) live on databases without the users table
+TABLES = ('todosapp', 'todosapp_archive')
+OWNER_FK = re.compile(r',\s*FOREIGN KEY\s*\(owner_id\)\s*REFERENCES\s+"?users"?\s*\(id\)')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    for table in TABLES:
+        for foreign_key in inspector.get_foreign_keys(table):
+            if foreign_key['referred_table'] != 'users':
+                continue
+            if conn.dialect.name == 'sqlite':
+                rebuild_sqlite_table(table, lambda create: OWNER_FK.sub('', create))
+            else:
+                op.drop_constraint(foreign_key['name'], table, type_='foreignkey')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        if op.get_bind().dialect.name == 'sqlite':
+            rebuild_sqlite_table(table, lambda create: re.sub(
+                r'\)\s*$', ', \n\tFOREIGN KEY(owner_id) REFERENCES users (id)\n)', create))
+        else:
+            op.create_foreign_key(f'{table}_owner_id_fkey', table, 'users', ['owner_id'], ['id'])
@@ -0,0 +1,54 @@
+"""Add todo change tracking for incremental sync
+
+Revision ID: c4e81f2a7d3b
+Revises: 8f3a2c61d9b4
+Create Date: 2026-10-18 14:27:05.913402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e81f2a7d3b'
+down_revision: Union[str, Sequence[str], None] = '8f3a2c61d9b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    op.add_column('todosapp', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    # Existing rows count as changed now, so the first sync after the upgrade sends everything
+    op.add_column('todosapp', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    if dialect == 'postgresql':
+        op.execute("UPDATE todosapp SET updated_at = timezone('utc', now())")
+        op.alter_column('todosapp', 'updated_at', nullable=False)
+    else:
+        # SQLite cannot add a NOT NULL column without a constant default, nor alter it afterwards;
+        # the application always sets the column, so it simply stays nullable there
+        op.execute("UPDATE todosapp SET updated_at = CURRENT_TIMESTAMP")
+    op.create_index('ix_todosapp_owner_updated_at_id', 'todosapp', ['owner_id', 'updated_at', 'id'], unique=False)
+
+    op.create_table(
+        'todo_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_todo_tombstones_owner_deleted_at_id', 'todo_tombstones',
+                    ['owner_id', 'deleted_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_todo_tombstones_owner_deleted_at_id', table_name='todo_tombstones')
+    op.drop_table('todo_tombstones')
+    op.drop_index('ix_todosapp_owner_updated_at_id', table_name='todosapp')
+    op.drop_column('todosapp', 'updated_at')
+    op.drop_column('todosapp', 'version')
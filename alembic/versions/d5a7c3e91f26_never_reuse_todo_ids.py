@@ -0,0 +1,49 @@
+"""Never reuse todo ids
+
+Revision ID: d5a7c3e91f26
+Revises: b8e4d2a6f913
+Create Date: 2026-10-19 14:03:18.224716
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from TodoApp.migrations import rebuild_sqlite_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a7c3e91f26'
+down_revision: Union[str, Sequence[str], None] = 'b8e4d2a6f913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Postgres sequences never hand out an id twice; only SQLite needs AUTOINCREMENT for that
+ID_COLUMN = re.compile(r'\bid INTEGER NOT NULL,')
+TABLE_PRIMARY_KEY = re.compile(r',\s*PRIMARY KEY \(id\)')
+AUTOINCREMENT_ID = re.compile(r'\bid INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild_sqlite_table('todosapp', lambda create: TABLE_PRIMARY_KEY.sub(
+        '', ID_COLUMN.sub('id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,', create)))
+    # Ids already handed out live on in the archive and in tombstones even when no todo has them any more
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'todosapp'")
+    op.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'todosapp', max("
+               "(SELECT coalesce(max(id), 0) FROM todosapp), "
+               "(SELECT coalesce(max(id), 0) FROM todosapp_archive), "
+               "(SELECT coalesce(max(todo_id), 0) FROM todo_tombstones))")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild_sqlite_table('todosapp', lambda create: re.sub(
+        r'\s*\)\s*$', ', \n\tPRIMARY KEY (id)\n)', AUTOINCREMENT_ID.sub('id INTEGER NOT NULL,', create)))
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'todosapp'")
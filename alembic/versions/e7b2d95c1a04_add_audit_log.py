@@ -0,0 +1,42 @@
+"""Add audit log
+
+Revision ID: e7b2d95c1a04
+Revises: c4e81f2a7d3b
+Create Date: 2026-10-18 16:52:38.260117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2d95c1a04'
+down_revision: Union[str, Sequence[str], None] = 'c4e81f2a7d3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'audit_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('at', sa.DateTime(), nullable=False),
+        sa.Column('actor_id', sa.Integer(), nullable=True),
+        sa.Column('entity', sa.String(), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('details', sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_audit_log_entity_entity_id', 'audit_log', ['entity', 'entity_id'], unique=False)
+    op.create_index('ix_audit_log_actor_id_at', 'audit_log', ['actor_id', 'at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audit_log_actor_id_at', table_name='audit_log')
+    op.drop_index('ix_audit_log_entity_entity_id', table_name='audit_log')
+    op.drop_table('audit_log')
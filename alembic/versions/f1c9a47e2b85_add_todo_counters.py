@@ -0,0 +1,41 @@
+"""Add todo counters
+
+Revision ID: f1c9a47e2b85
+Revises: a3d6f0b84e17
+Create Date: 2026-10-18 19:21:47.902551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c9a47e2b85'
+down_revision: Union[str, Sequence[str], None] = 'a3d6f0b84e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'todo_counters',
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False),
+        sa.Column('complete', sa.Boolean(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('owner_id', 'priority', 'complete'),
+    )
+    # Start from the todos already there, as `python -m TodoApp.stats rebuild` would
+    op.execute(
+        "INSERT INTO todo_counters (owner_id, priority, complete, count) "
+        "SELECT owner_id, coalesce(priority, 1), coalesce(complete, false), count(*) FROM todosapp "
+        "WHERE owner_id IS NOT NULL GROUP BY owner_id, coalesce(priority, 1), coalesce(complete, false)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('todo_counters')
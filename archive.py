@@ -0,0 +1,119 @@
+"""
+Archival of completed todos. A background job moves todos that were
+completed, and not changed since, more than ARCHIVE_AFTER_DAYS ago from
+todosapp to todosapp_archive, ARCHIVE_BATCH_SIZE rows per transaction, so
+the hot table and its indexes only hold what the main endpoints show.
+
+Archived todos leave the sync feed the way deleted ones do, with a
+tombstone. Passing include_archived=true to GET /todos/ or GET /todos/{id}
+reads both tables.
+"""
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import timedelta
+from typing import Callable, List, Sequence
+
+from sqlalchemy import DateTime, Select, delete, insert, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from TodoApp import metrics
+from TodoApp.cache import todo_cache
+from TodoApp.models import SYNC_COLUMNS, Todos, TodosArchive, utcnow
+from TodoApp.pagination import paginate
+from TodoApp.stats import apply_counts, todo_deltas
+from TodoApp.sync import record_deletions
+
+logger = logging.getLogger(__name__)
+
+# Completed todos unchanged for this many days are archived; 0 turns archival off
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# Todos moved per transaction, which keeps row locks and the transaction log small
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# How often the job looks for todos to archive
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+# Seconds between two batches of one run, so the job does not crowd out requests
+ARCHIVE_BATCH_PAUSE = float(os.getenv("ARCHIVE_BATCH_PAUSE", "0.1"))
+
+TODOS_ARCHIVED = metrics.registry.register(metrics.Counter(
+    "todos_archived_total", "Completed todos moved to the archive table"))
+
+
+async def archive_batch(db: AsyncSession, after_days: int = ARCHIVE_AFTER_DAYS,
+                        batch_size: int = ARCHIVE_BATCH_SIZE) -> List[tuple]:
+    """
+    Move one batch of archivable todos in one transaction. Returns the
+    (id, owner_id) of the todos moved.
+    """
+    cutoff = utcnow() - timedelta(days=after_days)
+    # The bare column matches the WHERE of the partial index; locked rows are being changed, skip them
+    result = await db.execute(
+        select(Todos.id, Todos.owner_id, Todos.priority).where(Todos.complete, Todos.updated_at < cutoff)
+        .order_by(Todos.updated_at).limit(batch_size).with_for_update(skip_locked=True)
+    )
+    rows = result.all()
+    if not rows:
+        await db.rollback()
+        return []
+    moved = [(row.id, row.owner_id) for row in rows]
+    ids = [todo_id for todo_id, _ in moved]
+    await db.execute(insert(TodosArchive).from_select(
+        [column.key for column in SYNC_COLUMNS] + ["archived_at"],
+        select(*SYNC_COLUMNS, literal(utcnow(), DateTime)).where(Todos.id.in_(ids))
+    ))
+    await db.execute(delete(Todos).where(Todos.id.in_(ids)))
+    await record_deletions(db, moved)
+    # The counters cover todosapp only
+    deltas = Counter()
+    for row in rows:
+        deltas.update(todo_deltas(row.owner_id, removed=[(row.priority, True)]))
+    await apply_counts(db, deltas)
+    await db.commit()
+    TODOS_ARCHIVED.inc(len(moved))
+    return moved
+
+
+async def archive_todos(sessionmaker: async_sessionmaker, after_days: int = ARCHIVE_AFTER_DAYS,
+                        batch_size: int = ARCHIVE_BATCH_SIZE, pause: float = ARCHIVE_BATCH_PAUSE) -> int:
+    """
+    Archive batch after batch until none is left. Returns the number of todos moved.
+    """
+    total = 0
+    while True:
+        async with sessionmaker() as db:
+            moved = await archive_batch(db, after_days, batch_size)
+        for owner_id in {owner_id for _, owner_id in moved}:
+            await todo_cache.invalidate(owner_id)
+        total += len(moved)
+        if len(moved) < batch_size:
+            return total
+        await asyncio.sleep(pause)
+
+
+async def run_archiver(sessionmaker: async_sessionmaker, interval: float = ARCHIVE_INTERVAL):
+    while True:
+        # Sleep first: startup should not wait on, or fail because of, archiving
+        await asyncio.sleep(interval)
+        try:
+            archived = await archive_todos(sessionmaker)
+            if archived:
+                logger.info("Archived %d completed todos", archived)
+        except Exception:
+            logger.exception("Archiving completed todos failed")
+
+
+def paginate_with_archived(build: Callable[[type], Select], keys: Sequence[str], sort: str, cursor, limit: int,
+                           descending: bool = False) -> Select:
+    """
+    paginate() over hot and archived todos together. build(model) returns the
+    filtered SELECT for Todos or TodosArchive; each table is paginated on its
+    own index and the two pages are merged, which costs one page per table
+    rather than a scan of the union.
+    """
+    pages = [select(paginate(build(model), [getattr(model, key) for key in keys], sort, cursor, limit, descending)
+                    .subquery())
+             for model in (Todos, TodosArchive)]
+    both = union_all(*pages).subquery()
+    order = [both.c[key].desc() if descending else both.c[key].asc() for key in keys]
+    return select(both).order_by(*order).limit(limit + 1)
@@ -0,0 +1,345 @@
+"""
+Static asset pipeline: minified, content-hashed copies of everything under
+static/ with gzip (and, when the brotli package is installed, brotli)
+variants, served by an ASGI app that picks the variant from Accept-Encoding.
+
+Assets are built in memory on first use (or at startup). To hand them to a
+CDN or reverse proxy instead, write them out once:
+
+    python -m TodoApp.assets --output build/static
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+
+from TodoApp.cache import etag_matches
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Fingerprinted URLs never change content, so caches may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Plain URLs (no fingerprint) must be revalidated, which the ETag makes cheap
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+# Smaller files gain nothing from compression
+COMPRESS_MIN_SIZE = 256
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".map", ".json", ".svg", ".txt", ".html"}
+# Preferred first when the client accepts several
+ENCODINGS = ("br", "gzip")
+# Extensions the mimetypes module does not know
+MEDIA_TYPES = {".map": "application/json"}
+
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.DOTALL)
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+# After these a "/" starts a regular expression rather than a division
+_JS_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {
+    "return", "typeof", "case", "do", "else", "in", "instanceof", "new", "delete", "void", "throw", "yield", "await"}
+_JS_WORD = re.compile(r"[\w$\u0080-\uffff]+")
+
+
+def minify_css(source: str) -> str:
+    """
+    Drop comments (except /*! licences */) and redundant whitespace, leaving
+    string literals untouched.
+    """
+    parts = []
+    code = ""
+    position = 0
+    for match in _CSS_TOKENS.finditer(source):
+        string, comment = match.groups()
+        # A dropped comment still separates the tokens around it
+        code += source[position:match.start()] + ("" if string is not None or comment.startswith("/*!") else " ")
+        if string is not None:
+            parts += [_minify_css_code(code), string]
+            code = ""
+        elif comment.startswith("/*!"):
+            parts += [_minify_css_code(code).rstrip(), comment, "\n"]
+            code = ""
+        position = match.end()
+    parts.append(_minify_css_code(code + source[position:]))
+    # Code right after a kept comment's line break needs no leading space
+    return "".join(part.lstrip() if i and parts[i - 1] == "\n" else part for i, part in enumerate(parts)).strip()
+
+
+def _minify_css_code(code: str) -> str:
+    return _CSS_PUNCTUATION.sub(r"\1", re.sub(r"\s+", " ", code)).replace(";}", "}")
+
+
+def minify_js(source: str) -> str:
+    """
+    Drop comments (except /*! licences */, and including the
+    sourceMappingURL, whose map would not match the fingerprinted name),
+    indentation and runs of whitespace. Strings, template literals and
+    regular expressions are copied as written. Line breaks are kept, one
+    per run, so automatic semicolon insertion sees the same code; other
+    whitespace between tokens becomes a single space.
+    """
+    out = []
+    # Brace depth inside each open ${...} of a template literal, innermost last
+    substitutions = []
+    last = ""  # previous token, to tell a regular expression from a division
+    gap = ""  # whitespace owed before the next token: "", " " or "\n"
+    i, length = 0, len(source)
+
+    def emit(token: str):
+        nonlocal gap
+        if out and gap:
+            out.append(gap)
+        out.append(token)
+        gap = ""
+
+    while i < length:
+        char = source[i]
+        if char in " \t\r\n\f\v\ufeff\u00a0\u2028\u2029":
+            if char in "\n\r\u2028\u2029":
+                gap = "\n"
+            elif not gap:
+                gap = " "
+            i += 1
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            i = length if end < 0 else end
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            end = length if end < 0 else end + 2
+            comment = source[i:end]
+            if comment.startswith("/*!"):
+                emit(comment)
+                gap = "\n"
+            elif "\n" in comment:
+                gap = "\n"
+            elif not gap:
+                gap = " "
+            i = end
+        elif char in "'\"":
+            end = i + 1
+            while end < length and source[end] != char:
+                end += 2 if source[end] == "\\" else 1
+            emit(source[i:end + 1])
+            last, i = "string", end + 1
+        elif char == "`" or (char == "}" and substitutions and substitutions[-1] == 0):
+            # A template literal, or its continuation after a ${...} substitution
+            end = i + 1
+            while end < length and source[end] != "`" and not source.startswith("${", end):
+                end += 2 if source[end] == "\\" else 1
+            if char == "}":
+                substitutions.pop()
+            if source.startswith("${", end):
+                substitutions.append(0)
+                emit(source[i:end + 2])
+                last, i = "{", end + 2
+            else:
+                emit(source[i:end + 1])
+                last, i = "string", end + 1
+        elif char == "/" and (not last or last in _JS_REGEX_PRECEDERS):
+            end, in_class = i + 1, False
+            while end < length and (in_class or source[end] != "/") and source[end] != "\n":
+                if source[end] == "\\":
+                    end += 1
+                elif source[end] == "[":
+                    in_class = True
+                elif source[end] == "]":
+                    in_class = False
+                end += 1
+            match = _JS_WORD.match(source, end + 1)
+            end = match.end() if match else end + 1  # flags
+            emit(source[i:end])
+            last, i = "regex", end
+        else:
+            match = _JS_WORD.match(source, i)
+            if match:
+                token = match.group()
+            else:
+                token = char
+                if substitutions and char in "{}":
+                    substitutions[-1] += 1 if char == "{" else -1
+            # "a++ / b" divides
+            repeated = token in "+-" and last == token and not gap
+            emit(token)
+            last = token * 2 if repeated else token
+            i += len(token)
+    return "".join(out) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def _brotli_compress(data: bytes) -> Optional[bytes]:
+    try:
+        # Optional dependency; gzip alone is used without it
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def fingerprint(path: str, digest: str) -> str:
+    """
+    css/bootstrap.css -> css/bootstrap.<digest>.css
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.{digest}{extension}"
+
+
+class Asset:
+    __slots__ = ("path", "hashed_path", "media_type", "etag", "variants")
+
+    def __init__(self, path: str, hashed_path: str, media_type: str, etag: str, variants: Dict[str, bytes]):
+        self.path = path
+        self.hashed_path = hashed_path
+        self.media_type = media_type
+        self.etag = etag
+        # Content encoding ("identity", "gzip", "br") -> body
+        self.variants = variants
+
+    def choose(self, accept_encoding: str) -> str:
+        accepted = {token.split(";")[0].strip() for token in accept_encoding.lower().split(",")
+                    if not token.replace(" ", "").endswith(";q=0")}
+        for encoding in ENCODINGS:
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return "identity"
+
+
+def build_asset(path: str, data: bytes) -> Asset:
+    extension = os.path.splitext(path)[1]
+    minifier = MINIFIERS.get(extension)
+    if minifier is not None:
+        data = minifier(data.decode("utf-8")).encode("utf-8")
+    digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+    variants = {"identity": data}
+    if extension in COMPRESSIBLE_EXTENSIONS and len(data) >= COMPRESS_MIN_SIZE:
+        # mtime=0 keeps the gzip bytes, and so the build, reproducible
+        variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+        compressed = _brotli_compress(data)
+        if compressed is not None:
+            variants["br"] = compressed
+    media_type = MEDIA_TYPES.get(extension) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+        media_type += "; charset=utf-8"
+    return Asset(path, fingerprint(path, digest), media_type, '"' + digest + '"', variants)
+
+
+class AssetPipeline:
+    """
+    Builds every file under the source directory once and resolves both
+    plain and fingerprinted paths to the built asset.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._assets: Optional[Dict[str, Asset]] = None
+        self._by_url: Dict[str, Asset] = {}
+
+    @property
+    def assets(self) -> Dict[str, Asset]:
+        if self._assets is None:
+            self.build()
+        return self._assets
+
+    def build(self) -> int:
+        """
+        Minify, fingerprint and compress every file. Returns the number of assets.
+        """
+        assets = {}
+        for root, _, files in os.walk(self.directory):
+            for name in sorted(files):
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as file:
+                    assets[path] = build_asset(path, file.read())
+        self._by_url = {**{asset.path: asset for asset in assets.values()},
+                        **{asset.hashed_path: asset for asset in assets.values()}}
+        self._assets = assets
+        return len(assets)
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        if self._assets is None:
+            self.build()
+        return self._by_url.get(path)
+
+    def url_path(self, path: str) -> str:
+        """
+        Fingerprinted path of an asset, relative to the static mount. Unknown
+        paths are returned unchanged.
+        """
+        asset = self.assets.get(path)
+        return asset.hashed_path if asset is not None else path
+
+    def manifest(self) -> Dict[str, str]:
+        return {path: asset.hashed_path for path, asset in sorted(self.assets.items())}
+
+    def write(self, output: str) -> int:
+        """
+        Write the fingerprinted files, their .gz/.br siblings and a
+        manifest.json to a directory, for serving from a CDN or proxy.
+        """
+        suffixes = {"identity": "", "gzip": ".gz", "br": ".br"}
+        for asset in self.assets.values():
+            target = os.path.join(output, *asset.hashed_path.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            for encoding, body in asset.variants.items():
+                with open(target + suffixes[encoding], "wb") as file:
+                    file.write(body)
+        with open(os.path.join(output, "manifest.json"), "w") as file:
+            json.dump(self.manifest(), file, indent=2)
+        return len(self.assets)
+
+
+class StaticAssets:
+    """
+    ASGI app serving the pipeline's assets: precompressed variant by
+    Accept-Encoding, immutable caching for fingerprinted URLs and ETag/304
+    for everything.
+    """
+
+    def __init__(self, pipeline: AssetPipeline):
+        self.pipeline = pipeline
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        path = scope["path"][len(scope.get("root_path", "")):].lstrip("/")
+        if scope["method"] not in ("GET", "HEAD"):
+            await self.respond(send, 405, [(b"allow", b"GET, HEAD")])
+            return
+        asset = self.pipeline.lookup(path)
+        if asset is None:
+            await self.respond(send, 404, [(b"content-type", b"text/plain; charset=utf-8")], b"Not Found")
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = asset.choose(request_headers.get("accept-encoding", ""))
+        # Each encoding is a different representation and needs its own validator
+        etag = asset.etag if encoding == "identity" else asset.etag[:-1] + "-" + encoding + '"'
+        cache_control = IMMUTABLE_CACHE_CONTROL if path == asset.hashed_path else REVALIDATE_CACHE_CONTROL
+        headers = [(b"etag", etag.encode()), (b"cache-control", cache_control.encode()),
+                   (b"vary", b"Accept-Encoding")]
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            await self.respond(send, 304, headers)
+            return
+
+        body = asset.variants[encoding]
+        headers += [(b"content-type", asset.media_type.encode()), (b"content-length", str(len(body)).encode())]
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        await self.respond(send, 200, headers, b"" if scope["method"] == "HEAD" else body)
+
+    @staticmethod
+    async def respond(send, status_code: int, headers: list, body: bytes = b""):
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+pipeline = AssetPipeline(STATIC_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True, help="directory to write the built assets to")
+    arguments = parser.parse_args()
+    print(f"wrote {pipeline.write(arguments.output)} assets to {arguments.output}")
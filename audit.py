@@ -0,0 +1,129 @@
+"""
+Write-behind audit trail. Handlers append a record to an in-memory queue,
+which costs no database round trip; a background task writes the queue to
+audit_log with multi-row INSERTs once AUDIT_BATCH_SIZE records are waiting
+or every AUDIT_FLUSH_INTERVAL seconds, and once more at shutdown.
+
+Records still queued when the process dies are lost, as are records beyond
+AUDIT_QUEUE_LIMIT while the database is unavailable (counted in
+audit_records_total{outcome="dropped"}).
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from TodoApp.database import database
+from TodoApp.metrics import CallbackMetric, Counter, Histogram, registry
+from TodoApp.models import AuditLog, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Records written per INSERT, and how many waiting records trigger a flush before the interval is up
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+# Longest time a record waits in memory before it is written
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+# Records kept while the database cannot be written to; newer ones are dropped beyond it
+AUDIT_QUEUE_LIMIT = int(os.getenv("AUDIT_QUEUE_LIMIT", "100000"))
+
+AUDIT_RECORDS = registry.register(Counter(
+    "audit_records_total", "Audit records written to the database or dropped", ("outcome",)))
+AUDIT_FLUSH_LATENCY = registry.register(Histogram(
+    "audit_flush_duration_seconds", "Time to write one batch of audit records"))
+
+
+class AuditWriter:
+    """
+    The in-memory queue of audit records and the batches that drain it.
+    """
+
+    def __init__(self, engine: Callable[[], AsyncEngine], batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, queue_limit: int = AUDIT_QUEUE_LIMIT):
+        # A callable, so the engine is only created once something is flushed
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_limit = queue_limit
+        self.pending: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._flushing = asyncio.Lock()
+
+    def record(self, entity: str, entity_id: Optional[int], action: str, actor_id: Optional[int] = None,
+               **details: Any):
+        """
+        Queue one audit record. Call it after the change has committed.
+        """
+        if len(self.pending) >= self.queue_limit:
+            AUDIT_RECORDS.inc(1, "dropped")
+            logger.error("Audit queue full, dropping %s of %s %s", action, entity, entity_id)
+            return
+        self.pending.append({"at": utcnow(), "actor_id": actor_id, "entity": entity, "entity_id": entity_id,
+                             "action": action, "details": details or None})
+        # Only on the record that fills a batch: after a failed flush the queue stays full
+        if len(self.pending) == self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Write everything queued so far, one batch per INSERT. A batch that
+        fails goes back to the front of the queue and the error is raised.
+        Returns the number of records written.
+        """
+        written = 0
+        async with self._flushing:
+            while self.pending:
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                start = time.perf_counter()
+                try:
+                    async with self.engine().begin() as conn:
+                        await conn.execute(insert(AuditLog), batch)
+                except BaseException:
+                    # Cancellation included: the shutdown flush writes the batch instead
+                    self.pending.extendleft(reversed(batch))
+                    raise
+                AUDIT_FLUSH_LATENCY.observe(time.perf_counter() - start)
+                AUDIT_RECORDS.inc(len(batch), "written")
+                written += len(batch)
+        return written
+
+    async def run(self):
+        """
+        Flush every interval, or as soon as a full batch is waiting, until
+        cancelled. After a failure the next attempt waits a full interval.
+        """
+        # Bound to the running loop on first wait, so every run gets its own
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Writing %d audit records failed, retrying", len(self.pending))
+                await asyncio.sleep(self.flush_interval)
+                self._wakeup.clear()
+
+    async def close(self):
+        """
+        Final flush at shutdown. Records that cannot be written are dropped.
+        """
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Dropping %d audit records that could not be written", len(self.pending))
+            AUDIT_RECORDS.inc(len(self.pending), "dropped")
+            self.pending.clear()
+
+
+audit_log = AuditWriter(lambda: database.engine)
+
+registry.register(CallbackMetric(
+    "audit_queue_depth", "Audit records waiting to be written", "gauge", lambda: {(): len(audit_log.pending)}))
@@ -0,0 +1,95 @@
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+
+def use_benchmark_database(path: str = None) -> str:
+    """
+    Point DB_URL at a scratch SQLite file unless one is already configured,
+    and switch off rate limiting. Must run before anything from TodoApp is imported.
+    """
+    if "DB_URL" not in os.environ:
+        path = path or os.path.join(tempfile.mkdtemp(prefix="todoapp-bench-"), "bench.db")
+        os.environ["DB_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+    # Load tests hammer single users on purpose; keep the rate limiter out of the numbers
+    os.environ.setdefault("RATE_LIMITS", "")
+    return os.environ["DB_URL"]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: list, elapsed: float = None) -> dict:
+    """
+    p50/p95/p99/mean in milliseconds, plus throughput when the wall time is known.
+    """
+    values = sorted(latencies)
+    summary = {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 4) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 4),
+        "p95_ms": round(percentile(values, 95) * 1000, 4),
+        "p99_ms": round(percentile(values, 99) * 1000, 4),
+    }
+    if elapsed:
+        summary["throughput_rps"] = round(len(values) / elapsed, 2)
+    return summary
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+def git_commit() -> str:
+    """
+    The commit that was measured, or "" when tracked files differ from it:
+    HEAD is then only the parent of the code that ran.
+    """
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        if git("status", "--porcelain", "--untracked-files=no"):
+            return ""
+        return git("rev-parse", "--short", "HEAD")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(path: str, kind: str, params: dict, results: dict):
+    """
+    Write machine-readable results; compare two files with benchmarks/compare.py.
+    """
+    document = {
+        "kind": kind,
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        # Where the file went says nothing about the run, and would leak local paths into committed baselines
+        "params": {key: value for key, value in params.items() if key != "output"},
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return document
@@ -0,0 +1,65 @@
+"""
+Compare two benchmark result files, e.g. from the base branch and a change:
+
+    python -m TodoApp.benchmarks.compare before.json after.json --threshold 10
+
+Exits with status 1 when a latency percentile got slower by more than the
+threshold (in percent), so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+# Lower is better for these, higher for throughput
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+THROUGHPUT_KEYS = ("throughput_rps", "ops_per_sec")
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def compare(before: dict, after: dict, threshold: float) -> list:
+    """
+    Return (benchmark, metric, before, after, percent change, regressed) rows.
+    """
+    rows = []
+    for name, old in sorted(before["results"].items()):
+        new = after["results"].get(name)
+        if new is None:
+            continue
+        for key in LATENCY_KEYS + THROUGHPUT_KEYS:
+            if key not in old or key not in new:
+                continue
+            percent = change(old[key], new[key])
+            regressed = percent > threshold if key in LATENCY_KEYS else percent < -threshold
+            rows.append((name, key, old[key], new[key], percent, regressed))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    # An empty commit is a run of uncommitted changes
+    print(f"{before.get('commit') or 'uncommitted'} -> {after.get('commit') or 'uncommitted'}")
+    rows = compare(before, after, args.threshold)
+    for name, key, old, new, percent, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:34} {key:15} {old:>12.3f} {new:>12.3f} {percent:>+8.1f}%{flag}")
+    if "peak_rss_mb" in before and "peak_rss_mb" in after:
+        print(f"{'peak RSS (MB)':50} {before['peak_rss_mb']:>12.2f} {after['peak_rss_mb']:>12.2f} "
+              f"{change(before['peak_rss_mb'], after['peak_rss_mb']):>+8.1f}%")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
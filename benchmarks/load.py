@@ -0,0 +1,201 @@
+"""
+Load test: seed a database with users and todos, then drive every router
+at fixed concurrency levels and report latency percentiles, throughput and
+peak RSS.
+
+Run from the directory containing the TodoApp package:
+
+    python -m TodoApp.benchmarks.load --users 20 --todos-per-user 500 --concurrency 1,8,32
+
+Without DB_URL a scratch SQLite file is used. With --url the requests go to
+a running server instead of the in-process app (the database must then be
+the one that server uses).
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import timedelta
+
+from TodoApp.benchmarks.common import peak_rss_mb, summarize, use_benchmark_database, write_results
+
+PASSWORD = "benchmark-password"
+WORDS = ["buy", "milk", "bread", "call", "mom", "fix", "bike", "pay", "rent", "book", "flight", "clean",
+         "garage", "write", "report", "water", "plants", "renew", "passport", "walk", "dog"]
+
+
+async def seed(users: int, todos_per_user: int, batch_size: int = 5000) -> dict:
+    """
+    Create the schema and insert the users and todos with multi-row INSERTs.
+    Returns each user's id, name and todo id range.
+    """
+    from sqlalchemy import func, insert, select
+
+    from TodoApp.database import Base, engine
+    from TodoApp.models import Todos, Users
+    from TodoApp.security import bcrypt_context
+
+    rng = random.Random(42)
+    # One hash shared by every user: seeding should not spend minutes in bcrypt
+    hashed_password = bcrypt_context.hash(PASSWORD)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        first_user = (await conn.execute(select(func.coalesce(func.max(Users.id), 0)))).scalar() + 1
+        await conn.execute(insert(Users), [
+            {"username": f"bench{first_user + i}", "email": f"bench{first_user + i}@example.com",
+             "first_name": "Bench", "last_name": f"User{first_user + i}", "hashed_password": hashed_password,
+             "role": "admin" if i == 0 else "user", "is_active": True}
+            for i in range(users)
+        ])
+        rows = (await conn.execute(select(Users.id, Users.username, Users.role)
+                                   .where(Users.id >= first_user).order_by(Users.id))).all()
+        batch = []
+        for user_id, _, _ in rows:
+            for _ in range(todos_per_user):
+                batch.append({"title": " ".join(rng.sample(WORDS, 3)), "description": " ".join(rng.sample(WORDS, 6)),
+                              "priority": rng.randint(1, 10), "complete": rng.random() < 0.3, "owner_id": user_id})
+                if len(batch) >= batch_size:
+                    await conn.execute(insert(Todos), batch)
+                    batch = []
+        if batch:
+            await conn.execute(insert(Todos), batch)
+        ranges = dict((owner_id, (low, high)) for owner_id, low, high in (await conn.execute(
+            select(Todos.owner_id, func.min(Todos.id), func.max(Todos.id))
+            .where(Todos.owner_id >= first_user).group_by(Todos.owner_id))).all())
+    return {user_id: {"username": username, "role": role, "todo_ids": ranges.get(user_id, (1, 1))}
+            for user_id, username, role in rows}
+
+
+def build_scenarios(users: dict) -> dict:
+    """
+    Each scenario picks a random user and returns (method, url, request kwargs).
+    """
+    from TodoApp.routers.auth import create_access_token
+
+    tokens = {user_id: {"Authorization": "Bearer " + create_access_token(user["username"], user_id, user["role"],
+                                                                           timedelta(hours=2))}
+              for user_id, user in users.items()}
+    user_ids = list(users)
+    admin_id = next(user_id for user_id, user in users.items() if user["role"] == "admin")
+
+    def pick():
+        user_id = random.choice(user_ids)
+        return user_id, tokens[user_id]
+
+    def get_token():
+        user_id = random.choice(user_ids)
+        return "POST", "/auth/get-token", {"data": {"username": users[user_id]["username"], "password": PASSWORD}}
+
+    def list_todos():
+        _, headers = pick()
+        return "GET", "/todos/", {"headers": headers, "params": {"limit": 100}}
+
+    def list_filtered():
+        _, headers = pick()
+        return "GET", "/todos/", {"headers": headers, "params": {"complete": "false", "sort": "-priority", "limit": 50}}
+
+    def read_one():
+        user_id, headers = pick()
+        low, high = users[user_id]["todo_ids"]
+        return "GET", f"/todos/{random.randint(low, high)}", {"headers": headers}
+
+    def search():
+        _, headers = pick()
+        return "GET", "/todos/search", {"headers": headers, "params": {"q": random.choice(WORDS)}}
+
+    def create():
+        _, headers = pick()
+        return "POST", "/todos/", {"headers": headers, "json": {"title": "Benchmark todo",
+                                                                 "description": "Created by the load test",
+                                                                 "priority": random.randint(1, 10)}}
+
+    def admin_list():
+        return "GET", "/admin/todos", {"headers": tokens[admin_id], "params": {"limit": 100}}
+
+    def get_user():
+        _, headers = pick()
+        return "GET", "/users/get-user", {"headers": headers}
+
+    return {
+        "auth.get_token": get_token,
+        "todos.list": list_todos,
+        "todos.list_filtered": list_filtered,
+        "todos.read_one": read_one,
+        "todos.search": search,
+        "todos.create": create,
+        "admin.list": admin_list,
+        "users.get_user": get_user,
+    }
+
+
+async def run_scenario(client, scenario, requests: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            method, url, kwargs = scenario()
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = summarize(latencies, time.perf_counter() - start)
+    summary["statuses"] = statuses
+    summary["errors"] = sum(count for code, count in statuses.items() if int(code) >= 400)
+    return summary
+
+
+async def main(args) -> dict:
+    import httpx
+
+    users = await seed(args.users, args.todos_per_user)
+    scenarios = build_scenarios(users)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        from TodoApp.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    results = {}
+    async with client:
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            for name in selected:
+                requests = args.auth_requests if name.startswith("auth.") else args.requests
+                summary = await run_scenario(client, scenarios[name], requests, concurrency)
+                results[f"{name}@c{concurrency}"] = summary
+                print(f"{name:22} c={concurrency:<4} p50={summary['p50_ms']:>9.2f}ms p95={summary['p95_ms']:>9.2f}ms "
+                      f"p99={summary['p99_ms']:>9.2f}ms {summary['throughput_rps']:>9.1f} req/s "
+                      f"errors={summary['errors']}")
+    print(f"peak RSS: {peak_rss_mb()} MB")
+
+    from TodoApp.database import engine
+    await engine.dispose()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="users to seed")
+    parser.add_argument("--todos-per-user", type=int, default=1000, help="todos to seed per user")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario and level")
+    parser.add_argument("--auth-requests", type=int, default=50, help="requests for the bcrypt-bound auth scenarios")
+    parser.add_argument("--scenarios", default="", help="comma separated subset of scenarios to run")
+    parser.add_argument("--url", default="", help="base URL of a running server instead of the in-process app")
+    parser.add_argument("--db-path", default=None, help="SQLite file to seed when DB_URL is not set")
+    parser.add_argument("--output", default="bench-load.json", help="where to write the JSON results")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    use_benchmark_database(arguments.db_path)
+    write_results(arguments.output, "load", vars(arguments), asyncio.run(main(arguments)))
@@ -0,0 +1,144 @@
+"""
+Micro-benchmarks for hot functions that run on every request.
+
+    python -m TodoApp.benchmarks.micro --iterations 2000 --output bench-micro.json
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+from TodoApp.benchmarks.common import summarize, use_benchmark_database, write_results
+
+
+def measure(func, iterations: int, warmup: int = 50) -> dict:
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    summary = summarize(latencies)
+    summary["ops_per_sec"] = round(iterations / sum(latencies), 1) if latencies else 0.0
+    return summary
+
+
+def fake_request():
+    """
+    A bare request bound to the app, enough for url_for in templates.
+    """
+    from starlette.requests import Request
+
+    from TodoApp.main import app
+
+    return Request({"type": "http", "method": "GET", "path": "/todos/todo-page", "root_path": "", "scheme": "http",
+                    "server": ("bench", 80), "headers": [], "query_string": b"", "app": app, "router": app.router})
+
+
+def sample_todos(count: int) -> list:
+    return [{"id": i, "title": f"Todo {i}", "description": "Benchmark todo description", "priority": i % 10 + 1,
+             "complete": i % 3 == 0, "owner_id": 1} for i in range(1, count + 1)]
+
+
+def build_list_benchmarks(loop, list_sizes) -> dict:
+    """
+    The list endpoints before and after lean serialization: full ORM objects
+    through jsonable_encoder and json.dumps, against the selected columns as
+    plain dicts through schemas.dumps (orjson when installed).
+    """
+    import json
+
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import select
+
+    from TodoApp.benchmarks.load import seed
+    from TodoApp.database import SessionLocal
+    from TodoApp.models import TODO_COLUMNS, Todos
+    from TodoApp.schemas import dumps, rows_to_dicts
+
+    owner_id = next(iter(loop.run_until_complete(seed(1, max(list_sizes)))))
+
+    async def orm_list(size):
+        async with SessionLocal() as db:
+            result = await db.execute(select(Todos).where(Todos.owner_id == owner_id).order_by(Todos.id).limit(size))
+            return json.dumps(jsonable_encoder(result.scalars().all())).encode()
+
+    async def columns_list(size):
+        async with SessionLocal() as db:
+            result = await db.execute(select(*TODO_COLUMNS).where(Todos.owner_id == owner_id)
+                                      .order_by(Todos.id).limit(size))
+            return dumps(rows_to_dicts(result.all()))
+
+    benchmarks = {}
+    for size in list_sizes:
+        todos = [Todos(**todo) for todo in sample_todos(size)]
+        rows = loop.run_until_complete(columns_list(size))
+        dicts = json.loads(rows)
+        benchmarks[f"serialize.jsonable_encoder.{size}"] = lambda todos=todos: json.dumps(jsonable_encoder(todos))
+        benchmarks[f"serialize.dumps.{size}"] = lambda dicts=dicts: dumps(dicts)
+        benchmarks[f"list.orm.{size}"] = lambda size=size: loop.run_until_complete(orm_list(size))
+        benchmarks[f"list.columns.{size}"] = lambda size=size: loop.run_until_complete(columns_list(size))
+    return benchmarks
+
+
+def build_benchmarks(loop, list_sizes) -> dict:
+    from TodoApp.routers.auth import create_access_token, get_current_user
+    from TodoApp.routers.todos import TodosRequest
+    from TodoApp.security import token_cache
+    from TodoApp.templating import get_templates
+
+    token = create_access_token("bench", 1, "user", timedelta(hours=1))
+    payload = {"title": "Buy groceries", "description": "Milk, Bread, Eggs", "priority": 2, "complete": False}
+    request = fake_request()
+    template = get_templates().get_template("todo.html")
+    user = {"username": "bench", "id": 1, "role": "user"}
+
+    def current_user_uncached():
+        token_cache.clear()
+        loop.run_until_complete(get_current_user(token))
+
+    benchmarks = {
+        "create_access_token": lambda: create_access_token("bench", 1, "user", timedelta(minutes=30)),
+        "get_current_user.cached": lambda: loop.run_until_complete(get_current_user(token)),
+        "get_current_user.uncached": current_user_uncached,
+        "TodosRequest.validate": lambda: TodosRequest.model_validate(payload),
+    }
+    for size in list_sizes:
+        todos = sample_todos(size)
+        benchmarks[f"render.todo_page.{size}"] = (
+            lambda todos=todos: template.render(request=request, todos=todos, user=user))
+    benchmarks.update(build_list_benchmarks(loop, list_sizes))
+    return benchmarks
+
+
+def main(args) -> dict:
+    from TodoApp.database import engine
+
+    sizes = [int(size) for size in args.list_sizes.split(",")]
+    loop = asyncio.new_event_loop()
+    results = {}
+    for name, func in build_benchmarks(loop, sizes).items():
+        # Benchmarks over a list end in its size; scale their iteration count down with it
+        size = name.rsplit(".", 1)[-1]
+        iterations = args.iterations if not size.isdigit() else max(10, min(args.iterations, args.iterations * 10 // int(size)))
+        results[name] = measure(func, iterations, warmup=min(50, iterations))
+        print(f"{name:32} p50={results[name]['p50_ms']:>9.4f}ms p99={results[name]['p99_ms']:>9.4f}ms "
+              f"{results[name]['ops_per_sec']:>12.1f} ops/s")
+    loop.run_until_complete(engine.dispose())
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="timed calls per benchmark")
+    parser.add_argument("--list-sizes", default="10,1000,10000",
+                        help="todo counts for the rendering and list serialization benchmarks")
+    parser.add_argument("--output", default="bench-micro.json", help="where to write the JSON results")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    use_benchmark_database()
+    write_results(arguments.output, "micro", vars(arguments), main(arguments))
@@ -0,0 +1,83 @@
+"""
+Cold start profile: time to import the app, time for the lifespan startup
+to complete, and the cumulative import time of every TodoApp module, each
+measured in fresh interpreters.
+
+    python -m TodoApp.benchmarks.startup --runs 10 --output startup.json
+
+Compare against the checked-in baseline to catch import-time regressions:
+
+    python -m TodoApp.benchmarks.compare TodoApp/benchmarks/baselines/startup.json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from TodoApp.benchmarks.common import REPO_DIR, summarize, use_benchmark_database, write_results
+
+# Runs in a fresh interpreter per sample
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import TodoApp.main as main
+imported = time.perf_counter()
+
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(json.dumps({"import": imported - start, "startup": ready - imported}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Cumulative seconds per TodoApp module from python -X importtime output.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name.startswith("TodoApp") and cumulative.strip().isdigit():
+            modules[name] = int(cumulative) / 1_000_000  # microseconds
+    return modules
+
+
+def sample() -> dict:
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(REPO_DIR))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], env=env,
+                               capture_output=True, text=True, check=True)
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings.update({f"module.{name}": seconds for name, seconds in parse_importtime(completed.stderr).items()})
+    return timings
+
+
+def main(args) -> dict:
+    samples = [sample() for _ in range(args.runs)]
+    results = {}
+    for name in samples[0]:
+        results[name if name.startswith("module.") else f"app.{name}"] = summarize(
+            [timings[name] for timings in samples if name in timings])
+    for name, summary in results.items():
+        if not name.startswith("module.") or summary["p50_ms"] >= args.min_ms:
+            print(f"{name:44} p50={summary['p50_ms']:>9.2f}ms p95={summary['p95_ms']:>9.2f}ms")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters to sample")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="only print modules at least this slow")
+    parser.add_argument("--output", default="bench-startup.json", help="where to write the JSON results")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    use_benchmark_database()
+    write_results(arguments.output, "startup", vars(arguments), main(arguments))
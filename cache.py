@@ -0,0 +1,191 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+from TodoApp.metrics import CallbackMetric, registry
+
+# Entries kept by the in-process cache and how long any entry may be served
+TODO_CACHE_SIZE = int(os.getenv("TODO_CACHE_SIZE", "10000"))
+TODO_CACHE_TTL = float(os.getenv("TODO_CACHE_TTL", "60"))  # seconds
+# Set to use a shared Redis-compatible store instead of the in-process LRU
+TODO_CACHE_REDIS_URL = os.getenv("TODO_CACHE_REDIS_URL")
+# How long a loaded user row may be reused across requests; 0 loads it once per request
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "0"))  # seconds
+
+
+class CacheBackend:
+    """
+    Storage used by ResponseCache. Methods are async so a networked store can
+    implement them. Counters must outlive the entries written under them:
+    they are how a write invalidates every cached response of an owner.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+
+class LRUCacheBackend(CacheBackend):
+    """
+    In-process LRU with per-entry expiry. Counters live outside the LRU so
+    eviction can never roll an owner back to an older generation.
+    """
+
+    def __init__(self, max_size: int = TODO_CACHE_SIZE):
+        self.max_size = max_size
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters: dict = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Adapter for a redis.asyncio-compatible client (get, set with ex, incr).
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, ex=max(1, int(ttl)))
+
+    async def get_counter(self, key: str) -> int:
+        return int(await self.client.get(key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    next_cursor: Optional[str]
+    body: bytes
+
+
+class ResponseCache:
+    """
+    Serialized responses cached per owner and query. Every write bumps the
+    owner's generation, which makes all of their cached entries unreachable
+    in O(1) without having to find and delete them.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = TODO_CACHE_TTL, namespace: str = "todos"):
+        self.backend = backend
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _generation_key(self, owner_id: Any) -> str:
+        return f"{self.namespace}:{owner_id}:gen"
+
+    async def key(self, owner_id: Any, variant: str) -> str:
+        """
+        Resolve the key of a response under the owner's current generation.
+        Take it before querying the database: if a write lands in between,
+        the stale result is stored under a generation nobody reads any more.
+        """
+        generation = await self.backend.get_counter(self._generation_key(owner_id))
+        return f"{self.namespace}:{owner_id}:{generation}:{variant}"
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, next_cursor, body = value.split(b"\n", 2)
+        return CachedResponse(etag.decode(), next_cursor.decode() or None, body)
+
+    async def set(self, key: str, body: bytes, next_cursor: Optional[str] = None) -> CachedResponse:
+        response = CachedResponse(make_etag(body), next_cursor, body)
+        value = b"\n".join([response.etag.encode(), (next_cursor or "").encode(), body])
+        await self.backend.set(key, value, self.ttl)
+        return response
+
+    async def invalidate(self, owner_id: Any):
+        await self.backend.incr(self._generation_key(owner_id))
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": getattr(self.backend, "evictions", None),
+        }
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison as used for If-None-Match (RFC 9110, section 13.1.2).
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def build_backend() -> CacheBackend:
+    if TODO_CACHE_REDIS_URL:
+        # Optional dependency, only needed when a shared cache is configured
+        import redis.asyncio
+        return RedisCacheBackend(redis.asyncio.from_url(TODO_CACHE_REDIS_URL))
+    return LRUCacheBackend(TODO_CACHE_SIZE)
+
+
+todo_cache = ResponseCache(build_backend())
+user_cache = ResponseCache(build_backend(), ttl=USER_CACHE_TTL, namespace="users")
+
+registry.register(CallbackMetric(
+    "todo_cache_events_total", "Todo response cache lookups and invalidations", "counter",
+    lambda: {("hit",): todo_cache.hits, ("miss",): todo_cache.misses, ("invalidation",): todo_cache.invalidations},
+    ("event",)))
@@ -1,7 +1,38 @@
+import asyncio
+import itertools
+import logging
 import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, TypeVar
+
+from fastapi import Request
+from sqlalchemy import Select, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from TodoApp import metrics
+from TodoApp.security import client_key
+from TodoApp.sharding import DB_SHARD_URLS, ShardRouter, parse_shard_urls
+
+logger = logging.getLogger(__name__)
+
+# Async driver used for each supported backend
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+# Comma separated read replicas of DB_URL; GET requests read from them when set
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+# After a client writes, its reads stay on the primary this long so it sees its own writes
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+# How often replicas are pinged, and how long a ping may take before the replica counts as down
+DB_REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "5"))
+DB_REPLICA_HEALTH_TIMEOUT = float(os.getenv("DB_REPLICA_HEALTH_TIMEOUT", "1"))
+# Connections per engine opened at startup, so the first requests do not pay for connecting
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))
+
+T = TypeVar("T")
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
 
 def get_db_url():
     if "DB_URL" not in os.environ:
@@ -9,21 +40,265 @@ def get_db_url():
     return os.getenv("DB_URL")
 
 
-SQLALCHEMY_DATABASE_URL = get_db_url()
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def to_async_url(url: str) -> str:
+    """
+    Swap the driver of a plain database URL for its async counterpart,
+    e.g. postgresql://... -> postgresql+asyncpg://...
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver and parsed.get_driver_name() != driver:
+        parsed = parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}")
+    return parsed.render_as_string(hide_password=False)
+
+
+def get_engine_options(url: str) -> dict:
+    """
+    Connection pool settings, configurable through env vars next to DB_URL.
+    """
+    options = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),  # seconds
+    }
+    # SQLite gets a pool sized by the dialect itself
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),  # seconds
+        )
+    return options
+
+
+class ReplicaPool:
+    """
+    Read replicas taken in turn, minus those failing their health check,
+    plus the read-your-writes window of each client that wrote recently.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], sticky_seconds: float = DB_REPLICA_STICKY_SECONDS,
+                 max_sticky: int = 100000):
+        self.engines = engines
+        self.healthy = list(engines)
+        self.sticky_seconds = sticky_seconds
+        self.max_sticky = max_sticky
+        self._turn = itertools.count()
+        # client key -> monotonic time its window ends, oldest first
+        self._sticky: "OrderedDict[str, float]" = OrderedDict()
+
+    def choose(self) -> Optional[AsyncEngine]:
+        healthy = self.healthy
+        return healthy[next(self._turn) % len(healthy)] if healthy else None
+
+    def mark_write(self, key: str):
+        self._sticky.pop(key, None)
+        self._sticky[key] = time.monotonic() + self.sticky_seconds
+        now = time.monotonic()
+        # Windows all have the same length, so the expired ones are at the front
+        while self._sticky and (next(iter(self._sticky.values())) <= now or len(self._sticky) > self.max_sticky):
+            self._sticky.popitem(last=False)
+
+    def is_sticky(self, key: str) -> bool:
+        return self._sticky.get(key, 0.0) > time.monotonic()
+
+    async def check(self) -> List[AsyncEngine]:
+        """
+        Ping every replica and keep only those that answer in time.
+        """
+        results = await asyncio.gather(*(self._ping(engine) for engine in self.engines))
+        healthy = [engine for engine, ok in zip(self.engines, results) if ok]
+        for engine in set(self.healthy) ^ set(healthy):
+            logger.warning("Replica %s is %s", engine.url.render_as_string(hide_password=True),
+                           "back in rotation" if engine in healthy else "down, reading from the others")
+        self.healthy = healthy
+        return healthy
+
+    @staticmethod
+    async def _ping(engine: AsyncEngine) -> bool:
+        async def ping():
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        try:
+            await asyncio.wait_for(ping(), DB_REPLICA_HEALTH_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def run_health_checks(self, interval: float = DB_REPLICA_HEALTH_INTERVAL):
+        while True:
+            await self.check()
+            await asyncio.sleep(interval)
+
+
+class RoutingSession(Session):
+    """
+    Sends SELECTs to the replica chosen for the session, if any, and
+    everything else to the primary. Once the session has written, its
+    reads stay on the primary too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not self._flushing and not self.info.get("wrote") \
+                and (clause is None or isinstance(clause, Select)):
+            return replica.sync_engine
+        if self._flushing or (clause is not None and not isinstance(clause, Select)):
+            self.info["wrote"] = True
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def remember_write(session):
+    # Start the writer's read-your-writes window
+    replicas, key = session.info.get("replicas"), session.info.get("client_key")
+    if session.info.pop("wrote", False) and replicas is not None and key is not None:
+        replicas.mark_write(key)
 
-# Uncomment the following lines to use SQLite instead of PostgreSQL
-# SQLALCHEMY_DATABASE_URL = "sqlite:///./todosapp.db"
-# engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def route_session(db: AsyncSession, replicas: ReplicaPool, read_only: bool, key: Optional[str]):
+    """
+    Read from a replica when the request cannot write and its client has not
+    written within the sticky window.
+    """
+    info = db.sync_session.info
+    info["replicas"] = replicas
+    info["client_key"] = key
+    if read_only and not (key is not None and replicas.is_sticky(key)):
+        info["replica"] = replicas.choose()
+
+
+class Database:
+    """
+    The primary engine, its replicas, the todo shards and the session
+    factory, created on first use rather than at import: importing the app
+    needs neither DB_URL nor a database driver, and nothing connects before
+    startup asks it to.
+    """
+
+    def __init__(self):
+        self._engine: Optional[AsyncEngine] = None
+        self._replicas: Optional[ReplicaPool] = None
+        self._shards: Optional[ShardRouter] = None
+        self._sessionmaker: Optional[async_sessionmaker] = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            url = to_async_url(get_db_url())
+            self._engine = create_async_engine(url, **get_engine_options(url))
+            metrics.instrument_engine(self._engine)
+        return self._engine
+
+    @property
+    def replicas(self) -> ReplicaPool:
+        if self._replicas is None:
+            engines = [create_async_engine(to_async_url(url), **get_engine_options(to_async_url(url)))
+                       for url in DB_REPLICA_URLS]
+            for number, replica in enumerate(engines):
+                metrics.instrument_engine(replica, f"replica{number}")
+            self._replicas = ReplicaPool(engines)
+        return self._replicas
+
+    @property
+    def shards(self) -> Optional[ShardRouter]:
+        """
+        The todo shards, or None when todos live on the primary.
+        """
+        if self._shards is None and DB_SHARD_URLS:
+            engines = {}
+            for name, url in parse_shard_urls(DB_SHARD_URLS).items():
+                engines[name] = create_async_engine(to_async_url(url), **get_engine_options(to_async_url(url)))
+                metrics.instrument_engine(engines[name], f"shard:{name}")
+            self._shards = ShardRouter(engines)
+        return self._shards
+
+    @property
+    def todo_sessionmakers(self) -> List[async_sessionmaker]:
+        """
+        One session factory per database holding todos.
+        """
+        shards = self.shards
+        return list(shards.sessionmakers.values()) if shards is not None else [self.sessionmaker]
+
+    @property
+    def sessionmaker(self) -> async_sessionmaker:
+        if self._sessionmaker is None:
+            # expire_on_commit=False keeps loaded attributes readable after commit without another round trip
+            self._sessionmaker = async_sessionmaker(bind=self.engine, class_=AsyncSession,
+                                                    sync_session_class=RoutingSession,
+                                                    autoflush=False, expire_on_commit=False)
+        return self._sessionmaker
+
+    async def warm_up(self, connections: int = DB_POOL_WARMUP):
+        """
+        Open (and ping) pool connections ahead of the first requests.
+        """
+        async def ping(engine: AsyncEngine):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        # Held concurrently, so each ping gets a connection of its own
+        shards = list(self.shards.engines.values()) if self.shards is not None else []
+        await asyncio.gather(*(ping(engine) for engine in [self.engine, *self.replicas.engines, *shards]
+                               for _ in range(connections)))
+
+    async def dispose(self):
+        for engine in [self._engine, *(self._replicas.engines if self._replicas else []),
+                       *(self._shards.engines.values() if self._shards else [])]:
+            if engine is not None:
+                await engine.dispose()
+
+
+database = Database()
+
+# To use SQLite instead of PostgreSQL set DB_URL=sqlite:///./todosapp.db
+
+
+def __getattr__(name: str):
+    # Lazy module attributes, kept for code that imports them by name
+    if name == "engine":
+        return database.engine
+    if name == "SessionLocal":
+        return database.sessionmaker
+    if name == "replicas":
+        return database.replicas
+    if name == "shards":
+        return database.shards
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    print("original get_db called")
-    try:
+async def get_db(request: Request):
+    async with database.sessionmaker() as db:
+        replicas = database.replicas
+        if replicas.engines:
+            route_session(db, replicas, request.method in ("GET", "HEAD"), await client_key(request.scope))
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+
+@asynccontextmanager
+async def owner_session(db: AsyncSession, owner_id: Optional[int]) -> AsyncIterator[AsyncSession]:
+    """
+    The session holding the owner's todos: a session on the owner's shard
+    when todos are sharded, otherwise the request's own session.
+    """
+    shards = database.shards
+    if shards is None or owner_id is None:
+        yield db
+        return
+    async with shards.session(owner_id) as shard_db:
+        yield shard_db
+
+
+async def scatter(db: AsyncSession, work: Callable[[AsyncSession], Awaitable[T]]) -> List[T]:
+    """
+    Run work against every database holding todos: each shard concurrently
+    when todos are sharded, otherwise just the request's session. Returns
+    one result per database, in shard order.
+    """
+    shards = database.shards
+    if shards is None:
+        return [await work(db)]
+    return await shards.gather(work)
@@ -0,0 +1,235 @@
+"""
+Live todo events: writes publish to a broker, every worker's hub fans the
+events out to one bounded queue per connected GET /todos/stream client.
+
+A client whose queue fills up is dropped rather than allowed to hold events
+(and memory) back; its stream ends with a "dropped" event, after which it
+reconnects and catches up through GET /todos/changes.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from TodoApp.metrics import CallbackMetric, registry
+from TodoApp.models import SYNC_COLUMNS
+from TodoApp.schemas import dumps
+from TodoApp.sync import format_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Events a subscriber may have waiting before it counts as too slow and is dropped
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+# Open streams allowed per user and worker
+EVENT_MAX_STREAMS_PER_USER = int(os.getenv("EVENT_MAX_STREAMS_PER_USER", "5"))
+# A comment line is sent after this many idle seconds, so proxies keep the connection open
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+# Set to share events between workers through Redis pub/sub instead of within the process
+EVENT_BROKER_REDIS_URL = os.getenv("EVENT_BROKER_REDIS_URL")
+
+# How long browsers wait before reconnecting a closed stream
+RETRY_MILLISECONDS = 3000
+
+
+def format_event(event_type: str, payload: Any) -> bytes:
+    """
+    One Server-Sent Events message, encoded once and shared by every subscriber.
+    """
+    return b"event: " + event_type.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+
+
+def todo_payload(todo) -> dict:
+    """
+    The todo as the sync endpoint returns it, from an ORM object or a row.
+    """
+    payload = {column.key: getattr(todo, column.key) for column in SYNC_COLUMNS}
+    payload["updated_at"] = format_timestamp(payload["updated_at"])
+    return payload
+
+
+class Subscription:
+    __slots__ = ("owner_id", "queue", "dropped")
+
+    def __init__(self, owner_id: int, queue_size: int):
+        self.owner_id = owner_id
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(queue_size)
+        self.dropped = False
+
+
+class EventHub:
+    """
+    The subscribers of one worker, by owner. Delivery never waits: an event
+    is put on each queue or, when a queue is full, its subscriber is dropped.
+    """
+
+    def __init__(self, broker: "EventBroker", queue_size: int = EVENT_QUEUE_SIZE,
+                 max_per_owner: int = EVENT_MAX_STREAMS_PER_USER):
+        self.broker = broker
+        self.queue_size = queue_size
+        self.max_per_owner = max_per_owner
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self.delivered = 0
+        self.dropped = 0
+        broker.attach(self)
+
+    def subscribe(self, owner_id: int) -> Optional[Subscription]:
+        """
+        Returns None when the owner already has the maximum number of streams.
+        """
+        subscribers = self._subscribers.setdefault(owner_id, set())
+        if len(subscribers) >= self.max_per_owner:
+            return None
+        subscription = Subscription(owner_id, self.queue_size)
+        subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.owner_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.owner_id]
+
+    def has_listeners(self, owner_id: int) -> bool:
+        """
+        Whether an event for the owner may reach anyone, so publishers can
+        skip the work of building it. Always true with a shared broker.
+        """
+        return self.broker.shared or owner_id in self._subscribers
+
+    def deliver(self, owner_id: int, data: bytes):
+        for subscription in list(self._subscribers.get(owner_id, ())):
+            try:
+                subscription.queue.put_nowait(data)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription):
+        self.unsubscribe(subscription)
+        subscription.dropped = True
+        self.dropped += 1
+        # Nothing queued is worth sending any more; the None tells the stream to end
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    async def publish(self, event_type: str, owner_id: int, payload: Any):
+        """
+        Send an event to the owner's streams on every worker. Called after
+        the write has committed; a broker failure is logged, never raised.
+        """
+        try:
+            await self.broker.publish(owner_id, format_event(event_type, payload))
+        except Exception:
+            logger.exception("Publishing a %s todo event failed", event_type)
+
+    def __len__(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class EventBroker:
+    """
+    Carries published events to the hubs of every worker.
+    """
+
+    # Whether other workers may be listening
+    shared = False
+
+    def __init__(self):
+        self.hubs: List[EventHub] = []
+
+    def attach(self, hub: EventHub):
+        self.hubs.append(hub)
+
+    async def publish(self, owner_id: int, data: bytes):
+        raise NotImplementedError
+
+    async def run(self):
+        """
+        Receive events published by other workers until cancelled. Started
+        by the lifespan; brokers that deliver directly have nothing to do.
+        """
+
+
+class MemoryEventBroker(EventBroker):
+    """
+    Delivers straight to the hubs of this process.
+    """
+
+    async def publish(self, owner_id: int, data: bytes):
+        for hub in self.hubs:
+            hub.deliver(owner_id, data)
+
+
+class RedisEventBroker(EventBroker):
+    """
+    Redis pub/sub on one channel. Every worker, the publisher included,
+    receives each event from Redis and delivers it to its own hub.
+    """
+
+    shared = True
+
+    def __init__(self, client: Any, channel: str = "todo-events"):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+
+    async def publish(self, owner_id: int, data: bytes):
+        await self.client.publish(self.channel, str(owner_id).encode() + b"\n" + data)
+
+    async def run(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    owner_id, _, data = message["data"].partition(b"\n")
+                    for hub in self.hubs:
+                        hub.deliver(int(owner_id), data)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Todo event subscription failed, resubscribing")
+                await asyncio.sleep(1)
+
+
+async def stream_events(subscription: Subscription, hub: EventHub,
+                        heartbeat: float = EVENT_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+    """
+    The body of an SSE response. Unsubscribes when the client goes away,
+    which cancels the generator.
+    """
+    try:
+        yield b"retry: " + str(RETRY_MILLISECONDS).encode() + b"\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if data is None:
+                yield format_event("dropped", {"reason": "too slow, resync with /todos/changes"})
+                return
+            yield data
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def build_broker() -> EventBroker:
+    if EVENT_BROKER_REDIS_URL:
+        # Optional dependency, only needed when events are shared between workers
+        import redis.asyncio
+        return RedisEventBroker(redis.asyncio.from_url(EVENT_BROKER_REDIS_URL))
+    return MemoryEventBroker()
+
+
+hub = EventHub(build_broker())
+
+registry.register(CallbackMetric(
+    "todo_event_streams", "Open GET /todos/stream connections", "gauge", lambda: {(): len(hub)}))
+registry.register(CallbackMetric(
+    "todo_events_total", "Todo events queued for streams, and streams dropped for falling behind", "counter",
+    lambda: {("delivered",): hub.delivered, ("dropped",): hub.dropped}, ("outcome",)))
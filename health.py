@@ -0,0 +1,166 @@
+"""
+Readiness: whether this worker should receive traffic. Unlike liveness
+(/healthy), it fails when the database does not answer in time, the
+connection pool is close to exhausted or the event loop falls behind, so
+the load balancer drains the pod instead of queueing requests on it.
+"""
+import asyncio
+import collections
+import os
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from TodoApp.database import Database, database
+from TodoApp.metrics import Gauge, registry
+
+# Probe results are reused for this long, so frequent probes add no database load
+READY_CACHE_SECONDS = float(os.getenv("READY_CACHE_SECONDS", "2"))
+# A database ping slower than this counts as a failure
+READY_DB_TIMEOUT = float(os.getenv("READY_DB_TIMEOUT", "1"))
+# Fraction of the pool's connections (size plus overflow) in use at which the pod is drained
+READY_MAX_POOL_USAGE = float(os.getenv("READY_MAX_POOL_USAGE", "0.9"))
+# Event loop lag in seconds at which the pod is drained
+READY_MAX_LOOP_LAG = float(os.getenv("READY_MAX_LOOP_LAG", "0.5"))
+# How often the event loop lag is sampled
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))
+
+EVENT_LOOP_LAG = registry.register(Gauge(
+    "event_loop_lag_seconds", "How late the last event loop lag probe woke up"))
+
+
+class LoopLagMonitor:
+    """
+    Sleeps for a fixed interval and records how much later than asked it
+    woke up: the time callbacks spent waiting for a blocked or busy loop.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, window: int = 20):
+        self.interval = interval
+        self.lag = 0.0
+        # Most recent samples, to tell a single spike from a sustained backlog
+        self.samples = collections.deque(maxlen=window)
+
+    def record(self, lag: float):
+        self.lag = lag
+        self.samples.append(lag)
+        EVENT_LOOP_LAG.set(lag)
+
+    @property
+    def max_lag(self) -> float:
+        return max(self.samples, default=0.0)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - start - self.interval))
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    """
+    Size and usage of an engine's pool. usage is the fraction of all
+    connections it may open (size plus overflow) that are checked out, or
+    None for pools without a limit.
+    """
+    pool = engine.sync_engine.pool
+    status = {"status": pool.status(), "usage": None}
+    if hasattr(pool, "size"):
+        # A negative max_overflow means the overflow is unlimited
+        max_overflow = getattr(pool, "_max_overflow", 0)
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=max(0, pool.overflow()))
+        if max_overflow >= 0:
+            status["usage"] = round(pool.checkedout() / (pool.size() + max_overflow), 3)
+    return status
+
+
+async def ping(engine: AsyncEngine, timeout: float) -> Tuple[bool, float, Optional[str]]:
+    """
+    SELECT 1 within the timeout, which also covers waiting for a pooled
+    connection. Returns (ok, seconds taken, error).
+    """
+    async def select_one():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(select_one(), timeout)
+    except asyncio.TimeoutError:
+        return False, time.perf_counter() - start, f"no answer within {timeout}s"
+    except Exception as error:
+        return False, time.perf_counter() - start, type(error).__name__
+    return True, time.perf_counter() - start, None
+
+
+class ReadinessCheck:
+    """
+    Runs the database, pool and event loop checks at most once per cache
+    interval; probes arriving meanwhile, or while a check runs, share its result.
+    """
+
+    def __init__(self, database: Database, lag_monitor: LoopLagMonitor, cache_seconds: float = READY_CACHE_SECONDS,
+                 db_timeout: float = READY_DB_TIMEOUT, max_pool_usage: float = READY_MAX_POOL_USAGE,
+                 max_loop_lag: float = READY_MAX_LOOP_LAG):
+        self.database = database
+        self.lag_monitor = lag_monitor
+        self.cache_seconds = cache_seconds
+        self.db_timeout = db_timeout
+        self.max_pool_usage = max_pool_usage
+        self.max_loop_lag = max_loop_lag
+        self._result: Optional[Tuple[bool, dict]] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def check(self) -> Tuple[bool, dict]:
+        """
+        Returns (ready, report).
+        """
+        if self._result is not None and time.monotonic() < self._expires_at:
+            return self._result
+        async with self._lock:
+            # Another probe may have refreshed the result while this one waited
+            if self._result is None or time.monotonic() >= self._expires_at:
+                self._result = await self._run_checks()
+                self._expires_at = time.monotonic() + self.cache_seconds
+        return self._result
+
+    def reset(self):
+        self._result = None
+
+    async def _run_checks(self) -> Tuple[bool, dict]:
+        engine = self.database.engine
+        # Read the pool before the ping borrows a connection from it
+        pool = pool_status(engine)
+        pool["ok"] = pool["usage"] is None or pool["usage"] < self.max_pool_usage
+        ok, elapsed, error = await ping(engine, self.db_timeout)
+        db = {"ok": ok, "latency_ms": round(elapsed * 1000, 2)}
+        if error is not None:
+            db["error"] = error
+        lag = self.lag_monitor.lag
+        loop = {"ok": lag < self.max_loop_lag, "lag_ms": round(lag * 1000, 2),
+                "max_lag_ms": round(self.lag_monitor.max_lag * 1000, 2)}
+        checks = {"database": db, "pool": pool, "event_loop": loop}
+        replicas = self.database.replicas
+        if replicas.engines:
+            # Reads fail over to the primary, so a replica being down is no reason to drain
+            checks["replicas"] = {"healthy": len(replicas.healthy), "total": len(replicas.engines)}
+        ready = db["ok"] and pool["ok"] and loop["ok"]
+        shards = self.database.shards
+        if shards is not None:
+            # Each shard is the only copy of its owners' todos, so every one must answer
+            results = await asyncio.gather(*(ping(engine, self.db_timeout) for engine in shards.engines.values()))
+            checks["shards"] = {}
+            for name, (ok, elapsed, error) in zip(shards.engines, results):
+                checks["shards"][name] = {"ok": ok, "latency_ms": round(elapsed * 1000, 2)}
+                if error is not None:
+                    checks["shards"][name]["error"] = error
+                ready = ready and ok
+        return ready, {"status": "ready" if ready else "unavailable", "checks": checks}
+
+
+lag_monitor = LoopLagMonitor()
+readiness = ReadinessCheck(database, lag_monitor)
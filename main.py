@@ -1,31 +1,92 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, status
 
-from TodoApp.database import engine, Base
+from TodoApp.database import database, Base
 from TodoApp.routers import auth, todos, admin, users
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
-
-from routers.todos import redirect_to_login
-
-app = FastAPI()
-
-# Create the database tables if they do not exist
-Base.metadata.create_all(bind=engine)
-
-templates = Jinja2Templates(directory="TodoApp/templates")
-
-app.mount("/static", StaticFiles(directory="TodoApp/static"), name="static")
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+
+from TodoApp import archive, assets, audit, events, health, metrics, ratelimit, security, sync
+from TodoApp.templating import precompile_templates
+
+from TodoApp.routers.todos import redirect_to_login
+
+# Create missing tables at startup. Off by default: the schema belongs to Alembic (alembic upgrade head)
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "false").lower() in ("1", "true", "yes")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    if DB_CREATE_ALL:
+        async with database.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    # Everything that is built lazily is built now, before the first request needs it
+    precompile_templates()
+    assets.pipeline.build()
+    security.bcrypt_context.handler().get_backend()
+    await database.warm_up()
+    replicas = database.replicas
+    background = [asyncio.create_task(health.lag_monitor.run()),
+                  asyncio.create_task(events.hub.broker.run()),
+                  asyncio.create_task(audit.audit_log.run())]
+    # Tombstones are kept next to the todos, on every shard
+    background += [asyncio.create_task(sync.run_tombstone_pruning(sessionmaker))
+                   for sessionmaker in database.todo_sessionmakers]
+    if archive.ARCHIVE_AFTER_DAYS > 0:
+        background += [asyncio.create_task(archive.run_archiver(sessionmaker))
+                       for sessionmaker in database.todo_sessionmakers]
+    if replicas.engines:
+        background.append(asyncio.create_task(replicas.run_health_checks()))
+    health.readiness.reset()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    # Whatever the audit task had not written yet
+    await audit.audit_log.close()
+    # Close pooled connections on shutdown
+    await database.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.state.ready = False
+# Added first so it runs inside the metrics middleware, which then also counts the 429s
+app.add_middleware(ratelimit.RateLimitMiddleware, limiter=ratelimit.rate_limiter)
+app.add_middleware(metrics.MetricsMiddleware)
+
+app.mount("/static", assets.StaticAssets(assets.pipeline), name="static")
 
 @app.get("/", tags=["home"])
 def read_home(request: Request):
     # return templates.TemplateResponse("home.html", {"request": request})
     return RedirectResponse(url="/todos/todo-page", status_code=status.HTTP_302_FOUND)
 
-# Health check endpoint
+# Liveness: the process is up and serving requests
 @app.get("/healthy", tags=["health"])
 def health_check():
     return {"status": "healthy"}
+
+# Readiness: startup has finished and the database, pool and event loop can take traffic.
+# 503 tells the load balancer to drain this pod until it recovers.
+@app.get("/ready", tags=["health"])
+async def readiness_check(request: Request):
+    headers = {"Cache-Control": "no-store"}
+    if not request.app.state.ready:
+        return JSONResponse({"status": "starting"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
+    ready, report = await health.readiness.check()
+    return JSONResponse(report, status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers=headers)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+def get_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # Include the routers for different functionalities
 app.include_router(auth.router)
 app.include_router(todos.router)
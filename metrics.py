@@ -0,0 +1,287 @@
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, *labelvalues):
+        self.inc(-amount, *labelvalues)
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class CallbackMetric(Metric):
+    """
+    Metric whose samples are read from elsewhere (a pool, a cache) at scrape time.
+    The callback returns {labelvalues tuple: value}.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, callback: Callable[[], Dict[Tuple, float]],
+                 labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> list:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self.callback().items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[Tuple, list] = {}
+        self._sums: Dict[Tuple, float] = {}
+
+    def observe(self, value: float, *labelvalues):
+        with self._lock:
+            counts = self._counts.get(labelvalues)
+            if counts is None:
+                counts = self._counts[labelvalues] = [0] * len(self.buckets)
+                self._sums[labelvalues] = 0.0
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[labelvalues] += value
+
+    def count(self, *labelvalues) -> int:
+        return sum(self._counts.get(labelvalues, ()))
+
+    def sum(self, *labelvalues) -> float:
+        return self._sums.get(labelvalues, 0.0)
+
+    def render(self) -> list:
+        lines = []
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(self._sums[labels])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status code", ("method", "route", "status")))
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")))
+REQUESTS_IN_PROGRESS = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being served"))
+DB_QUERIES_PER_REQUEST = registry.register(Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",), buckets=COUNT_BUCKETS))
+DB_QUERY_TIME_PER_REQUEST = registry.register(Histogram(
+    "db_query_seconds_per_request", "Time spent executing SQL per HTTP request", ("route",)))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "db_query_duration_seconds", "Duration of single SQL statements"))
+# How long connections are held, not how long a request waited for one: the pool has no event before the wait
+DB_POOL_HOLD = registry.register(Histogram(
+    "db_pool_connection_hold_seconds", "Time from checking a pooled connection out to returning it"))
+BCRYPT_LATENCY = registry.register(Histogram(
+    "bcrypt_duration_seconds", "Time spent hashing or verifying passwords", ("operation",)))
+
+# Pools of the instrumented engines, read at scrape time
+_pools: dict = {}
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+
+# SQL statement count and time of the request being served
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def route_template(scope: dict, root_path: str) -> str:
+    """
+    Label requests with the route they matched (/todos/{todo_id}) rather
+    than the raw path, so the number of series stays bounded.
+    """
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps (static files) only leave their mount path behind
+    if scope.get("root_path", "") != root_path:
+        return scope["root_path"][len(root_path):]
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request count, latency, in-flight requests and
+    the SQL work done per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        root_path = scope.get("root_path", "")
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_PROGRESS.dec()
+            _request_stats.reset(token)
+            route = route_template(scope, root_path)
+            REQUESTS.inc(1, scope["method"], route, str(status_code))
+            REQUEST_LATENCY.observe(elapsed, scope["method"], route)
+            DB_QUERIES_PER_REQUEST.observe(stats.queries, route)
+            DB_QUERY_TIME_PER_REQUEST.observe(stats.query_time, route)
+
+
+def instrument_engine(engine: AsyncEngine, name: str = "primary"):
+    """
+    Hook SQLAlchemy engine events to time statements and pooled connection use, and
+    export the pool's size and usage under the given name.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERY_LATENCY.observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += elapsed
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checkout_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine.pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        start = connection_record.info.pop("checkout_start", None)
+        if start is not None:
+            DB_POOL_HOLD.observe(time.perf_counter() - start)
+
+    _pools[name] = sync_engine.pool
+
+
+def _pool_usage() -> dict:
+    usage = {}
+    for name, pool in _pools.items():
+        usage[(name, "checked_out")] = pool.checkedout() if hasattr(pool, "checkedout") else 0
+        if hasattr(pool, "size"):
+            usage[(name, "size")] = pool.size()
+            usage[(name, "overflow")] = pool.overflow()
+    return usage
+
+
+registry.register(CallbackMetric(
+    "db_pool_connections", "Connection pool size and usage", "gauge", _pool_usage, ("engine", "state")))
@@ -0,0 +1,40 @@
+"""
+Helpers shared by the Alembic migrations under alembic/versions.
+"""
+import re
+from typing import Callable
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def rebuild_sqlite_table(table: str, edit: Callable[[str], str]):
+    """
+    SQLite cannot drop a constraint or change a column: recreate the table
+    from its own CREATE statement as changed by edit, keeping its rows,
+    indexes, triggers and, if it still has AUTOINCREMENT, its sequence.
+    """
+    conn = op.get_bind()
+    create = conn.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                          {'name': table}).scalar_one()
+    dependents = conn.execute(sa.text("SELECT sql FROM sqlite_master WHERE tbl_name = :name "
+                                      "AND type IN ('index', 'trigger') AND sql IS NOT NULL"),
+                              {'name': table}).scalars().all()
+    sequence = None
+    if conn.execute(sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'")).first():
+        sequence = conn.execute(sa.text("SELECT seq FROM sqlite_sequence WHERE name = :name"),
+                                {'name': table}).scalar()
+    rebuilt = re.sub(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE {table}_rebuild', edit(create))
+    op.execute(rebuilt)
+    op.execute(f"INSERT INTO {table}_rebuild SELECT * FROM {table}")
+    # The implicit delete of DROP TABLE fires no triggers, so the search index keeps its rows
+    op.execute(f"DROP TABLE {table}")
+    op.execute(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+    for statement in dependents:
+        op.execute(statement)
+    if sequence is not None and re.search(r'\bAUTOINCREMENT\b', rebuilt, re.IGNORECASE):
+        # The copy restarted the sequence from the highest id left in the table
+        op.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = :name").bindparams(name=table))
+        op.execute(sa.text(f"INSERT INTO sqlite_sequence (name, seq) "
+                           f"SELECT :name, max(:seq, (SELECT coalesce(max(id), 0) FROM {table}))")
+                   .bindparams(name=table, seq=sequence))
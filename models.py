@@ -1,5 +1,12 @@
+from datetime import datetime, timezone
+
 from TodoApp.database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, DateTime, Integer, JSON, String, Boolean, Index, DDL, event, literal_column, text
+
+
+def utcnow() -> datetime:
+    # Naive UTC: stored the same way on every backend, and compared as such by the sync endpoint
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 class Users(Base):
@@ -20,8 +27,134 @@ class Todos(Base):
     __tablename__ = "todosapp"
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    description = Column(String, index=True)
-    priority = Column(Integer, default=1)  # Default priority is 1
+    title = Column(String)
+    description = Column(String)  # title and description are indexed for full-text search below
+    # Default priority is 1. NOT NULL: it is a keyset column of the paginated list (pagination.py)
+    priority = Column(Integer, nullable=False, default=1)
     complete = Column(Boolean, default=False)
-    owner_id = Column(Integer, ForeignKey("users.id"))  # Foreign key to Users table, assuming user ID is an integer
+    # Id of the owner in users. Not a foreign key: with sharding (sharding.py) users live on another database
+    owner_id = Column(Integer)
+    # Change tracking for GET /todos/changes, maintained by every INSERT and UPDATE (ORM or Core)
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    version = Column(Integer, nullable=False, default=1, onupdate=literal_column("version + 1"))
+
+    __table_args__ = (
+        # Serves the paginated list endpoint: owner scope, optional complete filter, (priority, id) keyset
+        Index("ix_todosapp_owner_complete_priority_id", "owner_id", "complete", "priority", "id"),
+        # Serves the sync endpoint: owner scope, (updated_at, id) keyset
+        Index("ix_todosapp_owner_updated_at_id", "owner_id", "updated_at", "id"),
+        # Serves the archival job: completed todos only, oldest change first
+        Index("ix_todosapp_archivable", "updated_at", postgresql_where=text("complete"), sqlite_where=text("complete")),
+        # SQLite otherwise hands out the id of the newest todo again once it is deleted or archived
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TodosArchive(Base):
+    """
+    Completed todos moved out of todosapp by archive.py once they are old
+    enough. Same ids and columns as todosapp, plus when the move happened.
+    """
+    __tablename__ = "todosapp_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String)
+    description = Column(String)
+    priority = Column(Integer, nullable=False)
+    complete = Column(Boolean)
+    owner_id = Column(Integer)
+    updated_at = Column(DateTime, nullable=False)
+    version = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        # Serves include_archived reads: owner scope, id keyset
+        Index("ix_todosapp_archive_owner_id_id", "owner_id", "id"),
+    )
+
+
+class TodoTombstones(Base):
+    """
+    One row per deleted todo, so syncing clients learn about deletions.
+    Pruned after sync.SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    __tablename__ = "todo_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    todo_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        Index("ix_todo_tombstones_owner_deleted_at_id", "owner_id", "deleted_at", "id"),
+    )
+
+
+class TodoCounters(Base):
+    """
+    How many of an owner's todos in todosapp have each priority and
+    completion status, kept up to date by every write (see stats.py).
+    """
+    __tablename__ = "todo_counters"
+
+    owner_id = Column(Integer, primary_key=True)
+    priority = Column(Integer, primary_key=True)
+    complete = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class AuditLog(Base):
+    """
+    Who changed which todo or user, and when. Written in batches by audit.py.
+    """
+    __tablename__ = "audit_log"
+
+    id = Column(Integer, primary_key=True)
+    at = Column(DateTime, nullable=False)  # when the change was made, not when the row was flushed
+    actor_id = Column(Integer, nullable=True)  # None for self-registration
+    entity = Column(String, nullable=False)  # "todo" or "user"
+    entity_id = Column(Integer, nullable=True)
+    action = Column(String, nullable=False)  # e.g. "create", "update", "delete"
+    details = Column(JSON, nullable=True)
+
+    __table_args__ = (
+        Index("ix_audit_log_entity_entity_id", "entity", "entity_id"),
+        Index("ix_audit_log_actor_id_at", "actor_id", "at"),
+    )
+
+
+# Columns of a todo as the API returns it. Selecting these instead of the entity skips ORM object hydration.
+TODO_COLUMNS = (Todos.id, Todos.title, Todos.description, Todos.priority, Todos.complete, Todos.owner_id)
+# The same plus the change tracking columns, as returned by the sync endpoint
+SYNC_COLUMNS = TODO_COLUMNS + (Todos.version, Todos.updated_at)
+
+
+# Full-text search over title and description, see search.py.
+# Postgres: a generated tsvector column with a GIN index.
+# SQLite: an external-content FTS5 table kept in sync by triggers.
+TODOS_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE todosapp ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX ix_todosapp_search_vector ON todosapp USING gin (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE todosapp_fts USING fts5("
+        "title, description, content='todosapp', content_rowid='id')",
+        "CREATE TRIGGER todosapp_fts_ai AFTER INSERT ON todosapp BEGIN "
+        "INSERT INTO todosapp_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER todosapp_fts_ad AFTER DELETE ON todosapp BEGIN "
+        "INSERT INTO todosapp_fts(todosapp_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER todosapp_fts_au AFTER UPDATE OF title, description ON todosapp BEGIN "
+        "INSERT INTO todosapp_fts(todosapp_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO todosapp_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    ],
+}
+
+for dialect, statements in TODOS_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Todos.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+event.listen(Todos.__table__, "before_drop", DDL("DROP TABLE IF EXISTS todosapp_fts").execute_if(dialect="sqlite"))
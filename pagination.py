@@ -0,0 +1,76 @@
+import base64
+import binascii
+import json
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from starlette import status
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    """
+    Build an opaque cursor from the sort key values of the last row of a page.
+    """
+    raw = json.dumps({"s": sort, "k": list(values)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, types: Sequence[type]) -> list:
+    """
+    Decode a cursor produced by encode_cursor for the same sort order. Each
+    value must have the JSON type given for its position, so a made-up
+    cursor is rejected here rather than by the database.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = data["k"]
+        if data["s"] != sort or not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        # bool is an int subclass, but true is no id
+        if any(isinstance(value, bool) or not isinstance(value, kind) for value, kind in zip(values, types)):
+            raise ValueError
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def keyset_filter(columns: Sequence, values: Sequence[Any], descending: bool = False):
+    """
+    Row-value comparison "(c1, c2, ...) > (v1, v2, ...)" spelled out with AND/OR,
+    so it works on every backend and can use a composite index.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+def paginate(query, columns: Sequence, sort: str, cursor: Optional[str], limit: int, descending: bool = False):
+    """
+    Order the query by the keyset columns, skip past the cursor and fetch one
+    extra row so the caller can tell whether another page exists. The columns
+    must be NOT NULL: NULL compares as neither before nor after any cursor.
+    """
+    if cursor:
+        values = decode_cursor(cursor, sort, [column.type.python_type for column in columns])
+        query = query.filter(keyset_filter(columns, values, descending))
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return query.order_by(*order).limit(limit + 1)
+
+
+def split_page(rows: list, sort: str, keys: Sequence[str], limit: int):
+    """
+    Trim the extra row fetched by paginate and return (rows, next_cursor).
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(sort, [getattr(last, key) for key in keys])
@@ -0,0 +1,190 @@
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from TodoApp.metrics import Counter, registry
+from TodoApp.security import client_key
+
+# Comma separated "<path prefix>=<requests>/<second|minute|hour>[:<burst>]" rules, or "<prefix>=off".
+# The longest matching prefix wins. Burst defaults to the number of requests.
+# Anonymous clients are keyed by address: behind a reverse proxy set TRUSTED_PROXIES (security.py).
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "/=20/second:40,/auth/=10/minute,/auth/login-page=off,/auth/register-page=off,"
+    "/static/=off,/healthy=off,/ready=off,/metrics=off")
+# Buckets kept by the in-process backend; the least recently used are dropped beyond it
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Set to share buckets between workers through Redis instead of keeping them per process
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0}
+
+RATE_LIMITED = registry.register(Counter(
+    "http_requests_rate_limited_total", "Requests rejected with 429 by rate limit rule", ("rule",)))
+
+
+class RateLimit(NamedTuple):
+    rate: float  # tokens added per second
+    burst: int  # bucket capacity
+
+
+def parse_rules(spec: str) -> Dict[str, Optional[RateLimit]]:
+    """
+    "/=20/second:40,/static/=off" -> {"/": RateLimit(20.0, 40), "/static/": None}
+    """
+    rules = {}
+    for rule in filter(None, (part.strip() for part in spec.split(","))):
+        prefix, _, limit = rule.partition("=")
+        if limit == "off":
+            rules[prefix] = None
+            continue
+        amount, _, rest = limit.partition("/")
+        period, _, burst = rest.partition(":")
+        if period not in PERIODS:
+            raise ValueError(f"Invalid rate limit rule {rule!r}")
+        rules[prefix] = RateLimit(int(amount) / PERIODS[period], int(burst or amount))
+    return rules
+
+
+class RateLimitBackend:
+    """
+    Token bucket storage. Methods are async so a networked store can
+    implement them.
+    """
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        """
+        Take one token from the key's bucket. Returns 0 when allowed,
+        otherwise the seconds until a token is available.
+        """
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    In-process buckets, three floats per active key. A bucket that has refilled
+    completely is the same as no bucket, so idle keys are dropped as soon as
+    they reach the front of the LRU full.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [tokens, last refill time, time the bucket is full again]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(limit.burst), now, now]
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            wait = (1 - bucket[0]) / limit.rate
+        else:
+            bucket[0] -= 1
+            wait = 0.0
+        bucket[2] = now + (limit.burst - bucket[0]) / limit.rate
+        self._evict(now)
+        return wait
+
+    def _evict(self, now: float):
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if bucket[2] > now and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Buckets shared by every worker, updated atomically by a Lua script and
+    expired once they would be full again.
+    """
+
+    SCRIPT = """
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+    local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + (now - (tonumber(bucket[2]) or now)) * rate)
+    local wait = 0
+    if tokens < 1 then wait = (1 - tokens) / rate else tokens = tokens - 1 end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'at', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        # Wall clock, not monotonic: every worker must agree on it
+        wait = await self.client.eval(self.SCRIPT, 1, self.prefix + key, limit.rate, limit.burst, time.time())
+        return float(wait)
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, rules: Dict[str, Optional[RateLimit]]):
+        self.backend = backend
+        # Longest prefix first, so the first match is the most specific rule
+        self.rules: Tuple[Tuple[str, Optional[RateLimit]], ...] = tuple(
+            sorted(rules.items(), key=lambda rule: len(rule[0]), reverse=True))
+
+    def match(self, path: str) -> Tuple[str, Optional[RateLimit]]:
+        for prefix, limit in self.rules:
+            if path.startswith(prefix):
+                return prefix, limit
+        return "", None
+
+    async def take(self, rule: str, limit: RateLimit, client_key: str) -> float:
+        """
+        Returns the seconds the client has to wait, 0 when the request may pass.
+        """
+        return await self.backend.take(f"{rule}|{client_key}", limit)
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware answering 429 with Retry-After once a client has used up
+    the bucket of the route's rule.
+    """
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule, limit = self.limiter.match(scope["path"])
+        # Unlimited routes skip the token check entirely
+        wait = 0.0 if limit is None else await self.limiter.take(rule, limit, await client_key(scope))
+        if wait <= 0:
+            await self.app(scope, receive, send)
+            return
+        RATE_LIMITED.inc(1, rule)
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({"type": "http.response.start", "status": 429, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(math.ceil(wait)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def build_backend() -> RateLimitBackend:
+    if RATE_LIMIT_REDIS_URL:
+        # Optional dependency, only needed when shared limits are configured
+        import redis.asyncio
+        return RedisRateLimitBackend(redis.asyncio.from_url(RATE_LIMIT_REDIS_URL))
+    return MemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(build_backend(), parse_rules(RATE_LIMITS))
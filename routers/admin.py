@@ -1,12 +1,30 @@
-from fastapi import APIRouter, HTTPException, Path, Depends
+import csv
+import heapq
+import io
+import json
+import os
+from collections import Counter
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Path, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from starlette import status
 from typing_extensions import Annotated
 
-from TodoApp.database import SessionLocal
-from TodoApp.models import Todos
+from TodoApp.cache import todo_cache
+from TodoApp.audit import audit_log
+from TodoApp.database import database, get_db, owner_session, scatter
+from TodoApp.events import hub
+from TodoApp.models import TODO_COLUMNS, Todos
+from TodoApp.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from TodoApp.routers.auth import get_current_user
+from TodoApp.schemas import FastJSONResponse, TodoResponse, TodoStats, rows_to_dicts
+from TodoApp.security import token_cache
+from TodoApp.stats import apply_counts, read_counts, summarize, todo_deltas
+from TodoApp.sync import record_deletions
 
 
 router = APIRouter(
@@ -14,36 +32,147 @@ router = APIRouter(
     tags=["admin"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Rows fetched from the server-side cursor per chunk of an export
+EXPORT_BATCH_SIZE = int(os.getenv("ADMIN_EXPORT_BATCH_SIZE", "1000"))
+EXPORT_COLUMNS = TODO_COLUMNS
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
 # This will inject the database session into the route handlers
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 # This will inject the current user into the route handlers
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
-@router.get("/todos", status_code=status.HTTP_200_OK)
-async def get_all_todos(user: user_dependency, db: db_dependency):
+@router.get("/todos", status_code=status.HTTP_200_OK, response_model=List[TodoResponse])
+async def get_all_todos(user: user_dependency, db: db_dependency,
+                        cursor: Optional[str] = Query(default=None, description="Cursor from the X-Next-Cursor header of the previous page"),
+                        limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of todos per page")):
+    """
+    Every user's todos by id, one page at a time. With sharding each shard
+    returns its next page and the pages are merged; ids repeat across
+    shards, so the shard's position breaks ties and is part of the cursor.
+    """
+    if user is None or user['role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    after = decode_cursor(cursor, "id,shard", (int, int)) if cursor else None
+
+    async def read_page(session: AsyncSession):
+        query = select(*TODO_COLUMNS)
+        if after is not None:
+            # ">=": the cursor's id may still be due on the shards after the cursor's
+            query = query.where(Todos.id >= after[0])
+        # One more row in case the cursor's own row comes back
+        return (await session.execute(query.order_by(Todos.id).limit(limit + 2))).all()
+
+    pages = [[(row.id, shard, row) for row in rows if after is None or (row.id, shard) > tuple(after)]
+             for shard, rows in enumerate(await scatter(db, read_page))]
+    merged = list(heapq.merge(*pages))[:limit + 1]
+    headers = None
+    if len(merged) > limit:
+        merged = merged[:limit]
+        headers = {NEXT_CURSOR_HEADER: encode_cursor("id,shard", list(merged[-1][:2]))}
+    return FastJSONResponse(rows_to_dicts([row for _, _, row in merged]), headers=headers)
+
+
+async def stream_todos(engines: List[AsyncEngine], export_format: str):
+    """
+    Read every todo through a server-side cursor and yield one encoded chunk
+    per batch, so memory use does not depend on the table size. With
+    sharding the shards are read one after the other.
+    """
+    keys = [column.key for column in EXPORT_COLUMNS]
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(keys)
+        yield buffer.getvalue()
+    for engine in engines:
+        async for chunk in stream_shard(engine, keys, export_format):
+            yield chunk
+
+
+async def stream_shard(engine: AsyncEngine, keys: List[str], export_format: str):
+    # A dedicated connection: the request's session is closed before the body is streamed
+    async with engine.connect() as conn:
+        result = await conn.stream(
+            select(*EXPORT_COLUMNS).order_by(Todos.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            buffer = io.StringIO()
+            if export_format == "csv":
+                csv.writer(buffer).writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(keys, row))))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+
+
+@router.get("/todos/export", status_code=status.HTTP_200_OK)
+async def export_todos(user: user_dependency, db: db_dependency,
+                       export_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format",
+                                                                       description="Export format")):
+    if user is None or user['role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    shards = database.shards
+    engines = list(shards.engines.values()) if shards is not None else [db.bind]
+    return StreamingResponse(
+        stream_todos(engines, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="todos.{export_format}"'},
+    )
+
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=TodoStats)
+async def get_stats(user: user_dependency, db: db_dependency):
+    """
+    Open and completed counts of every user's todos, summed from the
+    counters of each shard.
+    """
     if user is None or user['role'] != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
-    todos = db.query(Todos).all()
-    return todos
+    counts = Counter()
+    for shard_counts in await scatter(db, read_counts):
+        counts.update(shard_counts)
+    return FastJSONResponse(summarize(counts))
+
+@router.get("/cache-stats", status_code=status.HTTP_200_OK)
+async def get_cache_stats(user: user_dependency):
+    if user is None or user['role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
+    return {"todos": todo_cache.stats(), "tokens": token_cache.stats()}
 
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_todo( db: db_dependency,
                        user: user_dependency,
-                       todo_id: int = Path(gt=0)):
+                       todo_id: int = Path(gt=0),
+                       owner_id: Optional[int] = Query(default=None, gt=0, description="Owner of the todo, needed when sharded todos share the id")):
     if user is None or user['role'] != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied")
 
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
-    if not todo:
+    async def find_owners(session: AsyncSession):
+        query = select(Todos.owner_id).where(Todos.id == todo_id)
+        if owner_id is not None:
+            query = query.where(Todos.owner_id == owner_id)
+        return (await session.execute(query)).scalars().all()
+
+    owners = [owner for found in await scatter(db, find_owners) for owner in found]
+    if not owners:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+    if len(owners) > 1:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Todo id exists on several shards, pass owner_id")
 
-    db.delete(todo)
-    db.commit()
-    return {"message": "Todo deleted successfully"}
\ No newline at end of file
+    owner = owners[0]
+    async with owner_session(db, owner) as todo_db:
+        # Counted from the row the DELETE removed, so a concurrent delete of the same todo counts nothing
+        result = await todo_db.execute(delete(Todos).where(Todos.id == todo_id, Todos.owner_id == owner)
+                                       .returning(Todos.priority, Todos.complete))
+        deleted = [tuple(row) for row in result.all()]
+        if not deleted:
+            # Deleted by someone else since it was found
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Todo not found")
+        await record_deletions(todo_db, [(todo_id, owner)])
+        await apply_counts(todo_db, todo_deltas(owner, removed=deleted))
+        await todo_db.commit()
+    await todo_cache.invalidate(owner)
+    audit_log.record("todo", todo_id, "delete", user['id'], owner_id=owner, admin=True)
+    await hub.publish("deleted", owner, {"id": todo_id})
+    return {"message": "Todo deleted successfully"}
@@ -1,25 +1,33 @@
 import os
+import uuid
 from datetime import timedelta, datetime, timezone
 # from http.client import HTTPException
 
 from fastapi import APIRouter, Depends, HTTPException,Request
 from pydantic import BaseModel
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from typing import Annotated
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Annotated, Optional
 
 from starlette import status
 
-from TodoApp.database import SessionLocal
+from TodoApp.audit import audit_log
+from TodoApp.cache import user_cache
+from TodoApp.database import get_db
 from TodoApp.models import Users
+from TodoApp.security import bcrypt_context, password_hasher, password_stamp, revocation_store, token_cache
+from TodoApp.templating import get_templates
+from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from fastapi.templating import Jinja2Templates
 
 # from main import templates
 
 # SECRET_KEY =  os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = float(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Refresh tokens are rotated on every use; this bounds how long an unused one stays valid
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
 def get_secret_key():
     return os.getenv("JWT_SECRET_KEY")
@@ -29,45 +37,42 @@ router = APIRouter(
     tags=["auth"]
 )
 
-# Create a CryptContext for hashing passwords
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # This is the URL where the token will be requested
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/get-token")
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
-db_dependency = Annotated[Session, Depends(get_db)]
 
-templates = Jinja2Templates(directory="TodoApp/templates")
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 #### Pages ####
-@router.get("/login-page", response_class=templates.TemplateResponse, status_code=status.HTTP_200_OK)
+@router.get("/login-page", response_class=HTMLResponse, status_code=status.HTTP_200_OK)
 def render_login_page(request: Request):
     """
     Render the login page.
     """
-    return templates.TemplateResponse("login.html", {"request": request})
+    return get_templates().TemplateResponse("login.html", {"request": request})
 
-@router.get("/register-page", response_class=templates.TemplateResponse, status_code=status.HTTP_200_OK)
+@router.get("/register-page", response_class=HTMLResponse, status_code=status.HTTP_200_OK)
 def render_register_page(request: Request):
     """
     Render the registration page.
     """
-    return templates.TemplateResponse("register.html", {"request": request})
+    return get_templates().TemplateResponse("register.html", {"request": request})
 
 #### Endpoints ####
 # Function to authenticate the user
-def authenticate_user(username: str, password: str, db: Session):
-    user = db.query(Users).filter(Users.username == username).first()
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    result = await db.execute(select(Users).where(Users.username == username))
+    user = result.scalars().first()
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # The stored hash uses an outdated cost factor, replace it while we have the password
+        user.hashed_password = new_hash
+        await db.commit()
+        await user_cache.invalidate(user.id)
     return user
 # Function to create a JWT access token
 def create_access_token(username:str, user_id: str, role: str, expires_delta: timedelta):
@@ -76,15 +81,47 @@ def create_access_token(username:str, user_id: str, role: str, expires_delta: ti
     encode.update({'exp': expires})
     return jwt.encode(encode, get_secret_key(), algorithm=ALGORITHM)
 
+# Function to create a refresh token; family ties together every token rotated from one login
+def create_refresh_token(user: Users, family: Optional[str] = None):
+    encode = {"sub": user.username, "id": user.id, "role": user.role, "type": "refresh",
+              "jti": uuid.uuid4().hex, "fam": family or uuid.uuid4().hex,
+              "pwd": password_stamp(user.hashed_password),
+              "exp": datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)}
+    return jwt.encode(encode, get_secret_key(), algorithm=ALGORITHM)
+
+def decode_refresh_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, get_secret_key(), algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    if payload.get("type") != "refresh" or not payload.get("jti") or not payload.get("fam"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    return payload
+
+async def revoke_token_family(family: str):
+    # Every token of the family was issued before now, so none outlives this
+    await revocation_store.revoke(f"fam:{family}", datetime.now(timezone.utc).timestamp()
+                                  + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS).total_seconds())
+
+def issue_tokens(user: Users, family: Optional[str] = None):
+    access_token = create_access_token(user.username, user.id, user.role, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    return TokenResponse(access_token=access_token, token_type="bearer",
+                         refresh_token=create_refresh_token(user, family))
+
 # Dependency to get the current user from the token
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
     try:
-        payload = jwt.decode(token, get_secret_key(), algorithms=[ALGORITHM])
+        # Tokens verified earlier are served from memory until they expire
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, get_secret_key(), algorithms=[ALGORITHM])
+            # Refresh tokens are only good for /auth/refresh
+            if payload.get("sub") is None or payload.get("id") is None or payload.get("type") == "refresh":
+                raise JWTError
+            token_cache.set(token, payload)
         username: str = payload.get("sub")
         user_id: str = payload.get("id")
         user_role: str = payload.get("role")
-        if username is None or user_id is None:
-            raise JWTError
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials")
     return {"username": username, "id": user_id, "role": user_role}
@@ -109,6 +146,10 @@ class UserResponse(BaseModel):
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 @router.post("/create_user", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(user: CreateUserRequest, db: db_dependency):
@@ -118,25 +159,49 @@ async def create_user(user: CreateUserRequest, db: db_dependency):
         email=user.email,
         first_name=user.first_name,
         last_name=user.last_name,
-        hashed_password=bcrypt_context.hash(user.password),  # In a real application, hash the password here
+        hashed_password=await password_hasher.hash(user.password),
         role=user.role,
         is_active=True  # Default to active
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    audit_log.record("user", new_user.id, "create", None, username=new_user.username, role=new_user.role)
     return new_user
 
 # This endpoint is used to get the access token for the user
 @router.post("/get-token", status_code=status.HTTP_200_OK, response_model=TokenResponse)
 async def get_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
                            db: db_dependency):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials")
     # generate a JWT token here
-    jwt_token = create_access_token(user.username, user.id, user.role, timedelta(minutes=30))
-    return TokenResponse(access_token=jwt_token, token_type="bearer")
+    return issue_tokens(user)
+
+# Trade a refresh token for a new access token and a new refresh token, without a password check
+@router.post("/refresh", status_code=status.HTTP_200_OK, response_model=TokenResponse)
+async def refresh_access_token(body: RefreshRequest, db: db_dependency):
+    payload = decode_refresh_token(body.refresh_token)
+    family = payload["fam"]
+    if await revocation_store.is_revoked(f"fam:{family}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    # Role and status may have changed since login, and a new password ends the session
+    user = await db.get(Users, payload.get("id"))
+    if user is None or not user.is_active or payload.get("pwd") != password_stamp(user.hashed_password):
+        await revoke_token_family(family)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    if not await revocation_store.revoke(f"jti:{payload['jti']}", payload["exp"]):
+        # A rotated-out token came back: it leaked, so end the whole session
+        await revoke_token_family(family)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    return issue_tokens(user, family)
+
+# Revoke the session a refresh token belongs to
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(body: RefreshRequest):
+    payload = decode_refresh_token(body.refresh_token)
+    await revoke_token_family(payload["fam"])
 
 # {
 #   "username": "ys",
@@ -1,19 +1,33 @@
-from fastapi import APIRouter, HTTPException, Path, Depends, Request, status
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+import os
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Header, Path, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel, Field, model_validator
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from typing_extensions import Annotated
 
-from TodoApp.database import SessionLocal
-from TodoApp.models import Todos
+from TodoApp.archive import paginate_with_archived
+from TodoApp.audit import audit_log
+from TodoApp.cache import etag_matches, todo_cache
+from TodoApp.events import hub, stream_events, todo_payload
+from TodoApp.models import SYNC_COLUMNS, TODO_COLUMNS, Todos, TodosArchive
 from TodoApp.routers.auth import get_current_user
-from TodoApp.database import get_db
+from TodoApp.database import get_db, owner_session
+from TodoApp.pagination import NEXT_CURSOR_HEADER, paginate, split_page
+from TodoApp.schemas import (FastJSONResponse, TodoChanges, TodoResponse, TodoSearchResult, TodoStats,
+                             TodoWriteResponse, dumps, loads, rows_to_dicts)
+from TodoApp.search import search_todos
+from TodoApp.stats import apply_counts, read_counts, summarize, todo_deltas
+from TodoApp.sync import changes_since, record_deletions
+from TodoApp.templating import get_templates, stream_template
 from starlette.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 
-# from TodoApp.main import templates
-
-templates = Jinja2Templates(directory="TodoApp/templates")
+# Largest number of operations accepted by POST /todos/batch
+TODO_BATCH_MAX_SIZE = int(os.getenv("TODO_BATCH_MAX_SIZE", "500"))
 
 
 class TodosRequest(BaseModel):
@@ -33,6 +47,39 @@ class TodosRequest(BaseModel):
         }
     }
 
+class TodoBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"] = Field(..., description="Operation to apply")
+    id: Optional[int] = Field(default=None, gt=0, description="Id of the todo to update or delete")
+    todo: Optional[TodosRequest] = Field(default=None, description="Todo fields for create and update")
+
+    @model_validator(mode="after")
+    def check_operation_fields(self):
+        if self.op != "create" and self.id is None:
+            raise ValueError(f"'id' is required for {self.op}")
+        if self.op != "delete" and self.todo is None:
+            raise ValueError(f"'todo' is required for {self.op}")
+        return self
+
+
+class TodoBatchRequest(BaseModel):
+    operations: List[TodoBatchOperation] = Field(..., min_length=1, max_length=TODO_BATCH_MAX_SIZE,
+                                                 description="Operations applied in a single transaction")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "operations": [
+                    {"op": "create", "todo": {"title": "Buy groceries", "description": "Milk, Bread, Eggs",
+                                              "priority": 2, "complete": False}},
+                    {"op": "update", "id": 1, "todo": {"title": "Walk the dog", "description": "Around the park",
+                                                       "priority": 1, "complete": True}},
+                    {"op": "delete", "id": 2}
+                ]
+            }
+        }
+    }
+
+
 def redirect_to_login():
     redirect_response = RedirectResponse(url="/auth/login-page", status_code=status.HTTP_302_FOUND)
     redirect_response.delete_cookie(key="access_token")
@@ -77,15 +124,48 @@ router = APIRouter(
 #         db.close()
 
 # This will inject the database session into the route handlers
-db_dependency = Annotated[Session, Depends(get_db)]
+page_db_dependency = Annotated[AsyncSession, Depends(get_db)]
 # This will inject the current user into the route handlers
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
+
+async def get_todo_db(user: user_dependency, db: page_db_dependency):
+    # The session of the shard holding the current user's todos
+    async with owner_session(db, user['id'] if user else None) as todo_db:
+        yield todo_db
+
+# This will inject the session holding the current user's todos into the route handlers
+db_dependency = Annotated[AsyncSession, Depends(get_todo_db)]
+
+optional_bearer = OAuth2PasswordBearer(tokenUrl="auth/get-token", auto_error=False)
+
+
+async def get_stream_user(request: Request, token: Annotated[Optional[str], Depends(optional_bearer)]):
+    # Browsers' EventSource cannot send headers, so the page's cookie may carry the token instead
+    return await get_current_user(token or request.cookies.get("access_token"))
+
+async def load_page_todos(db: AsyncSession, owner_id: int, cursor: Optional[str], limit: int):
+    """
+    One page of a user's todos as plain dicts plus the next page's cursor,
+    served from the response cache when possible.
+    """
+    key = await todo_cache.key(owner_id, f"page:{cursor}:{limit}")
+    cached = await todo_cache.get(key)
+    if cached is None:
+        query = paginate(select(*TODO_COLUMNS).where(Todos.owner_id == owner_id), (Todos.id,), "id", cursor, limit)
+        result = await db.execute(query)
+        todos, next_cursor = split_page(result.all(), "id", ("id",), limit)
+        cached = await todo_cache.set(key, dumps(rows_to_dicts(todos)), next_cursor)
+    return loads(cached.body), cached.next_cursor
+
+
 #### Pages ####
 @router.get("/todo-page")
-async def render_todos_page(request: Request, db: db_dependency):
+async def render_todos_page(request: Request, db: page_db_dependency,
+                            cursor: Optional[str] = Query(default=None, description="Cursor of the page to show"),
+                            limit: int = Query(default=100, ge=1, le=500, description="Todos per page")):
     """
-    Render the Todos home page.
+    Render the Todos home page, one page of todos at a time.
     """
     try:
         user = await get_current_user(request.cookies.get("access_token"))
@@ -93,10 +173,11 @@ async def render_todos_page(request: Request, db: db_dependency):
         if user is None:
             return redirect_to_login()
 
-        todos = db.query(Todos).filter(Todos.owner_id == user.get("id")).all()
-
+        async with owner_session(db, user.get("id")) as todo_db:
+            todos, next_cursor = await load_page_todos(todo_db, user.get("id"), cursor, limit)
 
-        return templates.TemplateResponse(name ="todo.html",context= {"request": request, "todos": todos, "user": user})
+        return stream_template(request, "todo.html", {"todos": todos, "user": user,
+                                                      "next_cursor": next_cursor, "limit": limit})
     except:
         return redirect_to_login()
 
@@ -111,12 +192,12 @@ async def render_add_todo_page(request: Request):
         if user is None:
             return redirect_to_login()
 
-        return templates.TemplateResponse(name="add-todo.html", context={"request": request, "user": user})
+        return get_templates().TemplateResponse(name="add-todo.html", context={"request": request, "user": user})
     except:
         return redirect_to_login()
 
 @router.get("/edit-todo-page/{todo_id}")
-async def render_edit_todo_page(request: Request, db: db_dependency, todo_id: int = Path(gt=0)):
+async def render_edit_todo_page(request: Request, db: page_db_dependency, todo_id: int = Path(gt=0)):
     """
     Render the Edit Todo page.
     """
@@ -126,25 +207,124 @@ async def render_edit_todo_page(request: Request, db: db_dependency, todo_id: in
         if user is None:
             return redirect_to_login()
 
-        todo = db.query(Todos).filter(Todos.id == todo_id, Todos.owner_id == user.get("id")).first()
+        async with owner_session(db, user.get("id")) as todo_db:
+            result = await todo_db.execute(select(Todos).where(Todos.id == todo_id, Todos.owner_id == user.get("id")))
+            todo = result.scalars().first()
         if not todo:
             raise HTTPException(status_code=404, detail="Todo not found")
 
-        return templates.TemplateResponse(name="edit-todo.html", context={"request": request, "todo": todo, "user": user})
+        return get_templates().TemplateResponse(name="edit-todo.html", context={"request": request, "todo": todo, "user": user})
     except:
         return redirect_to_login()
 
 
 
 #### API Endpoints ####
-@router.get("/")
-def read_all(user: user_dependency,db: db_dependency):  # dependency injection to get the database session
-    print("!!!User:", user)
-    print("Router get_db id:", id(get_db))
-    print("Router get_current_user id:", id(get_current_user))
-    print("Router or App id:", id(router))
-    todos = db.query(Todos).filter(Todos.owner_id == user['id']).all()
-    return todos
+# Sort orders accepted by the list endpoint, mapped to their keyset columns
+TODO_SORTS = {
+    "id": ((Todos.id,), ("id",), False),
+    "-id": ((Todos.id,), ("id",), True),
+    "priority": ((Todos.priority, Todos.id), ("priority", "id"), False),
+    "-priority": ((Todos.priority, Todos.id), ("priority", "id"), True),
+}
+
+
+@router.get("/", response_model=List[TodoResponse])
+async def read_all(user: user_dependency,
+                   db: db_dependency,  # dependency injection to get the database session
+                   complete: Optional[bool] = Query(default=None, description="Only return todos with this completion status"),
+                   priority_min: Optional[int] = Query(default=None, ge=1, le=10, description="Lowest priority to return"),
+                   priority_max: Optional[int] = Query(default=None, ge=1, le=10, description="Highest priority to return"),
+                   sort: Literal["id", "-id", "priority", "-priority"] = Query(default="id", description="Sort order"),
+                   cursor: Optional[str] = Query(default=None, description="Cursor from the X-Next-Cursor header of the previous page"),
+                   limit: int = Query(default=100, ge=1, le=500, description="Maximum number of todos per page"),
+                   include_archived: bool = Query(default=False, description="Also list completed todos moved to the archive"),
+                   if_none_match: Optional[str] = Header(default=None)):
+    """
+    List the user's todos one page at a time. The cursor for the next page is
+    returned in the X-Next-Cursor header and is absent on the last page.
+    Pages are cached until the user's next write and carry an ETag, so an
+    unchanged page is answered with 304 Not Modified.
+    """
+    owner_id = user['id']
+    key = await todo_cache.key(owner_id, f"list:{complete}:{priority_min}:{priority_max}:{sort}:{cursor}:{limit}"
+                                         f":{include_archived}")
+    cached = await todo_cache.get(key)
+    if cached is None:
+        def filtered(model):
+            query = select(*(getattr(model, column.key) for column in TODO_COLUMNS)).where(model.owner_id == owner_id)
+            if complete is not None:
+                query = query.where(model.complete == complete)
+            if priority_min is not None:
+                query = query.where(model.priority >= priority_min)
+            if priority_max is not None:
+                query = query.where(model.priority <= priority_max)
+            return query
+
+        columns, keys, descending = TODO_SORTS[sort]
+        if include_archived:
+            query = paginate_with_archived(filtered, keys, sort, cursor, limit, descending)
+        else:
+            query = paginate(filtered(Todos), columns, sort, cursor, limit, descending)
+        result = await db.execute(query)
+        todos, next_cursor = split_page(result.all(), sort, keys, limit)
+        cached = await todo_cache.set(key, dumps(rows_to_dicts(todos)), next_cursor)
+
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if cached.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = cached.next_cursor
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=List[TodoSearchResult])
+async def search(user: user_dependency,
+                 db: db_dependency,
+                 q: str = Query(..., min_length=1, max_length=200, description="Words to look for in title and description"),
+                 limit: int = Query(default=20, ge=1, le=100, description="Maximum number of results"),
+                 offset: int = Query(default=0, ge=0, le=10000, description="Number of results to skip")):
+    """
+    Full-text search over the user's todos, best match first.
+    """
+    return FastJSONResponse(await search_todos(db, user['id'], q, limit, offset))
+
+@router.get("/changes", status_code=status.HTTP_200_OK, response_model=TodoChanges)
+async def read_changes(user: user_dependency,
+                       db: db_dependency,
+                       since: Optional[str] = Query(default=None, description="Token from the 'next' field of the previous sync"),
+                       limit: int = Query(default=500, ge=1, le=1000, description="Maximum number of changes and of deletions")):
+    """
+    Incremental sync: the todos created or updated and the ids deleted since
+    the token. Without a token every todo is returned. Apply "deleted" before
+    "changes", keep "next" for the following sync and call again right away
+    while "has_more" is true. 410 Gone means the token is too old: fetch the
+    full list and sync without a token.
+    """
+    return FastJSONResponse(await changes_since(db, user['id'], since, limit))
+
+@router.get("/stats", status_code=status.HTTP_200_OK, response_model=TodoStats)
+async def read_stats(user: user_dependency, db: db_dependency):
+    """
+    Open and completed counts of the user's todos, in total and by priority,
+    read from counters kept up to date by every write. Archived todos are
+    not counted.
+    """
+    return FastJSONResponse(summarize(await read_counts(db, user['id'])))
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream(user: Annotated[dict, Depends(get_stream_user)]):
+    """
+    Server-Sent Events with the user's todo changes as they are committed:
+    "created" and "updated" carry the todo as GET /todos/changes returns it,
+    "deleted" its id. A "dropped" event ends a stream that fell behind;
+    reconnect and catch up with GET /todos/changes.
+    """
+    subscription = hub.subscribe(user['id'])
+    if subscription is None:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many open streams")
+    return StreamingResponse(stream_events(subscription, hub), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # @router.get("/", status_code=status.HTTP_200_OK)
 # async def read_all(user: user_dependency, db: db_dependency):
 #     if user is None:
@@ -152,33 +332,43 @@ def read_all(user: user_dependency,db: db_dependency):  # dependency injection t
 #     print("!!!User:", user)
 #     return db.query(Todos).filter(Todos.owner_id == user.get('id')).all()
 
-@router.get("/{todo_id}", status_code=status.HTTP_200_OK)
-async def read_todo_by_id(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+@router.get("/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse)
+async def read_todo_by_id(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0),
+                          include_archived: bool = Query(default=False, description="Also look in the archive")):
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     user_id = user['id']
-    todo = db.query(Todos).filter(Todos.id == todo_id, Todos.owner_id == user_id).first()
+    result = await db.execute(select(*TODO_COLUMNS).where(Todos.id == todo_id, Todos.owner_id == user_id))
+    todo = result.first()
+    if todo is None and include_archived:
+        result = await db.execute(select(*(getattr(TodosArchive, column.key) for column in TODO_COLUMNS))
+                                  .where(TodosArchive.id == todo_id, TodosArchive.owner_id == user_id))
+        todo = result.first()
     if todo:
         return todo
     raise HTTPException(status_code=404, detail="Todo id:" + str(todo_id) + " not found for user " + str(user_id))
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=TodoWriteResponse)
 async def add_todo(todo_request: TodosRequest, user: user_dependency, db: db_dependency):
     try:
         if not user:
             raise HTTPException(status_code=401, detail="Not authenticated")
         new_todo = Todos(**todo_request.model_dump(), owner_id=user['id'])
         db.add(new_todo)
-        db.commit()
-        db.refresh(new_todo)
+        await apply_counts(db, todo_deltas(user['id'], added=[(new_todo.priority, new_todo.complete)]))
+        await db.commit()
+        await db.refresh(new_todo)
+        await todo_cache.invalidate(user['id'])
+        audit_log.record("todo", new_todo.id, "create", user['id'], **todo_request.model_dump())
+        await hub.publish("created", user['id'], todo_payload(new_todo))
         return {"message": "Todo added successfully", "todo": new_todo}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error adding todo: {str(e)}")
 
 
-@router.put("/{todo_id}", status_code=status.HTTP_200_OK)
+@router.put("/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoWriteResponse)
 async def update_todo(todo_request: TodosRequest,
                       user: user_dependency,
                       db: db_dependency,
@@ -187,18 +377,26 @@ async def update_todo(todo_request: TodosRequest,
         if not user:
             raise HTTPException(status_code=401, detail="Not authenticated")
         user_id = user['id']
-        todo = db.query(Todos).filter(Todos.id == todo_id, Todos.owner_id == user_id).first()
+        # Locked, so a concurrent update waits and then counts from the values this one writes
+        result = await db.execute(select(Todos).where(Todos.id == todo_id, Todos.owner_id == user_id)
+                                  .with_for_update())
+        todo = result.scalars().first()
         if not todo:
             raise HTTPException(status_code=404, detail="Todo not found")
 
+        before = (todo.priority, todo.complete)
         for key, value in todo_request.model_dump().items():
             setattr(todo, key, value)
 
-        db.commit()
-        db.refresh(todo)
+        await apply_counts(db, todo_deltas(user_id, [before], [(todo.priority, todo.complete)]))
+        await db.commit()
+        await db.refresh(todo)
+        await todo_cache.invalidate(user_id)
+        audit_log.record("todo", todo_id, "update", user_id, **todo_request.model_dump())
+        await hub.publish("updated", user_id, todo_payload(todo))
         return {"message": "Todo updated successfully", "todo": todo}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating todo: {str(e)}")
 
 
@@ -208,13 +406,113 @@ async def delete_todo(db: db_dependency, user: user_dependency, todo_id: int = P
         if not user:
             raise HTTPException(status_code=401, detail="Not authenticated")
         user_id = user['id']
-        todo = db.query(Todos).filter(Todos.id == todo_id,  Todos.owner_id == user_id).first()
-        if not todo:
+        # The counted values come from the row the DELETE removed: a concurrent delete of the same todo removes nothing
+        result = await db.execute(delete(Todos).where(Todos.id == todo_id, Todos.owner_id == user_id)
+                                  .returning(Todos.priority, Todos.complete))
+        deleted = [tuple(row) for row in result.all()]
+        if not deleted:
             raise HTTPException(status_code=404, detail="Todo not found")
 
-        db.delete(todo)
-        db.commit()
+        await record_deletions(db, [(todo_id, user_id)])
+        await apply_counts(db, todo_deltas(user_id, removed=deleted))
+        await db.commit()
+        await todo_cache.invalidate(user_id)
+        audit_log.record("todo", todo_id, "delete", user_id)
+        await hub.publish("deleted", user_id, {"id": todo_id})
         return {"message": "Todo deleted successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting todo: {str(e)}")
+
+
+async def publish_batch(db: AsyncSession, owner_id: int, results: list):
+    """
+    Events for the operations of a batch that took effect, with the written
+    rows read back in one query.
+    """
+    if not hub.has_listeners(owner_id):
+        return
+    written = {result["id"]: "created" if result["status"] == status.HTTP_201_CREATED else "updated"
+               for result in results if result["status"] in (status.HTTP_200_OK, status.HTTP_201_CREATED)}
+    if written:
+        rows = await db.execute(select(*SYNC_COLUMNS).where(Todos.id.in_(written), Todos.owner_id == owner_id))
+        for row in rows.all():
+            await hub.publish(written[row.id], owner_id, todo_payload(row))
+    for result in results:
+        if result["status"] == status.HTTP_204_NO_CONTENT:
+            await hub.publish("deleted", owner_id, {"id": result["id"]})
+
+
+@router.post("/batch", status_code=status.HTTP_200_OK)
+async def batch_todos(batch: TodoBatchRequest, user: user_dependency, db: db_dependency):
+    """
+    Apply a list of create/update/delete operations in one transaction.
+    Creates are inserted with a single multi-row INSERT ... RETURNING,
+    updates are sent as one executemany and deletes as one DELETE ... IN,
+    in that order. Each operation gets its own result with an HTTP-style status.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_id = user['id']
+    operations = batch.operations
+    results = [{"index": index, "op": operation.op, "id": operation.id, "status": status.HTTP_404_NOT_FOUND}
+               for index, operation in enumerate(operations)]
+    try:
+        creates = [index for index, operation in enumerate(operations) if operation.op == "create"]
+        if creates:
+            rows = await db.execute(
+                insert(Todos).returning(Todos.id, sort_by_parameter_order=True),
+                [{**operations[index].todo.model_dump(), "owner_id": user_id} for index in creates]
+            )
+            for index, todo_id in zip(creates, rows.scalars().all()):
+                results[index].update(id=todo_id, status=status.HTTP_201_CREATED)
+        added = [(operations[index].todo.priority, operations[index].todo.complete) for index in creates]
+        removed = []
+
+        # One query tells which of the referenced todos exist and belong to the user, and how they are counted.
+        # Locked, so concurrent writes to the same todos wait instead of counting from the same old values.
+        referenced = {operation.id for operation in operations if operation.op != "create"}
+        owned = {}
+        if referenced:
+            rows = await db.execute(select(Todos.id, Todos.priority, Todos.complete)
+                                    .where(Todos.id.in_(referenced), Todos.owner_id == user_id).with_for_update())
+            owned = {todo_id: (priority, complete) for todo_id, priority, complete in rows.all()}
+
+        updates = [index for index, operation in enumerate(operations)
+                   if operation.op == "update" and operation.id in owned]
+        if updates:
+            await db.execute(update(Todos), [{**operations[index].todo.model_dump(), "id": operations[index].id}
+                                             for index in updates])
+            for index in updates:
+                results[index]["status"] = status.HTTP_200_OK
+                todo = operations[index].todo
+                removed.append(owned[operations[index].id])
+                added.append((todo.priority, todo.complete))
+                # A later update of the same todo starts from these values
+                owned[operations[index].id] = (todo.priority, todo.complete)
+
+        deletes = [index for index, operation in enumerate(operations)
+                   if operation.op == "delete" and operation.id in owned]
+        if deletes:
+            deleted_ids = {operations[index].id for index in deletes}
+            # Counted from the rows the DELETE removed, as this batch's updates left them
+            rows = await db.execute(delete(Todos).where(Todos.id.in_(deleted_ids), Todos.owner_id == user_id)
+                                    .returning(Todos.id, Todos.priority, Todos.complete))
+            rows = rows.all()
+            await record_deletions(db, [(row.id, user_id) for row in rows])
+            removed += [(row.priority, row.complete) for row in rows]
+            for index in deletes:
+                results[index]["status"] = status.HTTP_204_NO_CONTENT
+
+        await apply_counts(db, todo_deltas(user_id, removed, added))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error applying batch: {str(e)}")
+    await todo_cache.invalidate(user_id)
+    for operation, result in zip(operations, results):
+        if result["status"] != status.HTTP_404_NOT_FOUND:
+            details = operation.todo.model_dump() if operation.todo is not None else {}
+            audit_log.record("todo", result["id"], operation.op, user_id, batch=True, **details)
+    await publish_batch(db, user_id, results)
+    return {"message": "Batch applied successfully", "results": results}
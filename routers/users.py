@@ -2,28 +2,31 @@ from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Path, Depends
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from typing_extensions import Annotated
 
-from TodoApp.database import SessionLocal
+from TodoApp.audit import audit_log
+from TodoApp.cache import user_cache
+from TodoApp.database import get_db
 from TodoApp.models import Todos, Users
-from TodoApp.routers.auth import get_current_user, bcrypt_context
+from TodoApp.routers.auth import get_current_user
+from TodoApp.schemas import dumps, loads
+from TodoApp.security import password_hasher, token_cache
 
 router = APIRouter(
     prefix="/users",
     tags=["users"]
 )
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Columns load_current_user may cache. The password hash is left out so no cache ever holds it.
+PROFILE_COLUMNS = (Users.id, Users.username, Users.role, Users.phone_number)
+# Columns the handlers below return; selecting them avoids hydrating a Users object
+USER_COLUMNS = PROFILE_COLUMNS + (Users.hashed_password,)
 
 # This will inject the database session into the route handlers
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 # This will inject the current user into the route handlers
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
@@ -35,68 +38,83 @@ class UserInfoResponse(BaseModel):
     phone_number: Optional[str] = None
 
 
-
-@router.get("/get-user", status_code=status.HTTP_200_OK, response_model=UserInfoResponse)
-async def get_user_info(user: user_dependency, db: db_dependency):
+async def load_current_user(user: user_dependency, db: db_dependency) -> dict:
+    """
+    The current user's row. FastAPI caches dependencies per request, so it
+    is read at most once per request however many dependants ask for it.
+    With USER_CACHE_TTL set the profile is also reused across requests until
+    the user's next update; a row served from the cache has no
+    hashed_password.
+    """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
     user_id = user['id']
-    user_info = db.query(Users).filter(Users.id == user_id).first()
+    key = await user_cache.key(user_id, "profile") if user_cache.ttl > 0 else None
+    cached = await user_cache.get(key) if key else None
+    if cached is not None:
+        return loads(cached.body)
 
-    if not user_info:
+    row = (await db.execute(select(*USER_COLUMNS).where(Users.id == user_id))).first()
+    if row is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    user_info = row._asdict()
+    if key:
+        await user_cache.set(key, dumps({column.key: user_info[column.key] for column in PROFILE_COLUMNS}))
+    return user_info
+
+
+user_info_dependency = Annotated[dict, Depends(load_current_user)]
 
+
+def to_response(user_info: dict) -> UserInfoResponse:
     return UserInfoResponse(
-        id=user_info.id,
-        username=user_info.username,
-        role=user_info.role,
-        password = user_info.hashed_password,
-        phone_number = user_info.phone_number
+        id=user_info['id'],
+        username=user_info['username'],
+        role=user_info['role'],
+        password=user_info['hashed_password'],
+        phone_number=user_info['phone_number']
     )
 
-@router.put("/update-password", status_code=status.HTTP_200_OK, response_model=UserInfoResponse)
-async def update_password(new_password: str, user: user_dependency, db: db_dependency):
+
+async def update_current_user(db: AsyncSession, user: dict, **values) -> dict:
+    """
+    Apply the changes with a single UPDATE ... RETURNING and return the new row.
+    """
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
     user_id = user['id']
-    user_info = db.query(Users).filter(Users.id == user_id).first()
-
-    if not user_info:
+    result = await db.execute(update(Users).where(Users.id == user_id).values(**values).returning(*USER_COLUMNS))
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    await db.commit()
+    await user_cache.invalidate(user_id)
+    return row._asdict()
 
-    # Update the user's password
-    user_info.hashed_password = bcrypt_context.hash(new_password)
-    db.commit()
 
-    return UserInfoResponse(
-        id=user_info.id,
-        username=user_info.username,
-        role=user_info.role,
-        password=user_info.hashed_password,
-        phone_number=user_info.phone_number
-    )
+@router.get("/get-user", status_code=status.HTTP_200_OK, response_model=UserInfoResponse)
+async def get_user_info(user_info: user_info_dependency, db: db_dependency):
+    if 'hashed_password' not in user_info:
+        # The profile came from the cache, which never holds the hash
+        user_info = {**user_info, 'hashed_password': (await db.execute(
+            select(Users.hashed_password).where(Users.id == user_info['id']))).scalar()}
+    return to_response(user_info)
+
+@router.put("/update-password", status_code=status.HTTP_200_OK, response_model=UserInfoResponse)
+async def update_password(new_password: str, user: user_dependency, db: db_dependency):
+    # Update the user's password
+    user_info = await update_current_user(db, user, hashed_password=await password_hasher.hash(new_password))
+    # Refresh tokens carry a stamp of the old password and stop working. Access tokens are stateless and
+    # stay valid until they expire (ACCESS_TOKEN_EXPIRE_MINUTES); this only drops the cached verifications
+    token_cache.invalidate_user(user['id'])
+    audit_log.record("user", user['id'], "update-password", user['id'])
+    return to_response(user_info)
 
 @router.put("/update-phone-number", status_code=status.HTTP_200_OK, response_model=UserInfoResponse)
 async def update_phone_number(new_phone_number: str, user: user_dependency, db: db_dependency):
-    if user is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-
-    user_id = user['id']
-    user_info = db.query(Users).filter(Users.id == user_id).first()
-
-    if not user_info:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
     # Update the user's phone number
-    user_info.phone_number = new_phone_number
-    db.commit()
-
-    return UserInfoResponse(
-        id=user_info.id,
-        username=user_info.username,
-        role=user_info.role,
-        password=user_info.hashed_password,
-        phone_number=user_info.phone_number
-    )
\ No newline at end of file
+    user_info = await update_current_user(db, user, phone_number=new_phone_number)
+    audit_log.record("user", user['id'], "update-phone-number", user['id'], phone_number=new_phone_number)
+    return to_response(user_info)
@@ -0,0 +1,88 @@
+import json
+from typing import List, Optional
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict
+
+try:
+    # Optional dependency: several times faster than the json module on large lists
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class TodoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str]
+    description: Optional[str]
+    priority: Optional[int]
+    complete: Optional[bool]
+    owner_id: Optional[int]
+
+
+class TodoSearchResult(TodoResponse):
+    rank: float
+
+
+class TodoChange(TodoResponse):
+    version: int
+    updated_at: str
+
+
+class TodoDeletion(BaseModel):
+    id: int
+    deleted_at: str
+
+
+class TodoChanges(BaseModel):
+    changes: List[TodoChange]
+    deleted: List[TodoDeletion]
+    next: str
+    has_more: bool
+
+
+class PriorityStats(BaseModel):
+    priority: int
+    open: int
+    completed: int
+
+
+class TodoStats(BaseModel):
+    total: int
+    open: int
+    completed: int
+    by_priority: List[PriorityStats]
+
+
+class TodoWriteResponse(BaseModel):
+    message: str
+    todo: TodoResponse
+
+
+def rows_to_dicts(rows) -> list:
+    """
+    Plain dicts from Core rows selected with models.TODO_COLUMNS.
+    """
+    return [row._asdict() for row in rows]
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), default=str).encode()
+
+
+def loads(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for large, already JSON-ready payloads: no jsonable_encoder
+    pass, serialized with orjson when it is installed.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,51 @@
+import re
+
+from sqlalchemy import cast, column, func, literal, literal_column, or_, select, table
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from TodoApp.models import TODO_COLUMNS, Todos
+
+# FTS5 table created next to todosapp on SQLite (see models.TODOS_SEARCH_DDL)
+todosapp_fts = table("todosapp_fts", column("rowid"), column("rank"))
+
+
+def to_fts5_query(q: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, as a prefix,
+    and FTS5 operators typed by the user are treated as plain words.
+    """
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", q))
+
+
+def build_search_query(dialect: str, owner_id: int, q: str):
+    """
+    Select the todo columns and rank for the owner's todos matching q, best match first.
+    Higher rank is better on every backend.
+    """
+    if dialect == "postgresql":
+        ts_query = func.websearch_to_tsquery(cast("english", REGCONFIG), q)
+        vector = literal_column("todosapp.search_vector")
+        rank = func.ts_rank_cd(vector, ts_query)
+        return (select(*TODO_COLUMNS, rank.label("rank"))
+                .where(Todos.owner_id == owner_id, vector.op("@@")(ts_query))
+                .order_by(rank.desc(), Todos.id))
+    if dialect == "sqlite":
+        # FTS5's rank is bm25, where lower is better
+        return (select(*TODO_COLUMNS, (-todosapp_fts.c.rank).label("rank"))
+                .join(todosapp_fts, todosapp_fts.c.rowid == Todos.id)
+                .where(literal_column("todosapp_fts").op("MATCH")(to_fts5_query(q)), Todos.owner_id == owner_id)
+                .order_by(todosapp_fts.c.rank, Todos.id))
+    # Unindexed fallback for other backends
+    pattern = f"%{q}%"
+    return (select(*TODO_COLUMNS, literal(0.0).label("rank"))
+            .where(Todos.owner_id == owner_id, or_(Todos.title.ilike(pattern), Todos.description.ilike(pattern)))
+            .order_by(Todos.id))
+
+
+async def search_todos(db: AsyncSession, owner_id: int, q: str, limit: int, offset: int) -> list:
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite" and not to_fts5_query(q):
+        return []
+    result = await db.execute(build_search_query(dialect, owner_id, q).limit(limit).offset(offset))
+    return [row._asdict() for row in result.all()]
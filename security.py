@@ -0,0 +1,332 @@
+import asyncio
+import hashlib
+import heapq
+import ipaddress
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext, LazyCryptContext
+from starlette import status
+from starlette.datastructures import Headers
+
+from TodoApp.metrics import BCRYPT_LATENCY, CallbackMetric, registry
+
+# bcrypt cost factor. Hashes below it are upgraded transparently at login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads doing bcrypt work, and how many more calls may wait for one before we shed load
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_POOL_QUEUE_LIMIT = int(os.getenv("HASH_POOL_QUEUE_LIMIT", "64"))
+# Number of verified tokens kept in memory; 0 disables the cache
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+# Set to share revoked refresh tokens between workers instead of keeping them per process
+TOKEN_REVOCATION_REDIS_URL = os.getenv("TOKEN_REVOCATION_REDIS_URL")
+# Comma separated addresses or networks of the reverse proxies in front of the app. Anonymous requests
+# they pass on are told apart by X-Forwarded-For; otherwise every client behind a proxy shares its
+# rate limit bucket. Running uvicorn with --proxy-headers --forwarded-allow-ips=<proxies> does the same.
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES", "")
+
+# Create a CryptContext for hashing passwords; it loads the bcrypt backend on first use
+bcrypt_context = LazyCryptContext(schemes=["bcrypt"], deprecated="auto",
+                                  bcrypt__rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a bounded thread pool so it never blocks the event loop
+    (bcrypt releases the GIL while hashing). Calls beyond the pool size plus
+    the queue limit are rejected with 503 instead of piling up.
+    """
+
+    def __init__(self, context: CryptContext, workers: int, queue_limit: int):
+        self.context = context
+        self.capacity = workers + queue_limit
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def _run(self, func, *args):
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self.pending >= self.capacity:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Server is busy, please retry shortly",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, func, *args)
+        finally:
+            self.pending -= 1
+
+    @staticmethod
+    def _timed(func, *args):
+        # Runs on the worker thread, so queueing time is not counted
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            BCRYPT_LATENCY.observe(time.perf_counter() - start, func.__name__)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Return (valid, new_hash). new_hash is set when the stored hash uses
+        an outdated cost factor and should be replaced.
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+
+password_hasher = PasswordHasher(bcrypt_context, HASH_POOL_WORKERS, HASH_POOL_QUEUE_LIMIT)
+
+registry.register(CallbackMetric(
+    "password_hash_pool_pending", "Password hashing calls running or queued", "gauge",
+    lambda: {(): password_hasher.pending}))
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified JWT claims keyed by the SHA-256 digest of the
+    token. An entry lives until the token's own exp, so a hit is exactly as
+    valid as a fresh jwt.decode.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._keys_by_user: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: dict):
+        if self.max_size <= 0 or "exp" not in claims:
+            return
+        key = self._key(token)
+        self._entries[key] = (claims, float(claims["exp"]))
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(claims.get("id"), set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: Any):
+        """
+        Drop every cached token of a user, e.g. after a password change. This
+        does not revoke them: the next request decodes the token again and it
+        is accepted until its exp.
+        """
+        for key in self._keys_by_user.pop(user_id, set()):
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_user.clear()
+
+    def _remove(self, key: str):
+        claims, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(claims.get("id"))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[claims.get("id")]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+token_cache = TokenCache(JWT_CACHE_SIZE)
+
+registry.register(CallbackMetric(
+    "jwt_cache_events_total", "Verified-token cache lookups and removals", "counter",
+    lambda: {(event,): count for event, count in token_cache.stats().items() if event not in ("size", "max_size")},
+    ("event",)))
+registry.register(CallbackMetric(
+    "jwt_cache_size", "Tokens held in the verified-token cache", "gauge", lambda: {(): token_cache.stats()["size"]}))
+
+
+def password_stamp(hashed_password: str) -> str:
+    """
+    Short fingerprint of a password hash, embedded in refresh tokens so a
+    password change invalidates them without a bcrypt call.
+    """
+    return hashlib.blake2b(hashed_password.encode(), digest_size=8).hexdigest()
+
+
+class RevocationStore:
+    """
+    Revoked refresh token ids (jti) and token families. An entry is only kept
+    until the tokens it covers would have expired on their own. Methods are
+    async so a networked store can implement them.
+    """
+
+    async def revoke(self, key: str, expires_at: float) -> bool:
+        """
+        Revoke a key until expires_at (epoch seconds). Returns False if it was
+        already revoked, which makes a check-and-revoke a single atomic step.
+        """
+        raise NotImplementedError
+
+    async def is_revoked(self, key: str) -> bool:
+        raise NotImplementedError
+
+
+class MemoryRevocationStore(RevocationStore):
+    """
+    Per-process set of revoked keys. A heap ordered by expiry lets every call
+    drop the entries that have run out in O(log n) each.
+    """
+
+    def __init__(self):
+        self._expires_at: dict = {}
+        self._heap: list = []
+
+    def _purge(self):
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            if self._expires_at.get(key) == expires_at:
+                del self._expires_at[key]
+
+    async def revoke(self, key: str, expires_at: float) -> bool:
+        self._purge()
+        if key in self._expires_at:
+            return False
+        if expires_at > time.time():
+            self._expires_at[key] = expires_at
+            heapq.heappush(self._heap, (expires_at, key))
+        return True
+
+    async def is_revoked(self, key: str) -> bool:
+        self._purge()
+        return key in self._expires_at
+
+    def __len__(self):
+        return len(self._expires_at)
+
+
+class RedisRevocationStore(RevocationStore):
+    """
+    Revocations shared by every worker through a Redis-compatible store,
+    expired by Redis itself.
+    """
+
+    def __init__(self, client, prefix: str = "revoked:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def revoke(self, key: str, expires_at: float) -> bool:
+        return bool(await self.client.set(self.prefix + key, 1, exat=int(expires_at) + 1, nx=True))
+
+    async def is_revoked(self, key: str) -> bool:
+        return bool(await self.client.exists(self.prefix + key))
+
+
+def build_revocation_store() -> RevocationStore:
+    if TOKEN_REVOCATION_REDIS_URL:
+        # Optional dependency, only needed when a shared store is configured
+        import redis.asyncio
+        return RedisRevocationStore(redis.asyncio.from_url(TOKEN_REVOCATION_REDIS_URL))
+    return MemoryRevocationStore()
+
+
+revocation_store = build_revocation_store()
+
+
+def parse_networks(spec: str) -> Tuple[Any, ...]:
+    """
+    "10.0.0.0/8, 127.0.0.1" -> (IPv4Network('10.0.0.0/8'), IPv4Network('127.0.0.1/32'))
+    """
+    return tuple(ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip())
+
+
+trusted_proxies = parse_networks(TRUSTED_PROXIES)
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_address(scope: dict, headers: Headers) -> str:
+    """
+    The address a request came from. Behind trusted proxies that is the
+    last address in X-Forwarded-For that is not a proxy itself: entries
+    left of it were written by the client and can be made up.
+    """
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not _trusted(address):
+        return address
+    forwarded = [part.strip() for value in headers.getlist("x-forwarded-for") for part in value.split(",")]
+    for hop in reversed([hop for hop in forwarded if hop]):
+        address = hop
+        if not _trusted(hop):
+            break
+    return address
+
+
+async def client_key(scope: dict) -> str:
+    """
+    Identify who sent a request: "user:<id>" when it carries a valid bearer
+    token or access_token cookie, "ip:<address>" (see client_address)
+    otherwise. Tokens are verified (through the token cache) so made-up
+    ones cannot pose as many clients.
+    """
+    # Imported here: the auth router itself depends on this module
+    from TodoApp.routers.auth import get_current_user
+
+    headers = Headers(scope=scope)
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = _cookie(headers.get("cookie", ""), "access_token")
+    if token:
+        try:
+            return f"user:{(await get_current_user(token))['id']}"
+        except HTTPException:
+            pass
+    return f"ip:{client_address(scope, headers)}"
+
+
+def _cookie(header: str, name: str) -> Optional[str]:
+    for part in header.split(";"):
+        key, _, value = part.strip().partition("=")
+        if key == name:
+            return value or None
+    return None
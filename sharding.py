@@ -0,0 +1,102 @@
+"""
+Horizontal sharding of todos by owner. All of an owner's todos, and their
+tombstones, live on the one shard a consistent hash ring picks for the
+owner id, so every todo route talks to a single database; admin reads
+scatter to every shard and merge the results. Users, the audit log and
+the rest of the schema stay on DB_URL.
+
+Shards are named, and the ring is built from the names rather than from
+their order: adding a shard moves only about 1/N of the owners, whose rows
+must be copied to it before it takes traffic. Todo ids are only unique
+within a shard.
+"""
+import asyncio
+import bisect
+import hashlib
+import os
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+# Comma separated "name=url" pairs (a bare url is named after its position, shard0, shard1, ...).
+# Unset keeps todos on DB_URL.
+DB_SHARD_URLS = os.getenv("DB_SHARD_URLS", "")
+# Points per shard on the hash ring; more points spread owners more evenly
+DB_SHARD_VNODES = int(os.getenv("DB_SHARD_VNODES", "160"))
+
+T = TypeVar("T")
+
+
+def parse_shard_urls(spec: str) -> Dict[str, str]:
+    """
+    Shard names and URLs from DB_SHARD_URLS, in the order given.
+    """
+    shards: Dict[str, str] = {}
+    for number, item in enumerate(item.strip() for item in spec.split(",") if item.strip()):
+        name, separator, url = item.partition("=")
+        # A URL's query string has "=" too, so only a plain word before it is a name
+        if not separator or not re.fullmatch(r"[\w-]+", name):
+            name, url = f"shard{number}", item
+        if name in shards:
+            raise ValueError(f"Shard {name!r} is configured twice in DB_SHARD_URLS")
+        shards[name] = url
+    return shards
+
+
+def ring_hash(value: str) -> int:
+    # Stable across processes and Python versions, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing: each node owns the arcs of the ring that end at its
+    points, a key goes to the first point at or after its own hash.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = DB_SHARD_VNODES):
+        points = sorted((ring_hash(f"{node}#{point}"), node) for node in nodes for point in range(vnodes))
+        if not points:
+            raise ValueError("A hash ring needs at least one node")
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key) -> str:
+        index = bisect.bisect_left(self._hashes, ring_hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+
+class ShardRouter:
+    """
+    The shard engines, the ring that maps owners onto them and a session
+    factory per shard.
+    """
+
+    def __init__(self, engines: Dict[str, AsyncEngine], vnodes: int = DB_SHARD_VNODES):
+        self.engines = engines
+        self.ring = HashRing(engines, vnodes)
+        self.sessionmakers = {
+            name: async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+            for name, engine in engines.items()
+        }
+
+    def shard_for(self, owner_id: int) -> str:
+        return self.ring.node_for(owner_id)
+
+    def session(self, owner_id: int) -> AsyncSession:
+        """
+        A new session on the owner's shard.
+        """
+        return self.sessionmakers[self.shard_for(owner_id)]()
+
+    async def gather(self, work: Callable[[AsyncSession], Awaitable[T]]) -> List[T]:
+        """
+        Run work on every shard at once, each with a session of its own.
+        Results come back in shard order.
+        """
+        async def run(sessionmaker: async_sessionmaker) -> T:
+            async with sessionmaker() as db:
+                return await work(db)
+
+        return list(await asyncio.gather(*(run(sessionmaker) for sessionmaker in self.sessionmakers.values())))
@@ -217,6 +217,21 @@
 
 
 
+    // Live updates JS
+    const todoList = document.getElementById('todoList');
+    if (todoList && window.EventSource) {
+        const events = new EventSource('/todos/stream');
+        let reload = null;
+        const refresh = function () {
+            // A burst of changes causes a single reload
+            clearTimeout(reload);
+            reload = setTimeout(function () { window.location.reload(); }, 250);
+        };
+        ['created', 'updated', 'deleted', 'dropped'].forEach(function (type) {
+            events.addEventListener(type, refresh);
+        });
+    }
+
     // Helper function to get a cookie by name
     function getCookie(name) {
         let cookieValue = null;
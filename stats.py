@@ -0,0 +1,133 @@
+"""
+Todo counters: how many of each owner's todos have each priority and
+completion status, one todo_counters row per (owner, priority, complete).
+Every write to todosapp adds its deltas in its own transaction, so
+GET /todos/stats reads at most 20 rows however many todos the owner has,
+and GET /admin/stats sums the counters instead of the todos.
+
+    python -m TodoApp.stats rebuild [--owner ID]
+
+recomputes the counters from todosapp, e.g. after rows were written
+without going through the API. Run it while the owners concerned are not
+writing, or their concurrent changes may be counted twice or not at all.
+"""
+import argparse
+import asyncio
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from TodoApp.database import database
+from TodoApp.models import TodoCounters, Todos
+
+# (owner_id, priority, complete)
+Bucket = Tuple[int, int, bool]
+
+UPSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def bucket(owner_id: int, priority: int, complete: Optional[bool]) -> Bucket:
+    # complete is nullable in todosapp and a NULL is counted as open, its column default
+    return owner_id, priority, bool(complete)
+
+
+def todo_deltas(owner_id: int, removed: Iterable[tuple] = (), added: Iterable[tuple] = ()) -> Counter:
+    """
+    Counter changes for the owner's todos leaving and entering buckets, each
+    given as a (priority, complete) pair: an update removes the old pair and
+    adds the new one.
+    """
+    deltas: Counter = Counter()
+    for priority, complete in removed:
+        deltas[bucket(owner_id, priority, complete)] -= 1
+    for priority, complete in added:
+        deltas[bucket(owner_id, priority, complete)] += 1
+    return deltas
+
+
+async def apply_counts(db: AsyncSession, deltas: Counter):
+    """
+    Add the deltas to todo_counters with one upsert, in the caller's
+    transaction so they commit together with the writes they count.
+    """
+    # Sorted, so concurrent transactions lock the rows in the same order
+    rows = [{"owner_id": owner_id, "priority": priority, "complete": complete, "count": count}
+            for (owner_id, priority, complete), count in sorted(deltas.items()) if count]
+    if not rows:
+        return
+    statement = UPSERTS[db.bind.dialect.name](TodoCounters).values(rows)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[TodoCounters.owner_id, TodoCounters.priority, TodoCounters.complete],
+        set_={"count": TodoCounters.count + statement.excluded.count},
+    ))
+
+
+async def read_counts(db: AsyncSession, owner_id: Optional[int] = None) -> Counter:
+    """
+    Todos by (priority, complete), for one owner or for everyone.
+    """
+    query = (select(TodoCounters.priority, TodoCounters.complete, func.sum(TodoCounters.count))
+             .group_by(TodoCounters.priority, TodoCounters.complete))
+    if owner_id is not None:
+        query = query.where(TodoCounters.owner_id == owner_id)
+    result = await db.execute(query)
+    return Counter({(priority, bool(complete)): int(count) for priority, complete, count in result.all()})
+
+
+def summarize(counts: Counter) -> dict:
+    """
+    The GET /todos/stats body from read_counts() results.
+    """
+    by_priority = {}
+    for (priority, complete), count in sorted(counts.items()):
+        if count:
+            entry = by_priority.setdefault(priority, {"priority": priority, "open": 0, "completed": 0})
+            entry["completed" if complete else "open"] += count
+    open_count = sum(entry["open"] for entry in by_priority.values())
+    completed = sum(entry["completed"] for entry in by_priority.values())
+    return {"total": open_count + completed, "open": open_count, "completed": completed,
+            "by_priority": list(by_priority.values())}
+
+
+async def rebuild_counts(db: AsyncSession, owner_id: Optional[int] = None) -> int:
+    """
+    Replace the counters, of one owner or of everyone, with counts taken from
+    todosapp. Returns the number of counter rows written.
+    """
+    complete = func.coalesce(Todos.complete, False)
+    counted = (select(Todos.owner_id, Todos.priority, complete, func.count())
+               .where(Todos.owner_id.is_not(None)).group_by(Todos.owner_id, Todos.priority, complete))
+    cleared = delete(TodoCounters)
+    if owner_id is not None:
+        counted = counted.where(Todos.owner_id == owner_id)
+        cleared = cleared.where(TodoCounters.owner_id == owner_id)
+    await db.execute(cleared)
+    result = await db.execute(insert(TodoCounters).from_select(["owner_id", "priority", "complete", "count"], counted))
+    await db.commit()
+    return result.rowcount
+
+
+async def rebuild(owner_id: Optional[int] = None) -> int:
+    """
+    rebuild_counts() on every database holding todos.
+    """
+    written = 0
+    try:
+        for sessionmaker in database.todo_sessionmakers:
+            async with sessionmaker() as db:
+                written += await rebuild_counts(db, owner_id)
+    finally:
+        await database.dispose()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--owner", type=int, help="only rebuild the counters of this user id")
+    arguments = parser.parse_args()
+    print(f"wrote {asyncio.run(rebuild(arguments.owner))} todo counter rows")
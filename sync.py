@@ -0,0 +1,133 @@
+"""
+Incremental sync: the todos changed and deleted since a sync token, read
+through the (owner_id, updated_at, id) and (owner_id, deleted_at, id)
+indexes, so the work is proportional to the number of changes and not to
+the size of the list.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from TodoApp.models import SYNC_COLUMNS, TodoTombstones, Todos, utcnow
+from TodoApp.pagination import decode_cursor, encode_cursor, keyset_filter
+
+logger = logging.getLogger(__name__)
+
+# Tokens stop short of changes this recent: a transaction that set updated_at
+# just before the token was issued may commit just after it
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+# Deletions are remembered this long; clients with an older token must resync from scratch
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "30"))
+# How often expired tombstones are deleted
+SYNC_PRUNE_INTERVAL = float(os.getenv("SYNC_PRUNE_INTERVAL", "3600"))
+
+TOKEN_SORT = "sync"
+# Keyset position before every row
+START = (datetime.min, 0)
+
+Position = Tuple[datetime, int]
+
+
+def encode_token(todos: Position, tombstones: Position) -> str:
+    return encode_cursor(TOKEN_SORT, [todos[0].isoformat(), todos[1], tombstones[0].isoformat(), tombstones[1]])
+
+
+def decode_token(token: str) -> Tuple[Position, Position]:
+    values = decode_cursor(token, TOKEN_SORT, (str, int, str, int))
+    try:
+        return ((datetime.fromisoformat(values[0]), int(values[1])),
+                (datetime.fromisoformat(values[2]), int(values[3])))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+
+
+def format_timestamp(value: datetime) -> str:
+    return value.replace(tzinfo=timezone.utc).isoformat()
+
+
+async def _read_after(db: AsyncSession, query, columns, position: Position, limit: int, cutoff: datetime):
+    """
+    Rows past the keyset position, at most limit of them, plus the position
+    the next sync starts from. Without more rows to fetch the position moves
+    up to the settle cutoff, so rows newer than it are sent again next time.
+    """
+    result = await db.execute(query.where(keyset_filter(columns, position))
+                              .order_by(*columns).limit(limit + 1))
+    rows = result.all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, tuple(getattr(rows[-1], column.key) for column in columns), True
+    return rows, max(position, (cutoff, 0)), False
+
+
+async def changes_since(db: AsyncSession, owner_id: int, token: Optional[str], limit: int) -> dict:
+    """
+    Todos created or updated, and ids deleted, since the token. Without a
+    token every todo is returned and deletions start from now. Clients apply
+    "deleted" before "changes" and repeat while "has_more" is true.
+    """
+    now = utcnow()
+    cutoff = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    if token:
+        todo_position, tombstone_position = decode_token(token)
+        if tombstone_position[0] < now - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS):
+            raise HTTPException(status_code=status.HTTP_410_GONE,
+                                detail="Sync token expired, fetch the full list and sync from scratch")
+    else:
+        todo_position, tombstone_position = START, (cutoff, 0)
+
+    todos, todo_position, more_todos = await _read_after(
+        db, select(*SYNC_COLUMNS).where(Todos.owner_id == owner_id),
+        (Todos.updated_at, Todos.id), todo_position, limit, cutoff)
+    tombstones, tombstone_position, more_tombstones = await _read_after(
+        db, select(TodoTombstones.id, TodoTombstones.todo_id, TodoTombstones.deleted_at)
+        .where(TodoTombstones.owner_id == owner_id),
+        (TodoTombstones.deleted_at, TodoTombstones.id), tombstone_position, limit, cutoff)
+
+    changes = [{**row._asdict(), "updated_at": format_timestamp(row.updated_at)} for row in todos]
+    return {
+        "changes": changes,
+        "deleted": [{"id": row.todo_id, "deleted_at": format_timestamp(row.deleted_at)} for row in tombstones],
+        "next": encode_token(todo_position, tombstone_position),
+        "has_more": more_todos or more_tombstones,
+    }
+
+
+async def record_deletions(db: AsyncSession, todos: Iterable[Tuple[int, int]]):
+    """
+    Write tombstones for (todo id, owner id) pairs, in the caller's
+    transaction so they commit together with the deletes.
+    """
+    rows = [{"todo_id": todo_id, "owner_id": owner_id} for todo_id, owner_id in todos]
+    if rows:
+        await db.execute(insert(TodoTombstones), rows)
+
+
+async def prune_tombstones(db: AsyncSession, retention_days: int = SYNC_TOMBSTONE_RETENTION_DAYS) -> int:
+    """
+    Delete tombstones past the retention period. Returns how many were deleted.
+    """
+    result = await db.execute(delete(TodoTombstones).where(
+        TodoTombstones.deleted_at < utcnow() - timedelta(days=retention_days)))
+    await db.commit()
+    return result.rowcount
+
+
+async def run_tombstone_pruning(sessionmaker, interval: float = SYNC_PRUNE_INTERVAL):
+    while True:
+        # Sleep first: startup should not wait on, or fail because of, a prune
+        await asyncio.sleep(interval)
+        try:
+            async with sessionmaker() as db:
+                pruned = await prune_tombstones(db)
+            if pruned:
+                logger.info("Pruned %d expired todo tombstones", pruned)
+        except Exception:
+            logger.exception("Pruning todo tombstones failed")
@@ -0,0 +1,88 @@
+import functools
+import os
+from typing import Iterable, Iterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from TodoApp.assets import pipeline
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# Compiled template bytecode survives restarts here (defaults to the system temp dir)
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR") or None
+# Re-check template files for changes on every render; only useful while editing them
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+# Rendered output is flushed to the client in chunks of about this many characters
+STREAM_CHUNK_SIZE = 8192
+
+
+@functools.lru_cache(maxsize=None)
+def get_templates():
+    """
+    The single template environment shared by every router, built on first
+    use so importing the app does not pay for Jinja.
+    """
+    import jinja2
+    from fastapi.templating import Jinja2Templates
+
+    @jinja2.pass_context
+    def asset_url(context, path: str):
+        """
+        URL of the fingerprinted copy of a static asset, e.g.
+        {{ asset_url('css/base.css') }} -> /static/css/base.<hash>.css
+        """
+        return context["request"].url_for("static", path=pipeline.url_path(path))
+
+    templates = Jinja2Templates(env=jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+        cache_size=-1,  # never evict compiled templates
+    ))
+    templates.env.globals["asset_url"] = asset_url
+    return templates
+
+
+def __getattr__(name: str):
+    # Lazy module attribute, kept for code that imports it by name
+    if name == "templates":
+        return get_templates()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def precompile_templates() -> int:
+    """
+    Compile every template up front so no request pays for it. Returns the
+    number of templates loaded.
+    """
+    templates = get_templates()
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.get_template(name)
+    return len(names)
+
+
+def _chunked(parts: Iterable[str], size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+    # Jinja yields many tiny strings; group them so each send is worth a thread hop
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_template(request: Request, name: str, context: dict, status_code: int = 200) -> StreamingResponse:
+    """
+    Render a template incrementally with Jinja's generate(), so the first
+    bytes leave before the whole page is rendered.
+    """
+    template = get_templates().get_template(name)
+    return StreamingResponse(_chunked(template.generate({"request": request, **context})),
+                             status_code=status_code, media_type="text/html; charset=utf-8")
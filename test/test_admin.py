@@ -1,3 +1,5 @@
+import json
+
 from TodoApp.test.utils import *
 from TodoApp.routers.admin import get_current_user, get_db
 from TodoApp.models import Todos
@@ -13,6 +15,36 @@ def test_get_all_todos(test_todo):
     assert isinstance(response.json(), list)  # Assuming the response is a list of todos
     assert len(response.json()) > 0  # Assuming there is at least one todo in the test database
 
+def test_get_all_todos_paginated(test_todo):
+    db = TestingSessionLocal()
+    db.add_all([Todos(title=f"Todo {i}", description="Paged todo", priority=1, complete=False, owner_id=i)
+                for i in range(2, 5)])
+    db.commit()
+
+    response = client.get("/admin/todos", params={"limit": 3})
+    assert [todo['id'] for todo in response.json()] == [1, 2, 3]
+    response = client.get("/admin/todos", params={"limit": 3, "cursor": response.headers["X-Next-Cursor"]})
+    assert [todo['id'] for todo in response.json()] == [4]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_export_todos_ndjson(test_todo):
+    response = client.get("/admin/todos/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == [{'id': 1, 'title': 'Test Todo', 'description': 'This is a test todo item',
+                                                    'priority': 1, 'complete': False, 'owner_id': 1}]
+
+
+def test_export_todos_csv(test_todo):
+    response = client.get("/admin/todos/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == ["id,title,description,priority,complete,owner_id",
+                                          "1,Test Todo,This is a test todo item,1,False,1"]
+
+
 def test_delete_todo(test_todo):
     response = client.delete("/admin/todo/1")
     assert response.status_code == status.HTTP_204_NO_CONTENT
@@ -22,6 +54,16 @@ def test_delete_todo(test_todo):
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json() == {"detail": "Todo id:1 not found for user 1"}  # Adjust based on your error handling
 
+def test_delete_todo_gone_after_lookup(monkeypatch):
+    # Another request deletes the todo between finding its owner and deleting it
+    async def found_on_a_shard(db, work):
+        return [[1]]
+
+    monkeypatch.setattr("TodoApp.routers.admin.scatter", found_on_a_shard)
+    response = client.delete("/admin/todo/999")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": "Todo not found"}
+
 def test_delete_todo_not_found():
     response = client.delete("/admin/todo/999")  # Assuming 999 does not exist
     assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,95 @@
+import asyncio
+from datetime import timedelta
+
+from fastapi import status
+from sqlalchemy import select
+
+from TodoApp.archive import archive_todos
+from TodoApp.database import get_db
+from TodoApp.models import TodoTombstones, Todos, TodosArchive, utcnow
+from TodoApp.routers.todos import get_current_user
+from TodoApp.stats import rebuild_counts
+from TodoApp.test.utils import *
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def add_todos(test_todo):
+    # Completed 40 days ago, completed yesterday and still open 40 days on
+    old = utcnow() - timedelta(days=40)
+    db = TestingSessionLocal()
+    db.add_all([Todos(title=f"Done {number}", description="Completed long ago", priority=number, complete=True,
+                      owner_id=1, updated_at=old) for number in range(2, 5)])
+    db.add(Todos(title="Done lately", description="Completed yesterday", priority=5, complete=True, owner_id=1,
+                 updated_at=utcnow() - timedelta(days=1)))
+    db.add(Todos(title="Open", description="Still to do", priority=6, complete=False, owner_id=1, updated_at=old))
+    db.commit()
+    db.close()
+
+
+def archive(**kwargs):
+    return asyncio.run(archive_todos(TestingAsyncSessionLocal, **kwargs))
+
+
+def test_archive_moves_old_completed_todos_in_batches(test_todo):
+    add_todos(test_todo)
+
+    async def count():
+        async with TestingAsyncSessionLocal() as db:
+            await rebuild_counts(db)
+
+    asyncio.run(count())
+    assert archive(after_days=30, batch_size=2, pause=0) == 3
+    assert archive(after_days=30, batch_size=2, pause=0) == 0
+    # The counters follow the todos out of todosapp
+    assert client.get("/todos/stats").json()["completed"] == 1
+    with TestingSessionLocal() as db:
+        assert db.scalars(select(Todos.title).order_by(Todos.id)).all() == ["Test Todo", "Done lately", "Open"]
+        archived = db.scalars(select(TodosArchive).order_by(TodosArchive.id)).all()
+        assert [(todo.id, todo.title, todo.version) for todo in archived] == [
+            (2, "Done 2", 1), (3, "Done 3", 1), (4, "Done 4", 1)]
+        # Syncing clients drop them like deleted todos
+        assert db.scalars(select(TodoTombstones.todo_id).order_by(TodoTombstones.todo_id)).all() == [2, 3, 4]
+
+
+def test_main_endpoints_read_hot_data_unless_archived_requested(test_todo):
+    add_todos(test_todo)
+    assert len(client.get("/todos/").json()) == 6  # cached before archiving
+    archive(after_days=30, pause=0)
+
+    assert [todo["id"] for todo in client.get("/todos/").json()] == [1, 5, 6]
+    response = client.get("/todos/", params={"include_archived": True, "limit": 4})
+    assert [todo["id"] for todo in response.json()] == [1, 2, 3, 4]
+    response = client.get("/todos/", params={"include_archived": True, "limit": 4,
+                                             "cursor": response.headers["X-Next-Cursor"]})
+    assert [todo["id"] for todo in response.json()] == [5, 6]
+    response = client.get("/todos/", params={"include_archived": True, "complete": True, "sort": "-priority"})
+    assert [todo["priority"] for todo in response.json()] == [5, 4, 3, 2]
+
+    assert client.get("/todos/3").status_code == status.HTTP_404_NOT_FOUND
+    response = client.get("/todos/3", params={"include_archived": True})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "Done 3"
+
+
+def test_archived_ids_are_not_handed_out_again(test_todo):
+    add_todos(test_todo)
+    with TestingSessionLocal() as db:
+        # The newest todo becomes archivable too
+        newest = db.get(Todos, 6)
+        newest.complete, newest.updated_at = True, utcnow() - timedelta(days=40)
+        db.commit()
+    assert archive(after_days=30, pause=0) == 4
+
+    response = client.post("/todos/", json={"title": "Fresh", "description": "Created after archiving"})
+    assert response.status_code == status.HTTP_201_CREATED
+    with TestingSessionLocal() as db:
+        fresh = db.scalars(select(Todos).where(Todos.title == "Fresh")).one()
+        assert fresh.id == 7
+        # Archiving it later does not collide with the archived todo 6
+        fresh.complete, fresh.updated_at = True, utcnow() - timedelta(days=40)
+        db.commit()
+    assert archive(after_days=30, pause=0) == 1
+    assert client.get("/todos/6", params={"include_archived": True}).json()["title"] == "Open"
+    assert client.get("/todos/7", params={"include_archived": True}).json()["title"] == "Fresh"
@@ -0,0 +1,72 @@
+import gzip
+import os
+
+from TodoApp.assets import STATIC_DIR, minify_css, minify_js, pipeline
+from TodoApp.test.utils import *
+
+
+def test_minify_css():
+    source = '/*! keep */\n/* drop */\na > b ,\n  c {\n  content: "x ,  y";\n  color: red;\n}\n'
+    assert minify_css(source) == '/*! keep */\na>b,c{content: "x ,  y";color: red}'
+
+
+def test_minify_js():
+    assert minify_js("  var a = 1;\n\n  // comment\n  return a;\n//# sourceMappingURL=a.js.map\n") == \
+        "var a = 1;\nreturn a;\n"
+    assert minify_js("/*! keep */\nf(a,   /* drop */ b)  ;\n") == "/*! keep */\nf(a, b) ;\n"
+    # Literals are copied as written, whitespace and comment markers included
+    source = "var a = `\n  x ${ {b: '//'}.b } // y`;\nvar c = 'one \\\n    two // three';\nvar d = /\\/\\/[/]  /g;\n"
+    assert minify_js(source) == source
+    # A "/" after a value divides; after an operator it starts a regular expression
+    assert minify_js("x = a++ / 2 / (b) / c;  // comment\ny = x * /re/.exec(s);\n") == \
+        "x = a++ / 2 / (b) / c;\ny = x * /re/.exec(s);\n"
+
+
+def test_shipped_scripts_are_minified():
+    for path in ("js/bootstrap.js", "js/jquery-slim.js", "js/base.js"):
+        with open(os.path.join(STATIC_DIR, path), "rb") as f:
+            source = f.read()
+        minified = pipeline.lookup(pipeline.url_path(path)).variants["identity"]
+        assert len(minified) < len(source) * 0.8
+    popper = pipeline.lookup(pipeline.url_path("js/popper.js")).variants["identity"]
+    assert b"sourceMappingURL" not in popper
+
+
+def test_serve_fingerprinted_asset():
+    hashed_path = pipeline.url_path("css/bootstrap.css")
+    assert hashed_path != "css/bootstrap.css"
+
+    response = client.get(f"/static/{hashed_path}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["content-type"] == "text/css; charset=utf-8"
+    asset = pipeline.lookup(hashed_path)
+    assert int(response.headers["content-length"]) == len(asset.variants["gzip"])
+    assert gzip.decompress(asset.variants["gzip"]) == asset.variants["identity"]
+
+    etag = response.headers["etag"]
+    response = client.get(f"/static/{hashed_path}", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Clients without gzip get the identity variant under a different validator
+    response = client.get(f"/static/{hashed_path}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] != etag
+    assert response.content == asset.variants["identity"]
+
+
+def test_serve_plain_asset_path():
+    response = client.get("/static/js/base.js", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, no-cache"
+    assert client.get("/static/js/missing.js").status_code == 404
+    assert client.post("/static/js/base.js").status_code == 405
+
+
+def test_templates_link_fingerprinted_assets():
+    response = client.get("/auth/login-page")
+    assert f"/static/{pipeline.url_path('css/bootstrap.css')}" in response.text
+    assert "/static/css/bootstrap.css" not in response.text
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from TodoApp.audit import AUDIT_FLUSH_LATENCY, AuditWriter, audit_log
+from TodoApp.database import get_db
+from TodoApp.models import AuditLog
+from TodoApp.routers.todos import get_current_user
+from TodoApp.test.utils import *
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def audit_rows():
+    db = TestingSessionLocal()
+    try:
+        return [(row.entity, row.entity_id, row.action, row.actor_id) for row in
+                db.execute(select(AuditLog).order_by(AuditLog.id)).scalars()]
+    finally:
+        db.close()
+
+
+def test_writes_are_queued_not_written(test_todo):
+    client.put("/todos/1", json={"title": "Audited", "description": "Queued for the audit log", "priority": 2})
+    client.delete("/todos/1")
+    assert [(record["entity"], record["entity_id"], record["action"], record["actor_id"])
+            for record in audit_log.pending] == [("todo", 1, "update", 1), ("todo", 1, "delete", 1)]
+    assert audit_log.pending[0]["details"]["title"] == "Audited"
+    assert audit_rows() == []
+
+
+def test_flush_in_batches(test_todo):
+    async def scenario():
+        writer = AuditWriter(lambda: async_engine, batch_size=2)
+        for todo_id in range(5):
+            writer.record("todo", todo_id, "update", 1, title=f"Todo {todo_id}")
+        flushes = AUDIT_FLUSH_LATENCY.count()
+        assert await writer.flush() == 5
+        assert AUDIT_FLUSH_LATENCY.count() == flushes + 3
+        assert not writer.pending
+
+    try:
+        asyncio.run(scenario())
+        assert audit_rows() == [("todo", todo_id, "update", 1) for todo_id in range(5)]
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM audit_log;"))
+            connection.commit()
+
+
+def test_failed_flush_keeps_records_and_close_drops_them():
+    def broken_engine():
+        raise ConnectionError("database unavailable")
+
+    async def scenario():
+        writer = AuditWriter(broken_engine, batch_size=2, queue_limit=3)
+        for todo_id in range(4):
+            writer.record("todo", todo_id, "delete", 1)
+        assert len(writer.pending) == 3  # over the limit: dropped
+        try:
+            await writer.flush()
+        except ConnectionError:
+            pass
+        assert [record["entity_id"] for record in writer.pending] == [0, 1, 2]
+        await writer.close()
+        assert not writer.pending
+
+    asyncio.run(scenario())
+
+
+def test_run_flushes_when_a_batch_is_full(test_todo):
+    async def scenario():
+        writer = AuditWriter(lambda: async_engine, batch_size=2, flush_interval=60)
+        task = asyncio.create_task(writer.run())
+        await asyncio.sleep(0)
+        writer.record("user", 1, "update-password", 1)
+        writer.record("user", 1, "update-phone-number", 1)
+        for _ in range(100):
+            if not writer.pending:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return writer
+
+    try:
+        assert not asyncio.run(scenario()).pending
+        assert [row[2] for row in audit_rows()] == ["update-password", "update-phone-number"]
+    finally:
+        with engine.connect() as connection:
+            connection.execute(text("DELETE FROM audit_log;"))
+            connection.commit()
+
+
+def test_run_backs_off_after_a_failed_flush():
+    attempts = []
+
+    def broken_engine():
+        attempts.append(time.monotonic())
+        raise ConnectionError("database unavailable")
+
+    async def scenario():
+        writer = AuditWriter(broken_engine, batch_size=2, flush_interval=0.2)
+        start = time.monotonic()
+        task = asyncio.create_task(writer.run())
+        await asyncio.sleep(0)
+        # Every record beyond the first batch used to wake the writer into another attempt
+        for todo_id in range(50):
+            writer.record("todo", todo_id, "delete", 1)
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return writer, time.monotonic() - start
+
+    writer, elapsed = asyncio.run(scenario())
+    assert len(writer.pending) == 50
+    # At most one attempt per interval
+    assert 1 <= len(attempts) <= elapsed / 0.2 + 1
@@ -11,16 +11,17 @@ from datetime import timedelta
 app.dependency_overrides[get_db]  = override_get_db
 
 
-def test_authenticate_user(test_user):
-    db = TestingSessionLocal()
-    authenticated_user = authenticate_user(test_user.username, "testpassword", db)
-    assert authenticated_user is not None
-    assert authenticated_user.username == test_user.username
-    non_existent_user = authenticate_user("nonexistent", "wrongpassword", db)
-    assert non_existent_user is False
+@pytest.mark.asyncio
+async def test_authenticate_user(test_user):
+    async with TestingAsyncSessionLocal() as db:
+        authenticated_user = await authenticate_user(test_user.username, "testpassword", db)
+        assert authenticated_user is not None
+        assert authenticated_user.username == test_user.username
+        non_existent_user = await authenticate_user("nonexistent", "wrongpassword", db)
+        assert non_existent_user is False
 
-    wrong_password_user = authenticate_user(test_user.username, "wrongpassword", db)
-    assert wrong_password_user is False
+        wrong_password_user = await authenticate_user(test_user.username, "wrongpassword", db)
+        assert wrong_password_user is False
 
 
 
@@ -35,9 +36,10 @@ def test_authenticate_user(test_user):
     # assert response.status_code == status.HTTP_401_UNAUTHORIZED
     # assert response.json() == {"detail": "Invalid credentials"}
 
-def test_create_access_token(test_user):
-    db = TestingSessionLocal()
-    user = authenticate_user(test_user.username, "testpassword", db)
+@pytest.mark.asyncio
+async def test_create_access_token(test_user):
+    async with TestingAsyncSessionLocal() as db:
+        user = await authenticate_user(test_user.username, "testpassword", db)
     assert user is not False
 
     # Assuming create_access_token is a function that generates a JWT token
@@ -59,4 +61,133 @@ async def test_get_current_user(test_user):
     user = await get_current_user(jwt_token)
     assert user["username"] == test_user.username
     assert user["id"] == test_user.id
-    assert user["role"] == test_user.role
\ No newline at end of file
+    assert user["role"] == test_user.role
+
+@pytest.mark.asyncio
+async def test_authenticate_user_upgrades_weak_hash(test_user):
+    from passlib.hash import bcrypt
+    from TodoApp.models import Users
+
+    db = TestingSessionLocal()
+    db.query(Users).filter(Users.id == test_user.id).update({"hashed_password": bcrypt.using(rounds=4).hash("testpassword")})
+    db.commit()
+
+    async with TestingAsyncSessionLocal() as session:
+        user = await authenticate_user(test_user.username, "testpassword", session)
+        assert user is not False
+        assert bcrypt_context.needs_update(user.hashed_password) is False
+        assert bcrypt_context.verify("testpassword", user.hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_full():
+    import asyncio
+    from TodoApp.security import PasswordHasher
+
+    hasher = PasswordHasher(bcrypt_context, workers=1, queue_limit=0)
+    results = await asyncio.gather(hasher.hash("one"), hasher.hash("two"), return_exceptions=True)
+    assert isinstance(results[0], str)
+    assert isinstance(results[1], HTTPException)
+    assert results[1].status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert hasher.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_is_cached(test_user):
+    from TodoApp.security import token_cache
+
+    token_cache.clear()
+    jwt_token = create_access_token(test_user.username, test_user.id, test_user.role, timedelta(minutes=30))
+    hits = token_cache.hits
+
+    first = await get_current_user(jwt_token)
+    second = await get_current_user(jwt_token)
+    assert first == second
+    assert token_cache.hits == hits + 1
+
+    token_cache.invalidate_user(test_user.id)
+    assert token_cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_rejects_invalid_token():
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user("not-a-token")
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_token_cache_bounds_and_expiry():
+    import time
+    from TodoApp.security import TokenCache
+
+    cache = TokenCache(max_size=2)
+    future = time.time() + 60
+    cache.set("a", {"id": 1, "exp": future})
+    cache.set("b", {"id": 2, "exp": future})
+    cache.get("a")  # "a" becomes most recently used
+    cache.set("c", {"id": 3, "exp": future})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.evictions == 1
+
+    cache.set("d", {"id": 4, "exp": time.time() - 1})
+    assert cache.get("d") is None
+    assert cache.expirations == 1
+
+
+def test_refresh_token_rotation():
+    response = client.post("/auth/get-token", data={"username": "testuser", "password": "testpassword"})
+    assert response.status_code == status.HTTP_200_OK
+    first = response.json()
+    assert first["refresh_token"]
+
+    response = client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+    assert response.status_code == status.HTTP_200_OK
+    second = response.json()
+    assert second["refresh_token"] != first["refresh_token"]
+    payload = jwt.decode(second["access_token"], get_secret_key(), algorithms=[ALGORITHM])
+    assert payload["sub"] == "testuser"
+
+    # Reusing a rotated-out token revokes the whole session
+    response = client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/auth/refresh", json={"refresh_token": second["refresh_token"]})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_refresh_token_logout_and_password_change(test_user):
+    from TodoApp.models import Users
+    from TodoApp.routers.auth import create_refresh_token
+
+    token = create_refresh_token(test_user)
+    assert client.post("/auth/logout", json={"refresh_token": token}).status_code == status.HTTP_204_NO_CONTENT
+    assert client.post("/auth/refresh", json={"refresh_token": token}).status_code == status.HTTP_401_UNAUTHORIZED
+
+    token = create_refresh_token(test_user)
+    db = TestingSessionLocal()
+    db.query(Users).filter(Users.id == test_user.id).update({"hashed_password": bcrypt_context.hash("changed")})
+    db.commit()
+    assert client.post("/auth/refresh", json={"refresh_token": token}).status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_is_not_an_access_token(test_user):
+    from TodoApp.routers.auth import create_refresh_token
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(create_refresh_token(test_user))
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_memory_revocation_store_expiry():
+    import time
+    from TodoApp.security import MemoryRevocationStore
+
+    store = MemoryRevocationStore()
+    assert await store.revoke("a", time.time() + 60) is True
+    assert await store.revoke("a", time.time() + 60) is False
+    assert await store.is_revoked("a")
+    assert await store.revoke("b", time.time() - 1) is True
+    assert not await store.is_revoked("b")
+    assert len(store) == 1
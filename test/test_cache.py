@@ -0,0 +1,68 @@
+import asyncio
+
+from TodoApp.cache import LRUCacheBackend, RedisCacheBackend, ResponseCache, etag_matches
+
+
+class FakeRedis:
+    """Local stand-in for the subset of the redis.asyncio client used by RedisCacheBackend."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+def test_response_cache_invalidation():
+    async def scenario(backend):
+        cache = ResponseCache(backend, ttl=60)
+        key = await cache.key(1, "list")
+        assert await cache.get(key) is None
+        stored = await cache.set(key, b'[{"id": 1}]', next_cursor="abc")
+
+        cached = await cache.get(await cache.key(1, "list"))
+        assert cached == stored
+        assert cached.next_cursor == "abc"
+
+        await cache.invalidate(1)
+        assert await cache.get(await cache.key(1, "list")) is None
+        # Other owners keep their entries
+        await cache.set(await cache.key(2, "list"), b"[]")
+        await cache.invalidate(1)
+        assert await cache.get(await cache.key(2, "list")) is not None
+        return cache.stats()
+
+    stats = asyncio.run(scenario(LRUCacheBackend(max_size=10)))
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["invalidations"] == 2
+    asyncio.run(scenario(RedisCacheBackend(FakeRedis())))
+
+
+def test_lru_backend_eviction():
+    async def scenario():
+        backend = LRUCacheBackend(max_size=2)
+        await backend.set("a", b"1", ttl=60)
+        await backend.set("b", b"2", ttl=60)
+        await backend.get("a")
+        await backend.set("c", b"3", ttl=60)
+        assert await backend.get("b") is None
+        assert await backend.get("a") == b"1"
+        await backend.set("d", b"4", ttl=-1)
+        assert await backend.get("d") is None
+        return backend.evictions
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
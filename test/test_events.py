@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from fastapi import status
+
+from TodoApp.events import EventHub, MemoryEventBroker, format_event, hub, stream_events
+from TodoApp.database import get_db
+from TodoApp.routers.todos import get_current_user, get_stream_user
+from TodoApp.test.utils import *
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def parse(data: bytes):
+    event, payload = data.decode().strip().split("\n")
+    return event.removeprefix("event: "), json.loads(payload.removeprefix("data: "))
+
+
+def test_hub_fans_out_per_owner_and_drops_slow_consumers():
+    async def scenario():
+        events = EventHub(MemoryEventBroker(), queue_size=2, max_per_owner=2)
+        first, second, other = events.subscribe(1), events.subscribe(1), events.subscribe(2)
+        assert events.subscribe(1) is None  # per owner limit
+
+        await events.publish("created", 1, {"id": 7})
+        assert parse(first.queue.get_nowait()) == ("created", {"id": 7})
+        assert parse(second.queue.get_nowait()) == ("created", {"id": 7})
+        assert other.queue.empty()
+
+        # first keeps reading, second falls behind and is dropped with its backlog
+        for todo_id in range(3):
+            await events.publish("updated", 1, {"id": todo_id})
+            first.queue.get_nowait()
+        assert second.dropped and second.queue.get_nowait() is None
+        assert not first.dropped and len(events) == 2 and events.dropped == 1
+
+    asyncio.run(scenario())
+
+
+def test_stream_events_heartbeat_and_end_on_drop():
+    async def scenario():
+        events = EventHub(MemoryEventBroker(), queue_size=1)
+        subscription = events.subscribe(1)
+        stream = stream_events(subscription, events, heartbeat=0.01)
+        assert await stream.__anext__() == b"retry: 3000\n\n"
+        assert await stream.__anext__() == b": keep-alive\n\n"
+        await events.publish("deleted", 1, {"id": 3})
+        assert parse(await stream.__anext__()) == ("deleted", {"id": 3})
+        await events.publish("deleted", 1, {"id": 4})
+        await events.publish("deleted", 1, {"id": 5})  # queue full: dropped
+        assert parse(await stream.__anext__())[0] == "dropped"
+        assert [data async for data in stream] == []
+        assert len(events) == 0
+
+    asyncio.run(scenario())
+
+
+def test_writes_publish_events(test_todo):
+    subscription = hub.subscribe(1)
+    try:
+        client.put("/todos/1", json={"title": "Live", "description": "Streamed change", "priority": 2})
+        client.delete("/todos/1")
+        client.post("/todos/batch", json={"operations": [
+            {"op": "create", "todo": {"title": "Batched", "description": "Streamed create"}}]})
+        received = []
+        while not subscription.queue.empty():
+            received.append(parse(subscription.queue.get_nowait()))
+    finally:
+        hub.unsubscribe(subscription)
+    assert [(event, todo.get("title")) for event, todo in received] == [
+        ("updated", "Live"), ("deleted", None), ("created", "Batched")]
+    assert received[0][1]["version"] == 2
+
+
+def test_stream_requires_authentication():
+    response = client.get("/todos/stream")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_stream_limits_open_streams():
+    app.dependency_overrides[get_stream_user] = override_get_current_user
+    subscriptions = [hub.subscribe(1) for _ in range(hub.max_per_owner)]
+    try:
+        response = client.get("/todos/stream")
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    finally:
+        del app.dependency_overrides[get_stream_user]
+        for subscription in subscriptions:
+            hub.unsubscribe(subscription)
+
+
+def test_format_event():
+    assert format_event("created", {"id": 1}) == b'event: created\ndata: {"id":1}\n\n'
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from TodoApp.database import ReplicaPool
+from TodoApp.health import LoopLagMonitor, ReadinessCheck, pool_status
+from TodoApp.main import app
+
+
+def fake_database(engine):
+    return SimpleNamespace(engine=engine, replicas=ReplicaPool([]), shards=None)
+
+
+def test_readiness_checks_database_and_caches_result(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ready.db'}")
+        try:
+            readiness = ReadinessCheck(fake_database(engine), LoopLagMonitor(), cache_seconds=60)
+            ready, report = await readiness.check()
+            assert ready
+            assert report["status"] == "ready"
+            assert report["checks"]["database"]["ok"]
+            assert report["checks"]["pool"]["ok"]
+            assert "Pool size" in report["checks"]["pool"]["status"]
+            # Served from the cache: the very same result, no second ping
+            assert await readiness.check() is await readiness.check()
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_readiness_fails_when_database_is_unreachable(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'ready.db'}")
+        try:
+            ready, report = await ReadinessCheck(fake_database(engine), LoopLagMonitor()).check()
+            assert not ready
+            assert report["status"] == "unavailable"
+            assert report["checks"]["database"] == {"ok": False, "error": "OperationalError",
+                                                    "latency_ms": report["checks"]["database"]["latency_ms"]}
+        finally:
+            await engine.dispose()
+            # Let aiosqlite's worker thread report the failed connect before the loop closes
+            await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+
+
+def test_readiness_fails_when_pool_is_exhausted(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ready.db'}", poolclass=AsyncAdaptedQueuePool,
+                                     pool_size=1, max_overflow=0, pool_timeout=5)
+        try:
+            async with engine.connect():
+                assert pool_status(engine)["usage"] == 1.0
+                ready, report = await ReadinessCheck(fake_database(engine), LoopLagMonitor(), db_timeout=0.1).check()
+            assert not ready
+            assert not report["checks"]["pool"]["ok"]
+            # The ping waited for a connection and gave up at the timeout
+            assert report["checks"]["database"]["error"].startswith("no answer")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_loop_lag_monitor_and_readiness():
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.01)
+        task = asyncio.create_task(monitor.run())
+        await asyncio.sleep(0)
+        time.sleep(0.1)  # block the loop
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    assert monitor.max_lag >= 0.05
+    engine = create_async_engine("sqlite+aiosqlite://")
+    readiness = ReadinessCheck(fake_database(engine), monitor, max_loop_lag=0.01)
+    monitor.record(0.2)
+
+    async def check():
+        try:
+            return await readiness.check()
+        finally:
+            await engine.dispose()
+
+    ready, report = asyncio.run(check())
+    assert not ready
+    assert report["checks"]["event_loop"]["lag_ms"] == 200.0
+
+
+def test_ready_endpoint_reports_checks():
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["cache-control"] == "no-store"
+        assert set(response.json()["checks"]) >= {"database", "pool", "event_loop"}
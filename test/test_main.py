@@ -11,3 +11,71 @@ def test_return_health_check():
     assert response.json() == {'status': 'healthy'}
 
 
+def test_ready_only_after_startup():
+    # The module client never runs the lifespan, so startup has not happened
+    response = client.get("/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json() == {'status': 'starting'}
+
+    with TestClient(app) as started:
+        response = started.get("/ready")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['status'] == 'ready'
+    assert client.get("/ready").status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def test_metrics_endpoint():
+    client.get("/healthy")
+    client.get("/todos/12345")  # unauthenticated, but still labelled by its route template
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert '# TYPE http_requests_total counter' in body
+    assert 'http_requests_total{method="GET",route="/healthy",status="200"}' in body
+    assert 'route="/todos/{todo_id}"' in body
+    assert 'route="/todos/12345"' not in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/healthy",le="+Inf"}' in body
+    assert 'http_requests_in_progress' in body
+
+
+def test_metrics_count_queries_per_request():
+    from TodoApp import metrics
+    from TodoApp.test.utils import async_engine, override_get_db, override_get_current_user
+    from TodoApp.database import get_db
+    from TodoApp.routers.auth import get_current_user
+
+    metrics.instrument_engine(async_engine, "test")
+    overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    try:
+        requests = metrics.DB_QUERIES_PER_REQUEST.count("/todos/search")
+        queries = metrics.DB_QUERIES_PER_REQUEST.sum("/todos/search")
+        client.get("/todos/search", params={"q": "anything"})
+        assert metrics.DB_QUERIES_PER_REQUEST.count("/todos/search") == requests + 1
+        # The search is a single statement
+        assert metrics.DB_QUERIES_PER_REQUEST.sum("/todos/search") == queries + 1
+        assert metrics.DB_QUERY_TIME_PER_REQUEST.count("/todos/search") == requests + 1
+        body = client.get("/metrics").text
+        assert 'db_pool_connections{engine="test",state="checked_out"}' in body
+        assert 'db_pool_connection_hold_seconds_count' in body
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
+
+def test_histogram_render():
+    from TodoApp.metrics import Histogram
+
+    histogram = Histogram("test_seconds", "Test histogram", ("op",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "a")
+    histogram.observe(0.5, "a")
+    histogram.observe(5, "a")
+    assert histogram.render() == [
+        'test_seconds_bucket{op="a",le="0.1"} 1',
+        'test_seconds_bucket{op="a",le="1.0"} 2',
+        'test_seconds_bucket{op="a",le="+Inf"} 3',
+        'test_seconds_sum{op="a"} 5.55',
+        'test_seconds_count{op="a"} 3',
+    ]
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from starlette.datastructures import Headers
+
+from TodoApp.ratelimit import MemoryRateLimitBackend, RateLimit, RateLimiter, parse_rules, rate_limiter
+from TodoApp.database import get_db
+from TodoApp.security import client_address, parse_networks
+from TodoApp.test.utils import *
+
+app.dependency_overrides[get_db] = override_get_db
+
+
+def test_parse_rules():
+    assert parse_rules("/=20/second:40, /auth/=10/minute,/static/=off") == {
+        "/": RateLimit(20.0, 40), "/auth/": RateLimit(10 / 60, 10), "/static/": None}
+    with pytest.raises(ValueError):
+        parse_rules("/=5/day")
+
+
+def test_longest_prefix_wins():
+    limiter = RateLimiter(MemoryRateLimitBackend(), parse_rules("/=20/second,/auth/=10/minute,/auth/login-page=off"))
+    assert limiter.match("/todos/") == ("/", RateLimit(20.0, 20))
+    assert limiter.match("/auth/get-token") == ("/auth/", RateLimit(10 / 60, 10))
+    assert limiter.match("/auth/login-page") == ("/auth/login-page", None)
+
+
+def test_token_bucket_refill_and_idle_eviction():
+    async def scenario():
+        backend = MemoryRateLimitBackend(max_keys=2)
+        limit = RateLimit(rate=100.0, burst=2)
+        assert await backend.take("a", limit) == 0
+        assert await backend.take("a", limit) == 0
+        wait = await backend.take("a", limit)
+        assert 0 < wait <= 0.01
+        await asyncio.sleep(wait)
+        assert await backend.take("a", limit) == 0
+
+        # A bucket that has refilled is dropped, and the key count stays bounded
+        await asyncio.sleep(0.05)
+        await backend.take("b", limit)
+        assert len(backend) == 1
+        await backend.take("c", limit)
+        await backend.take("d", limit)
+        assert len(backend) == 2
+
+    asyncio.run(scenario())
+
+
+def test_auth_routes_return_429_with_retry_after():
+    for _ in range(10):
+        response = client.post("/auth/get-token", data={"username": "testuser", "password": "wrong"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    response = client.post("/auth/get-token", data={"username": "testuser", "password": "wrong"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response.headers["retry-after"]) >= 1
+    assert response.json() == {"detail": "Too many requests"}
+
+    # Other rules keep their own buckets
+    assert client.get("/healthy").status_code == status.HTTP_200_OK
+    assert client.get("/auth/login-page").status_code == status.HTTP_200_OK
+
+
+def test_authenticated_clients_are_limited_per_user(test_user):
+    from datetime import timedelta
+    from TodoApp.routers.auth import create_access_token
+
+    token = create_access_token(test_user.username, test_user.id, test_user.role, timedelta(minutes=5))
+    for _ in range(10):
+        client.post("/auth/refresh", json={"refresh_token": "x"}, headers={"Authorization": f"Bearer {token}"})
+    response = client.post("/auth/refresh", json={"refresh_token": "x"}, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    # Anonymous requests from the same address use the address's own bucket
+    response = client.post("/auth/refresh", json={"refresh_token": "x"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_client_address_behind_trusted_proxies(monkeypatch):
+    monkeypatch.setattr("TodoApp.security.trusted_proxies", parse_networks("10.0.0.0/8, 127.0.0.1"))
+
+    def address(peer, forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        scope = {"type": "http", "client": (peer, 50000), "headers": headers}
+        return client_address(scope, Headers(scope=scope))
+
+    assert address("203.0.113.7") == "203.0.113.7"
+    # Only trusted proxies may say who the client is
+    assert address("203.0.113.7", "198.51.100.1") == "203.0.113.7"
+    assert address("127.0.0.1", "198.51.100.1") == "198.51.100.1"
+    # The first hop that is not a proxy, whatever the client wrote before it
+    assert address("10.0.0.2", "1.2.3.4, 198.51.100.1, 10.0.0.1") == "198.51.100.1"
+    assert address("10.0.0.2") == "10.0.0.2"
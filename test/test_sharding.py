@@ -0,0 +1,127 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from TodoApp.database import Base, database, get_db
+from TodoApp.models import Todos
+from TodoApp.routers.todos import get_current_user
+from TodoApp.sharding import HashRing, ShardRouter, parse_shard_urls
+from TodoApp.test.utils import *
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+SHARDS = ("east", "west", "north")
+
+
+def test_parse_shard_urls():
+    assert parse_shard_urls("a=sqlite:///a.db, postgresql://h/db?sslmode=require,") == {
+        "a": "sqlite:///a.db", "shard1": "postgresql://h/db?sslmode=require"}
+    with pytest.raises(ValueError):
+        parse_shard_urls("a=sqlite:///a.db,a=sqlite:///b.db")
+
+
+def test_hash_ring_spreads_owners_and_moves_few_on_growth():
+    ring = HashRing(["shard0", "shard1", "shard2"])
+    placement = {owner: ring.node_for(owner) for owner in range(3000)}
+    counts = [list(placement.values()).count(name) for name in ("shard0", "shard1", "shard2")]
+    assert min(counts) > 700
+    # A fourth shard takes about a quarter of the owners, from the others only
+    grown = HashRing(["shard0", "shard1", "shard2", "shard3"])
+    moved = [owner for owner, name in placement.items() if grown.node_for(owner) != name]
+    assert 450 < len(moved) < 1100
+    assert all(grown.node_for(owner) == "shard3" for owner in moved)
+
+
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture
+def shards(tmp_path):
+    # Separate SQLite files stand in for the shards
+    for name in SHARDS:
+        sync_engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+        Base.metadata.create_all(sync_engine)
+        sync_engine.dispose()
+    router = ShardRouter({name: create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db", poolclass=NullPool)
+                          for name in SHARDS})
+    for shard_engine in router.engines.values():
+        # As Postgres does: the shards have no users, so a reference to them would reject every insert
+        event.listen(shard_engine.sync_engine, "connect", enforce_foreign_keys)
+    database._shards = router
+    try:
+        yield router
+    finally:
+        database._shards = None
+        app.dependency_overrides[get_current_user] = override_get_current_user
+
+        async def dispose():
+            for shard_engine in router.engines.values():
+                await shard_engine.dispose()
+
+        asyncio.run(dispose())
+
+
+def shard_titles(tmp_path, name):
+    sync_engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+    try:
+        with sync_engine.connect() as conn:
+            return [row.title for row in conn.execute(select(Todos.title).order_by(Todos.id))]
+    finally:
+        sync_engine.dispose()
+
+
+def act_as(owner_id):
+    app.dependency_overrides[get_current_user] = lambda: {'id': owner_id, 'username': f'user{owner_id}', 'role': 'admin'}
+
+
+def test_todos_live_on_their_owners_shard(shards, tmp_path):
+    # One owner on each of two shards
+    owners = {}
+    for owner_id in range(1, 100):
+        owners.setdefault(shards.shard_for(owner_id), owner_id)
+        if len(owners) == 2:
+            break
+    for name, owner_id in owners.items():
+        act_as(owner_id)
+        for number in range(2):
+            response = client.post("/todos/", json={"title": f"{name} {number}", "description": "Sharded todo"})
+            assert response.status_code == status.HTTP_201_CREATED
+        assert [todo["title"] for todo in client.get("/todos/").json()] == [f"{name} 0", f"{name} 1"]
+        assert client.get("/todos/changes").json()["changes"][0]["owner_id"] == owner_id
+
+    for name in SHARDS:
+        assert shard_titles(tmp_path, name) == ([f"{name} 0", f"{name} 1"] if name in owners else [])
+    # Nothing reached the primary
+    with TestingSessionLocal() as db:
+        assert db.execute(select(Todos)).all() == []
+
+    # Admin pages merge the shards; ids repeat, so the shard breaks ties
+    seen, cursor = [], None
+    while True:
+        response = client.get("/admin/todos", params={"limit": 3, **({"cursor": cursor} if cursor else {})})
+        seen += [(todo["id"], todo["title"]) for todo in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    first, second = [name for name in SHARDS if name in owners]
+    assert client.get("/admin/stats").json()["by_priority"] == [{"priority": 1, "open": 4, "completed": 0}]
+    assert seen == [(1, f"{first} 0"), (1, f"{second} 0"), (2, f"{first} 1"), (2, f"{second} 1")]
+
+    export = client.get("/admin/todos/export")
+    assert sorted(json.loads(line)["title"] for line in export.text.splitlines()) == sorted(title for _, title in seen)
+
+    # Id 1 exists on both shards: the owner picks which
+    assert client.delete("/admin/todo/1").status_code == status.HTTP_409_CONFLICT
+    response = client.delete("/admin/todo/1", params={"owner_id": owners[second]})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert shard_titles(tmp_path, second) == [f"{second} 1"]
+    assert client.delete("/admin/todo/1").status_code == status.HTTP_204_NO_CONTENT
+    assert shard_titles(tmp_path, first) == [f"{first} 1"]
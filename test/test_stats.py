@@ -0,0 +1,90 @@
+import asyncio
+
+from fastapi import status
+from httpx import ASGITransport, AsyncClient
+
+from TodoApp.database import get_db
+from TodoApp.routers.todos import get_current_user
+from TodoApp.stats import rebuild_counts
+from TodoApp.test.utils import *
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def expected_stats():
+    # What the dashboard used to compute from the full list
+    todos = client.get("/todos/").json()
+    by_priority = {}
+    for todo in todos:
+        entry = by_priority.setdefault(todo["priority"], {"priority": todo["priority"], "open": 0, "completed": 0})
+        entry["completed" if todo["complete"] else "open"] += 1
+    completed = sum(todo["complete"] for todo in todos)
+    return {"total": len(todos), "open": len(todos) - completed, "completed": completed,
+            "by_priority": sorted(by_priority.values(), key=lambda entry: entry["priority"])}
+
+
+def rebuild():
+    async def scenario():
+        async with TestingAsyncSessionLocal() as db:
+            return await rebuild_counts(db)
+
+    return asyncio.run(scenario())
+
+
+def test_rebuild_counts_existing_todos(test_todo):
+    # The fixture writes around the API, so nothing was counted yet
+    assert client.get("/todos/stats").json()["total"] == 0
+    assert rebuild() == 1
+    assert client.get("/todos/stats").json() == expected_stats() == {
+        "total": 1, "open": 1, "completed": 0, "by_priority": [{"priority": 1, "open": 1, "completed": 0}]}
+
+
+def test_every_write_path_keeps_counters_exact(test_todo):
+    rebuild()
+    for priority in (2, 2, 5):
+        client.post("/todos/", json={"title": "Counted", "description": "New todo", "priority": priority})
+    client.put("/todos/2", json={"title": "Counted", "description": "Done now", "priority": 3, "complete": True})
+    client.delete("/todos/3")
+    client.post("/todos/batch", json={"operations": [
+        {"op": "create", "todo": {"title": "Batched", "description": "New todo", "priority": 7}},
+        {"op": "update", "id": 4, "todo": {"title": "Batched", "description": "Done", "priority": 5, "complete": True}},
+        {"op": "update", "id": 1, "todo": {"title": "Batched", "description": "Reprioritised", "priority": 9}},
+        {"op": "delete", "id": 1},
+        {"op": "delete", "id": 99},
+    ]})
+    assert client.get("/todos/stats").json() == expected_stats()
+
+    assert client.delete("/admin/todo/4").status_code == status.HTTP_204_NO_CONTENT
+    stats = client.get("/todos/stats").json()
+    assert stats == expected_stats()
+    assert stats["by_priority"] == [{"priority": 3, "open": 0, "completed": 1},
+                                    {"priority": 7, "open": 1, "completed": 0}]
+    assert client.get("/admin/stats").json() == stats
+
+    # Counted the same way from scratch
+    rebuild()
+    assert client.get("/todos/stats").json() == stats
+
+
+def test_concurrent_deletes_of_one_todo_count_once(test_todo):
+    rebuild()
+
+    async def delete_twice(first, second):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as async_client:
+            responses = await asyncio.gather(async_client.delete(first), async_client.delete(second))
+        return sorted(response.status_code for response in responses)
+
+    # Both requests find the todo; only the one whose DELETE removed it is counted
+    assert asyncio.run(delete_twice("/todos/1", "/admin/todo/1")) == [
+        status.HTTP_204_NO_CONTENT, status.HTTP_404_NOT_FOUND]
+    assert client.get("/todos/stats").json() == expected_stats() == {
+        "total": 0, "open": 0, "completed": 0, "by_priority": []}
+
+
+def test_admin_stats_requires_admin():
+    app.dependency_overrides[get_current_user] = lambda: {'id': 2, 'username': 'user', 'role': 'user'}
+    try:
+        assert client.get("/admin/stats").status_code == status.HTTP_403_FORBIDDEN
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
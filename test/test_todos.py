@@ -1,6 +1,7 @@
 from fastapi import status, HTTPException
 from TodoApp.routers.todos import  get_current_user
 from TodoApp.database import get_db
+from TodoApp.pagination import encode_cursor
 from TodoApp.test.utils import *
 
 
@@ -26,6 +27,62 @@ def test_read_all_authenticated(test_todo):
                                 'complete':False, 'owner_id':1, 'id':1}]  # Adjust based on your test data
 
 
+def test_read_all_paginated(test_todo):
+    db = TestingSessionLocal()
+    db.add_all([Todos(title=f"Todo {i}", description="Paged todo", priority=i, complete=i % 2 == 0, owner_id=1)
+                for i in range(2, 6)])
+    db.commit()
+
+    response = client.get("/todos/", params={"limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    assert [todo['id'] for todo in response.json()] == [1, 2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get("/todos/", params={"limit": 2, "cursor": cursor})
+    assert [todo['id'] for todo in response.json()] == [3, 4]
+    response = client.get("/todos/", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    assert [todo['id'] for todo in response.json()] == [5]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_read_all_filtered_and_sorted(test_todo):
+    db = TestingSessionLocal()
+    db.add_all([Todos(title=f"Todo {i}", description="Paged todo", priority=i, complete=i % 2 == 0, owner_id=1)
+                for i in range(2, 6)])
+    db.commit()
+
+    response = client.get("/todos/", params={"complete": False, "sort": "-priority"})
+    assert [todo['priority'] for todo in response.json()] == [5, 3, 1]
+
+    response = client.get("/todos/", params={"priority_min": 2, "priority_max": 4, "sort": "priority", "limit": 1})
+    assert [todo['priority'] for todo in response.json()] == [2]
+    response = client.get("/todos/", params={"priority_min": 2, "priority_max": 4, "sort": "priority", "limit": 5,
+                                             "cursor": response.headers["X-Next-Cursor"]})
+    assert [todo['priority'] for todo in response.json()] == [3, 4]
+
+
+def test_read_all_invalid_cursor(test_todo):
+    response = client.get("/todos/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    db = TestingSessionLocal()
+    db.add(Todos(title="Another", description="Paged todo", priority=2, complete=False, owner_id=1))
+    db.commit()
+    first_page = client.get("/todos/", params={"limit": 1, "sort": "priority"})
+    # A cursor is only valid for the sort order it was issued for
+    response = client.get("/todos/", params={"sort": "id", "cursor": first_page.headers["X-Next-Cursor"]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    # Well-formed cursors whose values do not fit the sort columns
+    for sort, values in (("priority", ["high", 1]), ("id", [True]), ("-id", [None])):
+        for include_archived in (False, True):
+            response = client.get("/todos/", params={"sort": sort, "cursor": encode_cursor(sort, values),
+                                                     "include_archived": include_archived})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+    response = client.get("/admin/todos", params={"cursor": encode_cursor("id,shard", ["1", 0])})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
 def test_read_one_authenticated(test_todo):
     response = client.get("/todos/1")
     assert response.status_code == status.HTTP_200_OK
@@ -57,6 +114,8 @@ def test_create_todo(test_todo):
     assert created_todo['todo']['description'] == todo_data['description']
     assert created_todo['todo']['priority'] == todo_data['priority']
     assert created_todo['todo']['complete'] == todo_data['complete']
+    # Only the response model's fields, no ORM internals
+    assert set(created_todo['todo']) == {'id', 'title', 'description', 'priority', 'complete', 'owner_id'}
 
 
 def test_update_todo(test_todo):
@@ -82,4 +141,166 @@ def test_delete_todo(test_todo):
     # Verify the todo is deleted
     response = client.get("/todos/1")
     assert response.status_code == status.HTTP_404_NOT_FOUND
-    assert response.json() == {"detail": "Todo id:1 not found for user 1"}
\ No newline at end of file
+    assert response.json() == {"detail": "Todo id:1 not found for user 1"}
+
+def test_batch_todos(test_todo):
+    db = TestingSessionLocal()
+    db.add(Todos(title="Other", description="Someone else's todo", priority=1, complete=False, owner_id=2))
+    db.commit()
+    batch = {"operations": [
+        {"op": "create", "todo": {"title": "First", "description": "Created in batch", "priority": 2}},
+        {"op": "create", "todo": {"title": "Second", "description": "Created in batch", "priority": 3}},
+        {"op": "update", "id": 1, "todo": {"title": "Updated", "description": "Updated in batch",
+                                           "priority": 4, "complete": True}},
+        {"op": "delete", "id": 2},
+        {"op": "delete", "id": 999},
+    ]}
+    response = client.post("/todos/batch", json=batch)
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()['results']
+    assert [result['status'] for result in results] == [201, 201, 200, 404, 404]
+    assert results[0]['id'] != results[1]['id']
+
+    todos = {todo['id']: todo for todo in client.get("/todos/").json()}
+    assert todos[1]['title'] == "Updated" and todos[1]['complete'] is True
+    assert todos[results[0]['id']]['title'] == "First"
+    assert todos[results[1]['id']]['title'] == "Second"
+    # The todo owned by another user is untouched
+    assert db.query(Todos).filter(Todos.id == 2).first() is not None
+
+
+def test_batch_todos_validation(test_todo):
+    response = client.post("/todos/batch", json={"operations": [{"op": "update", "id": 1}]})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = client.post("/todos/batch", json={"operations": [{"op": "delete", "id": 1}] * 501})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_read_all_etag(test_todo):
+    response = client.get("/todos/")
+    etag = response.headers["ETag"]
+
+    response = client.get("/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["ETag"] == etag
+
+    # A write invalidates the cached list, so the ETag changes
+    client.put("/todos/1", json={"title": "Changed", "description": "Changed todo", "priority": 1, "complete": False})
+    response = client.get("/todos/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]['title'] == "Changed"
+
+
+def test_read_all_cached_until_write(test_todo):
+    from TodoApp.cache import todo_cache
+
+    client.get("/todos/")
+    hits = todo_cache.hits
+    assert len(client.get("/todos/").json()) == 1
+    assert todo_cache.hits == hits + 1
+
+    client.post("/todos/", json={"title": "New Todo", "description": "This is a new todo item", "priority": 2})
+    assert len(client.get("/todos/").json()) == 2
+    client.delete("/admin/todo/1")
+    assert len(client.get("/todos/").json()) == 1
+
+
+def test_search_todos(test_todo):
+    db = TestingSessionLocal()
+    db.add_all([
+        Todos(title="Buy groceries", description="Milk, bread and eggs", priority=2, complete=False, owner_id=1),
+        Todos(title="Bake bread", description="Sourdough", priority=1, complete=False, owner_id=1),
+        Todos(title="Bread for neighbour", description="Not mine", priority=1, complete=False, owner_id=2),
+    ])
+    db.commit()
+
+    response = client.get("/todos/search", params={"q": "bread"})
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()
+    # Title matches rank above description matches; other users' todos are never returned
+    assert [todo['title'] for todo in results] == ["Bake bread", "Buy groceries"]
+    assert results[0]['rank'] >= results[1]['rank']
+
+    response = client.get("/todos/search", params={"q": "groc"})
+    assert [todo['title'] for todo in response.json()] == ["Buy groceries"]
+    response = client.get("/todos/search", params={"q": "bread", "limit": 1, "offset": 1})
+    assert [todo['title'] for todo in response.json()] == ["Buy groceries"]
+
+    # Updates and deletes keep the index in sync
+    client.put("/todos/1", json={"title": "Sourdough starter", "description": "Feed it", "priority": 1})
+    assert {todo['id'] for todo in client.get("/todos/search", params={"q": "sourdough"}).json()} == {1, 3}
+    client.delete("/todos/3")
+    assert [todo['id'] for todo in client.get("/todos/search", params={"q": "sourdough"}).json()] == [1]
+    assert client.get("/todos/search", params={"q": '"*'}).json() == []
+
+
+def test_todo_page_streamed_and_paginated(test_todo):
+    from datetime import timedelta
+    from TodoApp.routers.auth import create_access_token
+
+    db = TestingSessionLocal()
+    db.add_all([Todos(title=f"Page todo {i}", description="Paged", priority=1, complete=False, owner_id=1)
+                for i in range(2, 5)])
+    db.commit()
+    client.cookies.set("access_token", create_access_token("testuser", 1, "admin", timedelta(minutes=5)))
+    try:
+        response = client.get("/todos/todo-page", params={"limit": 2})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/html")
+        assert "Test Todo" in response.text and "Page todo 2" in response.text
+        assert "Page todo 3" not in response.text
+        assert "Next page" in response.text
+
+        cursor = response.text.split("cursor=")[1].split("&")[0]
+        response = client.get("/todos/todo-page", params={"limit": 2, "cursor": cursor})
+        assert "Page todo 3" in response.text and "Page todo 4" in response.text
+        assert "Test Todo" not in response.text
+        assert "Next page" not in response.text
+    finally:
+        client.cookies.clear()
+
+
+def test_sync_changes(test_todo, monkeypatch):
+    from TodoApp import sync
+
+    # Tokens normally stop a little short of now; here every change is settled at once
+    monkeypatch.setattr(sync, "SYNC_SETTLE_SECONDS", 0)
+    response = client.get("/todos/changes")
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert [(todo['id'], todo['version']) for todo in body['changes']] == [(1, 1)]
+    assert body['deleted'] == [] and body['has_more'] is False
+    token = body['next']
+
+    assert client.get("/todos/changes", params={"since": token}).json()['changes'] == []
+
+    client.put("/todos/1", json={"title": "Synced", "description": "Changed after the token", "priority": 2})
+    body = client.get("/todos/changes", params={"since": token}).json()
+    assert [(todo['id'], todo['title'], todo['version']) for todo in body['changes']] == [(1, "Synced", 2)]
+    token = body['next']
+
+    client.delete("/todos/1")
+    body = client.get("/todos/changes", params={"since": token}).json()
+    assert body['changes'] == []
+    assert [deleted['id'] for deleted in body['deleted']] == [1]
+
+
+def test_sync_changes_paginated_and_tokens_checked(test_todo, monkeypatch):
+    from datetime import datetime
+    from TodoApp import sync
+
+    monkeypatch.setattr(sync, "SYNC_SETTLE_SECONDS", 0)
+    client.post("/todos/batch", json={"operations": [
+        {"op": "create", "todo": {"title": f"Todo {i}", "description": "Synced in pages"}} for i in range(4)]})
+    body = client.get("/todos/changes", params={"limit": 3}).json()
+    assert len(body['changes']) == 3 and body['has_more'] is True
+    body = client.get("/todos/changes", params={"limit": 3, "since": body['next']}).json()
+    assert len(body['changes']) == 2 and body['has_more'] is False
+
+    response = client.get("/todos/changes", params={"since": "not-a-token"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    expired = sync.encode_token(sync.START, (datetime(2000, 1, 1), 0))
+    response = client.get("/todos/changes", params={"since": expired})
+    assert response.status_code == status.HTTP_410_GONE
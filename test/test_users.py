@@ -1,3 +1,5 @@
+import asyncio
+
 from TodoApp.test.utils import *
 from TodoApp.models import Users
 from TodoApp.routers.users import get_current_user, get_db
@@ -19,3 +21,74 @@ def test_get_user_info(test_user):
 
 
 
+
+def test_update_password_invalidates_cached_tokens(test_user):
+    from TodoApp.security import token_cache
+
+    token_cache.set("cached-token", {"sub": test_user.username, "id": test_user.id, "exp": 4102444800})
+    response = client.put("/users/update-password", params={"new_password": "newpassword"})
+    assert response.status_code == status.HTTP_200_OK
+    assert token_cache.get("cached-token") is None
+
+
+def test_update_phone_number_returns_updated_row(test_user):
+    response = client.put("/users/update-phone-number", params={"new_phone_number": "555-0100"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['phone_number'] == "555-0100"
+    assert response.json()['password'] == test_user.hashed_password
+    assert client.get("/users/get-user").json()['phone_number'] == "555-0100"
+
+
+def test_get_user_served_from_cache_until_update(test_user, monkeypatch):
+    from TodoApp.cache import LRUCacheBackend, user_cache
+
+    monkeypatch.setattr(user_cache, "ttl", 60)
+    monkeypatch.setattr(user_cache, "backend", LRUCacheBackend())
+    assert client.get("/users/get-user").json()['phone_number'] is None
+
+    # A direct write is not seen while the cached row is fresh...
+    db = TestingSessionLocal()
+    db.query(Users).filter(Users.id == test_user.id).update({"phone_number": "555-0199"})
+    db.commit()
+    assert client.get("/users/get-user").json()['phone_number'] is None
+
+    # ...but an update through the API replaces it
+    client.put("/users/update-phone-number", params={"new_phone_number": "555-0100"})
+    assert client.get("/users/get-user").json()['phone_number'] == "555-0100"
+
+
+def test_cached_user_holds_no_password_hash(test_user, monkeypatch):
+    from TodoApp.cache import LRUCacheBackend, user_cache
+    from TodoApp.schemas import loads
+
+    monkeypatch.setattr(user_cache, "ttl", 60)
+    monkeypatch.setattr(user_cache, "backend", LRUCacheBackend())
+    assert client.get("/users/get-user").json()['password'] == test_user.hashed_password
+
+    async def cached():
+        return await user_cache.get(await user_cache.key(test_user.id, "profile"))
+
+    assert loads(asyncio.run(cached()).body) == {"id": test_user.id, "username": test_user.username,
+                                                 "role": test_user.role, "phone_number": test_user.phone_number}
+    # The hash is read afresh, so a password change shows right away
+    client.put("/users/update-password", params={"new_password": "newpassword"})
+    db = TestingSessionLocal()
+    hashed_password = db.query(Users).filter(Users.id == test_user.id).one().hashed_password
+    db.close()
+    assert client.get("/users/get-user").json()['password'] == hashed_password != test_user.hashed_password
+
+
+def test_get_user_reads_the_row_once_without_cache(test_user):
+    from sqlalchemy import event
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        assert client.get("/users/get-user").json()['password'] == test_user.hashed_password
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert len(statements) == 1
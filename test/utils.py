@@ -2,12 +2,16 @@ import os
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, text, StaticPool
+from sqlalchemy import create_engine, text, StaticPool, NullPool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from TodoApp.audit import audit_log
+from TodoApp.cache import LRUCacheBackend, todo_cache
 from TodoApp.database import Base
 from TodoApp.main import app
 from TodoApp.models import Todos, Users
+from TodoApp.ratelimit import MemoryRateLimitBackend, rate_limiter
 from TodoApp.routers.auth import bcrypt_context
 
 print(Base.metadata.tables)  # This should now show your tables
@@ -22,6 +26,13 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL,
                        poolclass=StaticPool)
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# The app uses async sessions; they share the same SQLite file as the sync fixtures.
+# NullPool because every TestClient request runs on its own event loop.
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(BASE_DIR, 'test_todosapp.db')}",
+                                   poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession,
+                                              autoflush=False, expire_on_commit=False)
 Base.metadata.create_all(bind=engine)
 with engine.connect() as conn:
     result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table';"))
@@ -34,13 +45,10 @@ def override_get_current_user():
 
 
 # Override dependency
-def override_get_db():
+async def override_get_db():
     print("override_get_db called")
-    db = TestingSessionLocal()
-    try:
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 client = TestClient(app)
@@ -56,9 +64,35 @@ def test_todo():
     yield todo
     with engine.connect() as connection:
         connection.execute(text("DELETE FROM todosapp;"))
+        connection.execute(text("DELETE FROM todo_tombstones;"))
+        connection.execute(text("DELETE FROM todosapp_archive;"))
+        connection.execute(text("DELETE FROM todo_counters;"))
+        # todosapp never reuses ids, start the next test from 1 again
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'todosapp';"))
         connection.commit()
 
 
+@pytest.fixture(autouse=True)
+def reset_todo_cache():
+    # Fixtures write to the database directly, bypassing the cache invalidation of the routers
+    todo_cache.backend = LRUCacheBackend()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    # Every test starts with full buckets
+    rate_limiter.backend = MemoryRateLimitBackend()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def reset_audit_log():
+    # The write-behind task only runs with the lifespan, so records would pile up across tests
+    audit_log.pending.clear()
+    yield
+
+
 @pytest.fixture(autouse=True)
 def test_user():
     # Create a test user